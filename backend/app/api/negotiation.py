@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""
+Negoziazione del formato: JSON (default) o MessagePack.
+
+Come funziona:
+- risposte: con 'Accept: application/msgpack' le rotte dei router moduli, studenti
+  ed esami serializzano con MessagePack invece che JSON (stesso contenuto)
+- richieste: le POST/PUT con 'Content-Type: application/msgpack' vengono decodificate
+  e validate esattamente come il JSON (stessi modelli Pydantic)
+- gli errori (400/404/422) restano in JSON: sono piccoli e letti da persone
+
+Uso nei router:
+    router = APIRouter(route_class=NegotiatedRoute, default_response_class=NegotiatedResponse)
+
+Note pratiche:
+- 'msgpack' è una dipendenza facoltativa: se non installato si risponde sempre in JSON
+  e i corpi MessagePack ricevono 415.
+- La risposta porta 'Vary: Accept' (cache e proxy distinguono i due formati).
+"""
+
+from contextvars import ContextVar
+from typing import Any, Callable, Coroutine
+
+from fastapi import HTTPException, Request, Response
+from fastapi.responses import JSONResponse
+from fastapi.routing import APIRoute
+
+try:
+    import msgpack
+except ImportError:  # dipendenza facoltativa
+    msgpack = None
+
+MSGPACK_TYPES = frozenset({"application/msgpack", "application/x-msgpack", "application/vnd.msgpack"})
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+
+# Formato richiesto dalla richiesta corrente (impostato da NegotiatedRoute)
+_wants_msgpack: ContextVar[bool] = ContextVar("wants_msgpack", default=False)
+
+
+def _media_type(value: str) -> str:
+    return value.split(";", 1)[0].strip().lower()
+
+
+def accepts_msgpack(accept: str) -> bool:
+    """True se l'header Accept preferisce MessagePack (primo tipo, q ignorato)."""
+    if msgpack is None or not accept:
+        return False
+    return _media_type(accept.split(",", 1)[0]) in MSGPACK_TYPES
+
+
+class NegotiatedResponse(JSONResponse):
+    """JSONResponse che passa a MessagePack se la richiesta corrente lo accetta."""
+
+    def render(self, content: Any) -> bytes:
+        if _wants_msgpack.get():
+            self.media_type = MSGPACK_MEDIA_TYPE
+            return msgpack.packb(content, use_bin_type=True)
+        return super().render(content)
+
+
+class MsgpackRequest(Request):
+    """Request con corpo MessagePack esposto a FastAPI come se fosse JSON."""
+
+    async def json(self) -> Any:
+        if not hasattr(self, "_json"):
+            self._json = msgpack.unpackb(await self.body(), raw=False)
+        return self._json
+
+
+def _as_json_request(request: Request) -> Request:
+    """Riscrive il content-type (FastAPI legge come JSON solo application/json)."""
+    scope = dict(request.scope)
+    scope["headers"] = [
+        (k, b"application/json") if k == b"content-type" else (k, v) for k, v in request.scope["headers"]
+    ]
+    return MsgpackRequest(scope, request.receive)
+
+
+class NegotiatedRoute(APIRoute):
+    """APIRoute che decodifica i corpi MessagePack e sceglie il formato di risposta."""
+
+    def get_route_handler(self) -> Callable[[Request], Coroutine[Any, Any, Response]]:
+        original = super().get_route_handler()
+
+        async def handler(request: Request) -> Response:
+            if _media_type(request.headers.get("content-type", "")) in MSGPACK_TYPES:
+                if msgpack is None:
+                    raise HTTPException(status_code=415, detail="MessagePack non supportato")
+                request = _as_json_request(request)
+            token = _wants_msgpack.set(accepts_msgpack(request.headers.get("accept", "")))
+            try:
+                response = await original(request)
+            finally:
+                _wants_msgpack.reset(token)
+            response.headers.append("Vary", "Accept")
+            return response
+
+        return handler
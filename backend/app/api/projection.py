@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+"""
+Proiezione dei campi (?fields=) per gli endpoint di lista e dettaglio.
+
+Esempio:
+    GET /api/exams?fields=data,voto,modulo_snapshot.codice,modulo_snapshot.nome
+
+Come funziona:
+- i campi richiesti sono validati contro una whitelist derivata dal modello di
+  risposta (campi di primo livello e sotto-campi dei modelli annidati) → 400 se ignoti
+- diventano una proiezione Mongo: il DB invia, e il driver decodifica, solo quei campi
+- la risposta è validata con un modello "parziale" (stessi tipi, campi facoltativi)
+  e serializzata direttamente (JSON o MessagePack), senza passare dal response_model completo
+- 'id' è sempre incluso
+"""
+
+from datetime import date
+from functools import lru_cache
+from typing import Any, Awaitable, Callable, Iterable, Optional, Sequence, Union, get_args, get_origin
+
+from fastapi import HTTPException, Query
+from pydantic import BaseModel, create_model
+
+from app.api.negotiation import NegotiatedResponse
+from app.core import settings
+from app.core.exam_dates import to_iso_date
+from app.core.rawbson import find_raw
+from app.core.refs import REF_ARRAY_FIELDS, REF_FIELDS, ref_str, refs_str, refs_to_str
+
+# Parametro condiviso dagli endpoint (documentazione OpenAPI uniforme)
+FieldsQuery = Query(
+    None,
+    description="Campi da restituire separati da virgola (es. 'nome,codice' o 'modulo_snapshot.codice'); 'id' è sempre incluso",
+)
+
+
+def _nested_model(annotation: Any) -> Optional[type[BaseModel]]:
+    """Restituisce il modello Pydantic annidato (anche dentro Optional[...]), se presente."""
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return annotation
+    if get_origin(annotation) is Union:
+        for arg in get_args(annotation):
+            nested = _nested_model(arg)
+            if nested is not None:
+                return nested
+    return None
+
+
+@lru_cache(maxsize=None)
+def allowed_fields(model: type[BaseModel]) -> frozenset[str]:
+    """Whitelist dei campi proiettabili: primo livello e 'padre.figlio' per i modelli annidati."""
+    allowed: set[str] = set()
+    for name, info in model.model_fields.items():
+        allowed.add(name)
+        nested = _nested_model(info.annotation)
+        if nested is not None:
+            allowed.update(f"{name}.{sub}" for sub in nested.model_fields)
+    return frozenset(allowed)
+
+
+def parse_fields(fields: Optional[str], model: type[BaseModel]) -> Optional[tuple[str, ...]]:
+    """
+    Valida il parametro 'fields' e restituisce la tupla dei campi (None = documento completo).
+    Solleva 400 se un campo non è nella whitelist del modello.
+    """
+    if not fields:
+        return None
+    requested = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in requested if f not in allowed_fields(model)]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Campi non validi: {', '.join(unknown)}")
+    # 'id' sempre presente; un campo intero assorbe i suoi sotto-campi
+    selected = dict.fromkeys(["id", *requested])
+    return tuple(f for f in selected if "." not in f or f.split(".", 1)[0] not in selected)
+
+
+def mongo_projection(fields: Optional[Iterable[str]]) -> Optional[dict[str, int]]:
+    """Proiezione Mongo equivalente ('id' corrisponde a '_id', incluso di default)."""
+    if fields is None:
+        return None
+    # Una proiezione vuota restituirebbe il documento intero: con solo 'id' si chiede '_id'
+    return {f: 1 for f in fields if f != "id"} or {"_id": 1}
+
+
+@lru_cache(maxsize=256)
+def partial_model(model: type[BaseModel], fields: tuple[str, ...]) -> type[BaseModel]:
+    """
+    Modello di risposta con i soli campi richiesti, tutti facoltativi.
+    I modelli annidati proiettati per sotto-campi diventano a loro volta parziali.
+    """
+    groups: dict[str, list[str]] = {}
+    for f in fields:
+        top, _, sub = f.partition(".")
+        groups.setdefault(top, [])
+        if sub:
+            groups[top].append(sub)
+
+    definitions: dict[str, Any] = {}
+    for top, subs in groups.items():
+        info = model.model_fields[top]
+        annotation = info.annotation
+        if subs:
+            annotation = partial_model(_nested_model(annotation), tuple(subs))
+        definitions[top] = (Optional[annotation], None)
+
+    name = f"{model.__name__}Partial_{'_'.join(groups)}".replace(".", "_")
+    return create_model(name, __config__=model.model_config, **definitions)
+
+
+def project_response(docs: Any, model: type[BaseModel], fields: tuple[str, ...]) -> NegotiatedResponse:
+    """
+    Valida documenti (lista o singolo) con il modello parziale e restituisce la risposta.
+    I campi assenti nel documento non compaiono nell'output (exclude_unset).
+    """
+    partial = partial_model(model, fields)
+    if isinstance(docs, list):
+        content: Any = [partial.model_validate(d).model_dump(mode="json", exclude_unset=True) for d in docs]
+    else:
+        content = partial.model_validate(docs).model_dump(mode="json", exclude_unset=True)
+    return NegotiatedResponse(content)
+
+
+@lru_cache(maxsize=256)
+def response_converters(model: type[BaseModel], fields: Optional[tuple[str, ...]] = None) -> tuple:
+    """Conversioni per il percorso raw: i campi 'date' (salvati come BSON date) in 'YYYY-MM-DD'."""
+    names = {f.split(".", 1)[0] for f in fields} if fields else set(model.model_fields)
+    return tuple(
+        (name, to_iso_date)
+        for name, info in model.model_fields.items()
+        if name in names and date in (info.annotation, *get_args(info.annotation))
+    )
+
+
+@lru_cache(maxsize=256)
+def ref_converters(collection: str, fields: Optional[tuple[str, ...]] = None) -> tuple:
+    """Conversioni per il percorso raw: riferimenti ObjectId in stringhe (contratto API)."""
+    names = {f.split(".", 1)[0] for f in fields} if fields else None
+    singles = [(n, ref_str) for n in REF_FIELDS.get(collection, ())]
+    arrays = [(n, refs_str) for n in REF_ARRAY_FIELDS.get(collection, ())]
+    return tuple((n, fn) for n, fn in singles + arrays if names is None or n in names)
+
+
+@lru_cache(maxsize=256)
+def response_defaults(model: type[BaseModel], fields: Optional[tuple[str, ...]] = None) -> tuple:
+    """Default del modello per i campi (richiesti) che possono mancare nei documenti."""
+    names = {f.split(".", 1)[0] for f in fields} if fields else set(model.model_fields)
+    return tuple(
+        (name, lambda info=info: info.get_default(call_default_factory=True))
+        for name, info in model.model_fields.items()
+        if name in names and not info.is_required()
+    )
+
+
+async def list_response(
+    coll,
+    model: type[BaseModel],
+    filter: dict[str, Any],
+    sort: tuple[str, int],
+    fields: Optional[tuple[str, ...]] = None,
+    enrich: Optional[Callable[[list[dict[str, Any]]], Awaitable[None]]] = None,
+    partitions: Optional[Sequence[tuple[Any, dict[str, Any]]]] = None,
+) -> Any:
+    """
+    Lista per gli endpoint GET ('enrich' completa i documenti prima del rendering).
+    - RAW_BSON_READS attivo: batch BSON grezzi proiettati sui campi del modello
+      (o su quelli richiesti) e resi direttamente, senza rivalidazione Pydantic
+    - altrimenti: documenti decodificati dal driver; con 'fields' modello parziale,
+      senza 'fields' la lista viene restituita al response_model della rotta
+    'partitions': coppie (collezione, filtro) con lo schema di 'coll', lette in ordine al
+    posto di (coll, filter) e concatenate (es. esami: collezione calda + archivi).
+    """
+    sources = partitions if partitions is not None else [(coll, filter)]
+    if settings.RAW_BSON_READS:
+        projection = mongo_projection(fields or tuple(model.model_fields))
+        defaults = response_defaults(model, fields)
+        converters = response_converters(model, fields) + ref_converters(coll.name, fields)
+        items = []
+        for source, query in sources:
+            items.extend(await find_raw(source, query, projection, sort, defaults, converters))
+        if enrich:
+            await enrich(items)
+        return NegotiatedResponse(items)
+
+    items = []
+    for source, query in sources:
+        async for d in source.find(query, mongo_projection(fields)).sort(*sort):
+            d["id"] = str(d.pop("_id"))
+            items.append(refs_to_str(d, coll.name))
+    if enrich:
+        await enrich(items)
+    if fields:
+        return project_response(items, model, fields)
+    return items
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""
+Router dell'audit log (sola lettura):
+- voci più recenti, filtrabili per collezione, entità, autore e azione
+- storico di un'entità (es. tutte le variazioni di voto di un esame)
+
+Le voci sono scritte a batch (app.core.audit): una modifica appena fatta compare
+entro AUDIT_FLUSH_MS millisecondi.
+"""
+
+from datetime import date, datetime
+from typing import Any, Literal, Optional
+
+from bson import ObjectId
+from fastapi import APIRouter, Query
+
+from app.core.audit import COLL
+from app.core.db import get_collection
+from app.models.audit import AuditEntry
+
+router = APIRouter()
+
+
+def _plain(value: Any) -> Any:
+    """Valori BSON → JSON (ObjectId come stringa, date del DB come YYYY-MM-DD o ISO)."""
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, datetime):
+        return value.date().isoformat() if value.time() == datetime.min.time() else value.isoformat()
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, dict):
+        return {k: _plain(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_plain(v) for v in value]
+    return value
+
+
+def entry_out(doc: dict[str, Any]) -> dict[str, Any]:
+    """Documento dell'audit log → risposta API."""
+    return {"id": str(doc.pop("_id")), **{k: (_plain(v) if k == "changes" else v) for k, v in doc.items()}}
+
+
+@router.get("", response_model=list[AuditEntry])
+async def list_audit(
+    collection: Optional[Literal["modules", "students", "exams"]] = None,
+    entity_id: Optional[str] = None,
+    actor: Optional[str] = None,
+    action: Optional[Literal["create", "update", "delete", "enroll", "unenroll"]] = None,
+    before: Optional[datetime] = Query(None, description="Solo voci precedenti (paginazione)"),
+    limit: int = Query(100, ge=1, le=1000),
+):
+    """Voci dalla più recente; per lo storico di un'entità indicare collection ed entity_id."""
+    query: dict[str, Any] = {}
+    if collection:
+        query["collection"] = collection
+    if entity_id:
+        query["entity_id"] = entity_id
+    if actor:
+        query["actor"] = actor
+    if action:
+        query["action"] = action
+    if before:
+        query["ts"] = {"$lt": before}
+    cursor = get_collection(COLL).find(query).sort("ts", -1).limit(limit)
+    return [entry_out(d) async for d in cursor]
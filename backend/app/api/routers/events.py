@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+"""
+Router del feed modifiche in Server-Sent Events (SSE):
+- GET /events?collections=exams,students → stream 'text/event-stream'
+- ogni evento ha 'id' (sequenza), 'event: change' e il JSON del ChangeEvent
+- un commento di heartbeat periodico mantiene viva la connessione dietro i proxy
+
+Il browser si riconnette da solo (EventSource); dopo una riconnessione conviene
+ricaricare le liste, perché gli eventi persi nel frattempo non vengono ripetuti.
+"""
+
+import asyncio
+import json
+from typing import AsyncIterator
+
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
+
+from app.core import settings
+from app.core.events import WATCHED_COLLECTIONS, ChangeEvent, bus
+
+router = APIRouter()
+
+
+def format_sse(event: ChangeEvent) -> str:
+    """Serializza l'evento nel formato SSE."""
+    payload = json.dumps(event.as_dict(), default=str, ensure_ascii=False)
+    return f"id: {event.seq}\nevent: change\ndata: {payload}\n\n"
+
+
+async def event_stream(collections: set[str]) -> AsyncIterator[str]:
+    """Inoltra al client gli eventi delle collezioni richieste, con heartbeat."""
+    with bus.subscribe() as queue:
+        # Suggerisce al browser l'attesa prima di riconnettersi (ms)
+        yield "retry: 3000\n\n"
+        while True:
+            try:
+                event = await asyncio.wait_for(queue.get(), timeout=settings.EVENTS_HEARTBEAT_S)
+            except asyncio.TimeoutError:
+                yield ": ping\n\n"
+                continue
+            if event.collection in collections:
+                yield format_sse(event)
+
+
+@router.get("")
+async def change_feed(
+    collections: str = Query(",".join(WATCHED_COLLECTIONS), description="Collezioni da seguire, separate da virgola"),
+):
+    """Stream SSE delle modifiche a moduli, studenti ed esami."""
+    selected = {c.strip() for c in collections.split(",") if c.strip()}
+    unknown = selected - set(WATCHED_COLLECTIONS)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Collezioni non valide: {', '.join(sorted(unknown))}")
+    return StreamingResponse(
+        event_stream(selected),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -3,18 +3,30 @@
 Router per la gestione degli Esami:
 - Lista, dettaglio, creazione, aggiornamento, eliminazione
 - Creazione/aggiornamento con snapshot del modulo (codice/nome/ore/descrizione)
+- Data salvata come BSON date, esposta come 'YYYY-MM-DD'
+- Anni accademici archiviati: letture instradate per intervallo di date, scritture rifiutate (409)
 """
 
 from datetime import date, datetime
-from typing import Any
+from typing import Any, Optional
 
 from bson import ObjectId
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query
+from pymongo import ReturnDocument
 
+from app.api.negotiation import NegotiatedResponse, NegotiatedRoute
+from app.api.projection import FieldsQuery, list_response, mongo_projection, parse_fields, project_response
+from app.core.audit import audit_log
+from app.core.cache import module_reports
 from app.core.db import get_collection
+from app.core.events import publish_change
+from app.core.exam_archive import find_exam, is_closed, partitions
+from app.core.exam_dates import to_bson_date, to_iso_date
+from app.core.leaderboard import leaderboard
+from app.core.refs import ref_str, refs_to_db, refs_to_str
 from app.models.exam import Exam, ExamDB, ModuleSnapshot
 
-router = APIRouter()
+router = APIRouter(route_class=NegotiatedRoute, default_response_class=NegotiatedResponse)
 COLL = "exams"
 
 
@@ -23,10 +35,12 @@ COLL = "exams"
 # -------------------------
 
 def to_str_id(doc: dict[str, Any]) -> dict[str, Any]:
-    """Converte l'_id Mongo in stringa 'id' e rimuove l'_id dal documento."""
+    """Converte l'_id Mongo in stringa 'id', i riferimenti in stringa e la data in 'YYYY-MM-DD' (contratto API)."""
     doc["id"] = str(doc["_id"])
     doc.pop("_id", None)
-    return doc
+    if "data" in doc:
+        doc["data"] = to_iso_date(doc["data"])
+    return refs_to_str(doc, COLL)
 
 
 def parse_object_id(id_str: str) -> ObjectId:
@@ -40,15 +54,27 @@ def parse_object_id(id_str: str) -> ObjectId:
         raise HTTPException(status_code=400, detail="Identificativo non valido")
 
 
-def normalize_exam_date(value: Any) -> str | Any:
+def normalize_exam_date(value: Any) -> datetime | Any:
     """
-    Normalizza il campo 'data' in stringa ISO (YYYY-MM-DD) se è un date/datetime.
+    Normalizza il campo 'data' in BSON date (mezzanotte) se è un date/datetime/stringa ISO.
     In caso contrario, restituisce il valore originale.
     """
-    if isinstance(value, (date, datetime)):
-        # Usa solo la parte di data (compatibilità con form HTML type="date")
-        return value.isoformat()[:10]
-    return value
+    return to_bson_date(value)
+
+
+async def ensure_open_year_or_409(value: Any) -> None:
+    """Solleva 409 se la data cade in un anno accademico archiviato (sola lettura)."""
+    if await is_closed(value):
+        raise HTTPException(status_code=409, detail="Anno accademico archiviato: esame in sola lettura")
+
+
+async def find_hot_exam_or_error(oid: ObjectId) -> dict[str, Any]:
+    """Esame modificabile (collezione calda): 404 se non esiste, 409 se archiviato."""
+    current, _ = await find_exam(oid)
+    if not current:
+        raise HTTPException(status_code=404, detail="Esame non trovato")
+    await ensure_open_year_or_409(current.get("data"))
+    return current
 
 
 async def build_module_snapshot_or_400(module_id: str) -> dict[str, Any]:
@@ -74,15 +100,24 @@ async def build_module_snapshot_or_400(module_id: str) -> dict[str, Any]:
 # -------------------------
 
 @router.get("", response_model=list[ExamDB])
-async def list_exams():
-    """
-    Elenco esami ordinati per data decrescente.
-    """
-    coll = get_collection(COLL)
-    items: list[dict[str, Any]] = []
-    async for d in coll.find({}).sort("data", -1):
-        items.append(to_str_id(d))
-    return items
+async def list_exams(
+    fields: Optional[str] = FieldsQuery,
+    date_from: Optional[date] = Query(None, description="Data minima (YYYY-MM-DD, inclusa)"),
+    date_to: Optional[date] = Query(None, description="Data massima (YYYY-MM-DD, inclusa)"),
+):
+    """
+    Elenco esami ordinati per data decrescente, archivi compresi.
+    - senza intervallo di date: tutti gli anni (collezione calda, poi archivi dal più recente)
+    - con date_from/date_to: solo le partizioni degli anni interessati
+    Con 'fields' restituisce solo i campi richiesti (proiezione Mongo).
+    """
+    if date_from and date_to and date_from > date_to:
+        raise HTTPException(status_code=400, detail="Intervallo di date non valido")
+    parts = await partitions(date_from, date_to, everything=True)
+    return await list_response(
+        get_collection(COLL), ExamDB, {}, ("data", -1), parse_fields(fields, ExamDB),
+        partitions=[(get_collection(p.collection), p.date_filter) for p in parts],
+    )
 
 
 @router.post("", response_model=ExamDB)
@@ -91,7 +126,7 @@ async def create_exam(payload: Exam):
     Crea un esame.
     - Verifica che studente e modulo esistano.
     - Genera sempre lo snapshot del modulo allo stato corrente.
-    - Normalizza la data in formato ISO 'YYYY-MM-DD'.
+    - Salva la data come BSON date e i riferimenti come ObjectId.
     """
     # Verifica studente esistente
     students = get_collection("students")
@@ -105,22 +140,34 @@ async def create_exam(payload: Exam):
     doc = payload.model_dump()
     doc["modulo_snapshot"] = modulo_snapshot
     doc["data"] = normalize_exam_date(doc.get("data"))
+    await ensure_open_year_or_409(doc["data"])
+    refs_to_db(doc, COLL)
 
     coll = get_collection(COLL)
-    res = await coll.insert_one(doc)
-    saved = await coll.find_one({"_id": res.inserted_id})
-    return to_str_id(saved)
+    # Scrittura e variazione della classifica insieme (vedi Leaderboard.writing)
+    async with leaderboard.writing():
+        res = await coll.insert_one(doc)
+        module_reports.invalidate(payload.module_id)
+        saved = await coll.find_one({"_id": res.inserted_id})
+        leaderboard.exam_added(saved)
+    item = to_str_id(dict(saved))
+    publish_change(COLL, "created", item["id"], item)
+    await audit_log.record(COLL, "create", res.inserted_id, after=saved)
+    return item
 
 
 @router.get("/{id}", response_model=ExamDB)
-async def get_exam(id: str):
+async def get_exam(id: str, fields: Optional[str] = FieldsQuery):
     """
-    Restituisce un esame per ID.
+    Restituisce un esame per ID (anche archiviato).
+    Con 'fields' restituisce solo i campi richiesti.
     """
-    coll = get_collection(COLL)
-    doc = await coll.find_one({"_id": parse_object_id(id)})
+    selected = parse_fields(fields, ExamDB)
+    doc, _ = await find_exam(parse_object_id(id), mongo_projection(selected))
     if not doc:
         raise HTTPException(status_code=404, detail="Esame non trovato")
+    if selected:
+        return project_response(to_str_id(doc), ExamDB, selected)
     return to_str_id(doc)
 
 
@@ -129,13 +176,13 @@ async def update_exam(id: str, payload: Exam):
     """
     Aggiorna un esame.
     - Aggiorna sempre lo snapshot del modulo coerentemente al modulo attuale
-    - Normalizza la data in formato ISO 'YYYY-MM-DD'
+    - Salva la data come BSON date e i riferimenti come ObjectId
+    - 409 se l'esame (o la nuova data) appartiene a un anno accademico archiviato
     """
     coll = get_collection(COLL)
 
     # Verifica esistenza esame per un errore 404 più chiaro
-    if not await coll.find_one({"_id": parse_object_id(id)}):
-        raise HTTPException(status_code=404, detail="Esame non trovato")
+    await find_hot_exam_or_error(parse_object_id(id))
 
     # Snapshot modulo (solleva 400 se non esiste)
     modulo_snapshot = await build_module_snapshot_or_400(payload.module_id)
@@ -143,19 +190,40 @@ async def update_exam(id: str, payload: Exam):
     doc = payload.model_dump()
     doc["modulo_snapshot"] = modulo_snapshot
     doc["data"] = normalize_exam_date(doc.get("data"))
-
-    await coll.update_one({"_id": parse_object_id(id)}, {"$set": doc})
-    updated = await coll.find_one({"_id": parse_object_id(id)})
-    return to_str_id(updated)
+    await ensure_open_year_or_409(doc["data"])
+    refs_to_db(doc, COLL)
+
+    # Documento precedente letto atomicamente con l'update: before/after dell'audit sono consecutivi
+    async with leaderboard.writing():
+        previous = await coll.find_one_and_update(
+            {"_id": parse_object_id(id)}, {"$set": doc}, return_document=ReturnDocument.BEFORE
+        )
+        if not previous:
+            raise HTTPException(status_code=404, detail="Esame non trovato")
+        updated = {**previous, **doc}
+        leaderboard.exam_removed(previous)
+        leaderboard.exam_added(updated)
+    # Il modulo può essere cambiato: invalida il report del vecchio e del nuovo
+    module_reports.invalidate(ref_str(previous.get("module_id")), payload.module_id)
+    item = to_str_id(dict(updated))
+    publish_change(COLL, "updated", id, item)
+    await audit_log.record(COLL, "update", id, before=previous, after=updated)
+    return item
 
 
 @router.delete("/{id}")
 async def delete_exam(id: str):
     """
-    Elimina un esame per ID.
+    Elimina un esame per ID (409 se archiviato).
     """
     coll = get_collection(COLL)
-    res = await coll.delete_one({"_id": parse_object_id(id)})
-    if res.deleted_count == 0:
-        raise HTTPException(status_code=404, detail="Esame non trovato")
+    await find_hot_exam_or_error(parse_object_id(id))
+    async with leaderboard.writing():
+        deleted = await coll.find_one_and_delete({"_id": parse_object_id(id)})
+        if not deleted:
+            raise HTTPException(status_code=404, detail="Esame non trovato")
+        leaderboard.exam_removed(deleted)
+    module_reports.invalidate(ref_str(deleted.get("module_id")))
+    publish_change(COLL, "deleted", id)
+    await audit_log.record(COLL, "delete", id, before=deleted)
     return {"message": "Esame eliminato"}
\ No newline at end of file
@@ -0,0 +1,308 @@
+# -*- coding: utf-8 -*-
+"""
+Router per l'esportazione dei dati (CSV/XLSX):
+- Esami, filtrabili per modulo, studente e intervallo di date (archivi compresi)
+- Libretto (transcript) del singolo studente, con media finale
+
+Note pratiche:
+- Le righe vengono lette dal cursore Motor a blocchi (settings.EXPORT_BATCH_SIZE)
+  e scritte subito nella risposta: la memoria resta costante qualunque sia il numero di righe.
+- Il CSV viene inviato in streaming man mano che arrivano i batch dal DB.
+- L'XLSX non è in streaming: è un archivio zip che si può inviare solo completo. Lo
+  scriviamo con openpyxl in modalità 'write_only' su un file temporaneo (righe su disco,
+  non in RAM), un batch alla volta in un thread (fuori dall'event loop), e solo alla fine
+  lo inviamo a blocchi: il download parte quando il file è pronto.
+- Content-Disposition 'attachment' fa partire subito il download nel browser.
+"""
+
+import asyncio
+import csv
+import io
+import os
+import tempfile
+from datetime import date, datetime
+from typing import Any, AsyncIterator, Iterator, Literal, Sequence
+
+from bson import ObjectId
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
+
+from app.core import settings
+from app.core.db import get_collection
+from app.core.exam_archive import partitions, union_stages
+from app.core.refs import ref_match, ref_str
+
+router = APIRouter()
+
+ExportFormat = Literal["csv", "xlsx"]
+
+MEDIA_TYPES: dict[str, str] = {
+    "csv": "text/csv; charset=utf-8",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+# Dimensione dei blocchi inviati al client (CSV) e letti dal file temporaneo (XLSX)
+CHUNK_SIZE = 64 * 1024
+
+EXAM_COLUMNS: Sequence[str] = (
+    "id", "data", "voto", "student_id", "cognome", "nome", "email",
+    "module_id", "codice_modulo", "nome_modulo", "ore_totali", "note",
+)
+
+TRANSCRIPT_COLUMNS: Sequence[str] = ("data", "codice_modulo", "nome_modulo", "ore_totali", "voto", "note")
+
+
+# -------------------------
+# Utility locali
+# -------------------------
+
+def parse_object_id(id_str: str) -> ObjectId:
+    """
+    Prova a convertire una stringa in ObjectId.
+    Solleva 400 se la stringa non è un ObjectId valido (anziché 500).
+    """
+    try:
+        return ObjectId(id_str)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Identificativo non valido")
+
+
+def format_date(value: Any) -> str:
+    """Restituisce la data in formato YYYY-MM-DD (accetta stringhe ISO e date/datetime)."""
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()[:10]
+    return str(value or "")[:10]
+
+
+def build_exam_filter(module_id: str | None, student_id: str | None) -> dict[str, Any]:
+    """
+    Costruisce il filtro Mongo per l'esportazione esami.
+    Il filtro sulle date è per partizione (vedi app.core.exam_archive.partitions).
+    """
+    query: dict[str, Any] = {}
+    if module_id:
+        query["module_id"] = ref_match(module_id)
+    if student_id:
+        query["student_id"] = ref_match(student_id)
+    return query
+
+
+def exam_row(doc: dict[str, Any]) -> list[Any]:
+    """Trasforma un documento esame (con lo studente in 'studente') in una riga di export."""
+    snap = doc.get("modulo_snapshot") or {}
+    stud = doc.get("studente") or {}
+    return [
+        str(doc["_id"]),
+        format_date(doc.get("data")),
+        doc.get("voto"),
+        ref_str(doc.get("student_id", "")),
+        stud.get("cognome", ""),
+        stud.get("nome", ""),
+        stud.get("email", ""),
+        ref_str(doc.get("module_id", "")),
+        snap.get("codice", ""),
+        snap.get("nome", ""),
+        snap.get("ore_totali", ""),
+        doc.get("note", ""),
+    ]
+
+
+def transcript_row(doc: dict[str, Any]) -> list[Any]:
+    """Riga del libretto: dati essenziali dell'esame e snapshot del modulo."""
+    snap = doc.get("modulo_snapshot") or {}
+    return [
+        format_date(doc.get("data")),
+        snap.get("codice", ""),
+        snap.get("nome", ""),
+        snap.get("ore_totali", ""),
+        doc.get("voto"),
+        doc.get("note", ""),
+    ]
+
+
+def download_headers(filename: str) -> dict[str, str]:
+    """Header per il download diretto (niente buffering lato proxy)."""
+    return {
+        "Content-Disposition": f'attachment; filename="{filename}"',
+        "Cache-Control": "no-store",
+        "X-Accel-Buffering": "no",
+    }
+
+
+# -------------------------
+# Writer in streaming
+# -------------------------
+
+async def stream_csv(header_rows: Sequence[Sequence[Any]], rows: AsyncIterator[list[Any]]) -> AsyncIterator[bytes]:
+    """
+    Serializza le righe in CSV e le restituisce a blocchi di circa CHUNK_SIZE byte.
+    Il BOM iniziale permette a Excel di riconoscere l'UTF-8 (accenti nei nomi).
+    """
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    buf.write("\ufeff")
+    writer.writerows(header_rows)
+    async for row in rows:
+        writer.writerow(row)
+        if buf.tell() >= CHUNK_SIZE:
+            yield buf.getvalue().encode("utf-8")
+            buf.seek(0)
+            buf.truncate(0)
+    if buf.tell():
+        yield buf.getvalue().encode("utf-8")
+
+
+def iter_file_and_remove(path: str) -> Iterator[bytes]:
+    """Legge il file a blocchi e lo elimina al termine (anche se il client si disconnette)."""
+    try:
+        with open(path, "rb") as fh:
+            while chunk := fh.read(CHUNK_SIZE):
+                yield chunk
+    finally:
+        os.unlink(path)
+
+
+def append_rows(ws: Any, rows: Sequence[Sequence[Any]]) -> None:
+    """Aggiunge un batch di righe al foglio (eseguita in un thread)."""
+    for row in rows:
+        ws.append(list(row))
+
+
+async def write_xlsx(title: str, header_rows: Sequence[Sequence[Any]], rows: AsyncIterator[list[Any]]) -> str:
+    """
+    Scrive le righe in un file XLSX temporaneo (openpyxl 'write_only': le righe
+    finiscono su disco man mano) e restituisce il percorso del file.
+    Serializzazione e compressione (CPU) girano in un thread, un batch di
+    EXPORT_BATCH_SIZE righe alla volta: l'event loop resta libero durante l'export.
+    """
+    from openpyxl import Workbook  # import lazy: serve solo per l'export XLSX
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(title=title)
+    batch: list[Sequence[Any]] = list(header_rows)
+    async for row in rows:
+        batch.append(row)
+        if len(batch) >= settings.EXPORT_BATCH_SIZE:
+            await asyncio.to_thread(append_rows, ws, batch)
+            batch = []
+    if batch:
+        await asyncio.to_thread(append_rows, ws, batch)
+
+    fd, path = tempfile.mkstemp(prefix="export_", suffix=".xlsx")
+    os.close(fd)
+    try:
+        await asyncio.to_thread(wb.save, path)
+    except Exception:
+        os.unlink(path)
+        raise
+    return path
+
+
+async def export_response(
+    fmt: ExportFormat,
+    filename: str,
+    title: str,
+    header_rows: Sequence[Sequence[Any]],
+    rows: AsyncIterator[list[Any]],
+) -> StreamingResponse:
+    """Costruisce la risposta di download nel formato richiesto."""
+    headers = download_headers(f"{filename}.{fmt}")
+    if fmt == "xlsx":
+        path = await write_xlsx(title, header_rows, rows)
+        return StreamingResponse(iter_file_and_remove(path), media_type=MEDIA_TYPES["xlsx"], headers=headers)
+    return StreamingResponse(stream_csv(header_rows, rows), media_type=MEDIA_TYPES["csv"], headers=headers)
+
+
+# -------------------------
+# Endpoints
+# -------------------------
+
+@router.get("/exams")
+async def export_exams(
+    fmt: ExportFormat = Query("csv", alias="format", description="Formato: csv oppure xlsx"),
+    module_id: str | None = None,
+    student_id: str | None = None,
+    date_from: date | None = Query(None, description="Data minima (YYYY-MM-DD, inclusa)"),
+    date_to: date | None = Query(None, description="Data massima (YYYY-MM-DD, inclusa)"),
+):
+    """
+    Esporta gli esami (ordinati per data decrescente) in CSV o XLSX.
+    Ogni riga include i dati anagrafici essenziali dello studente.
+    """
+    if date_from and date_to and date_from > date_to:
+        raise HTTPException(status_code=400, detail="Intervallo di date non valido")
+
+    # Collezione calda e archivi degli anni interessati (tutti, senza intervallo)
+    parts = await partitions(date_from, date_to, everything=True)
+    match = build_exam_filter(module_id, student_id)
+    pipeline: list[dict[str, Any]] = [
+        {"$match": {**match, **parts[0].date_filter}},
+        *union_stages(parts, match),
+        {"$sort": {"data": -1, "_id": -1}},
+        # Join con lo studente: student_id è un ObjectId ($convert copre anche le stringhe non migrate)
+        {"$lookup": {
+            "from": "students",
+            "let": {"sid": {"$convert": {"input": "$student_id", "to": "objectId", "onError": None}}},
+            "pipeline": [
+                {"$match": {"$expr": {"$eq": ["$_id", "$$sid"]}}},
+                {"$project": {"_id": 0, "nome": 1, "cognome": 1, "email": 1}},
+            ],
+            "as": "studente",
+        }},
+        {"$set": {"studente": {"$first": "$studente"}}},
+    ]
+    cursor = get_collection(parts[0].collection).aggregate(
+        pipeline, batchSize=settings.EXPORT_BATCH_SIZE, allowDiskUse=True
+    )
+
+    async def rows() -> AsyncIterator[list[Any]]:
+        async for doc in cursor:
+            yield exam_row(doc)
+
+    filename = f"esami_{date.today().strftime('%Y%m%d')}"
+    return await export_response(fmt, filename, "Esami", [EXAM_COLUMNS], rows())
+
+
+@router.get("/students/{student_id}/transcript")
+async def export_student_transcript(
+    student_id: str,
+    fmt: ExportFormat = Query("csv", alias="format", description="Formato: csv oppure xlsx"),
+):
+    """
+    Esporta il libretto dello studente: intestazione anagrafica,
+    esami in ordine cronologico e media finale (calcolata durante lo streaming).
+    """
+    student = await get_collection("students").find_one({"_id": parse_object_id(student_id)})
+    if not student:
+        raise HTTPException(status_code=404, detail="Studente non trovato")
+
+    header_rows: list[list[Any]] = [
+        ["Studente", f"{student.get('cognome', '')} {student.get('nome', '')}".strip()],
+        ["Email", student.get("email", "")],
+        ["Matricola", student.get("matricola", "")],
+        [],
+        list(TRANSCRIPT_COLUMNS),
+    ]
+    # Archivi dal più vecchio, poi la collezione calda: ordine cronologico complessivo
+    parts = list(reversed(await partitions(everything=True)))
+
+    async def rows() -> AsyncIterator[list[Any]]:
+        total = 0.0
+        count = 0
+        for part in parts:
+            cursor = (
+                get_collection(part.collection)
+                .find({"student_id": ref_match(student_id), **part.date_filter})
+                .sort("data", 1)
+                .batch_size(settings.EXPORT_BATCH_SIZE)
+            )
+            async for doc in cursor:
+                voto = doc.get("voto")
+                if voto is not None:
+                    total += float(voto)
+                    count += 1
+                yield transcript_row(doc)
+        yield []
+        yield ["Media", "", "", "", round(total / count, 2) if count else "", f"{count} esami"]
+
+    return await export_response(fmt, f"libretto_{student_id}", "Libretto", header_rows, rows())
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+"""
+Router dei job in background (operazioni di manutenzione lunghe, fuori dal percorso delle richieste):
+- accodamento (202) e stato/avanzamento
+- elenco recente con filtri per stato e tipo
+- annullamento
+- tipi di job disponibili con i loro parametri
+
+L'esecuzione è nella coda di app.core.jobs (worker in ogni processo, record in MongoDB).
+"""
+
+from typing import Any, Optional
+
+from bson import ObjectId
+from fastapi import APIRouter, HTTPException, Query
+
+from app.core import maintenance  # noqa: F401  (registra i tipi di job)
+from app.core.db import get_collection
+from app.core.jobs import COLL, FINAL_STATES, JobConflict, job_queue, kinds
+from app.models.job import Job, JobCreate, JobKindInfo
+
+router = APIRouter()
+
+# Campi interni dell'esecuzione non esposti
+_HIDDEN = {"_id", "claim", "lease_until", "updated_at", "active"}
+
+
+def parse_object_id(id_str: str) -> ObjectId:
+    """
+    Prova a convertire una stringa in ObjectId.
+    Solleva 400 se la stringa non è un ObjectId valido (anziché 500).
+    """
+    try:
+        return ObjectId(id_str)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Identificativo non valido")
+
+
+def job_out(doc: dict[str, Any]) -> dict[str, Any]:
+    """Documento job → risposta API (id stringa, senza campi interni)."""
+    return {"id": str(doc["_id"]), **{k: v for k, v in doc.items() if k not in _HIDDEN}}
+
+
+@router.post("", response_model=Job, status_code=202)
+async def submit_job(payload: JobCreate):
+    """Accoda un job; lo stato si segue con GET /api/jobs/{id}. 409 se il tipo è esclusivo e già attivo."""
+    try:
+        doc = await job_queue.submit(payload.kind, payload.params, payload.max_attempts)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except JobConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return job_out(doc)
+
+
+@router.get("", response_model=list[Job])
+async def list_jobs(
+    status: Optional[str] = None,
+    kind: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=500),
+):
+    """Job più recenti, filtrabili per stato e tipo."""
+    query: dict[str, Any] = {}
+    if status:
+        query["status"] = status
+    if kind:
+        query["kind"] = kind
+    cursor = get_collection(COLL).find(query).sort("created_at", -1).limit(limit)
+    return [job_out(d) async for d in cursor]
+
+
+@router.get("/kinds", response_model=list[JobKindInfo])
+async def list_job_kinds():
+    """Tipi di job disponibili e parametri accettati (default, obbligatori, JSON Schema)."""
+    items = []
+    for spec in kinds():
+        fields = spec.params.model_fields
+        items.append({
+            "name": spec.name,
+            "description": spec.description,
+            "max_attempts": spec.max_attempts,
+            "params": {name: None if f.is_required() else f.default for name, f in fields.items()},
+            "required": [name for name, f in fields.items() if f.is_required()],
+            "params_schema": spec.params.model_json_schema(),
+        })
+    return items
+
+
+@router.get("/{job_id}", response_model=Job)
+async def get_job(job_id: str):
+    """Stato, avanzamento e risultato di un job."""
+    doc = await get_collection(COLL).find_one({"_id": parse_object_id(job_id)})
+    if not doc:
+        raise HTTPException(status_code=404, detail="Job non trovato")
+    return job_out(doc)
+
+
+@router.delete("/{job_id}", response_model=Job)
+async def cancel_job(job_id: str):
+    """
+    Annulla un job: subito se in coda, al prossimo rinnovo del lease se in esecuzione
+    (cancel_requested=true). 409 se già concluso.
+    """
+    oid = parse_object_id(job_id)
+    current = await get_collection(COLL).find_one({"_id": oid}, {"status": 1})
+    if not current:
+        raise HTTPException(status_code=404, detail="Job non trovato")
+    if current["status"] in FINAL_STATES:
+        raise HTTPException(status_code=409, detail="Job già concluso")
+    return job_out(await job_queue.cancel(oid))
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""
+Router della classifica studenti per media voti:
+- primi/ultimi N, generale o per modulo, con soglia minima di esami
+- posizione di un singolo studente
+
+La classifica è mantenuta in memoria e aggiornata dal router esami a ogni scrittura
+(vedi app.core.leaderboard): le letture non ricalcolano le medie. Il ricalcolo periodico
+gira in background; solo la prima lettura del processo attende la costruzione.
+"""
+
+from typing import Literal, Optional
+
+from bson import ObjectId
+from fastapi import APIRouter, HTTPException, Query
+
+from app.api.negotiation import NegotiatedResponse, NegotiatedRoute
+from app.core.db import get_collection
+from app.core.leaderboard import leaderboard
+from app.models.leaderboard import Leaderboard, StudentRank
+
+router = APIRouter(route_class=NegotiatedRoute, default_response_class=NegotiatedResponse)
+
+
+def parse_object_id(id_str: str) -> ObjectId:
+    """
+    Prova a convertire una stringa in ObjectId.
+    Solleva 400 se la stringa non è un ObjectId valido (anziché 500).
+    """
+    try:
+        return ObjectId(id_str)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Identificativo non valido")
+
+
+async def ensure_module_or_404(module_id: Optional[str]) -> None:
+    """Per la classifica di un modulo: 404 se il modulo non esiste."""
+    if module_id and not await get_collection("modules").find_one({"_id": parse_object_id(module_id)}, {"_id": 1}):
+        raise HTTPException(status_code=404, detail="Modulo non trovato")
+
+
+@router.get("", response_model=Leaderboard)
+async def get_leaderboard(
+    order: Literal["top", "bottom"] = Query("top", description="top: medie più alte, bottom: più basse"),
+    limit: int = Query(10, ge=1, le=100, description="Numero di studenti"),
+    module_id: Optional[str] = Query(None, description="Classifica del solo modulo"),
+    min_exams: Optional[int] = Query(None, ge=1, description="Esami minimi (non sotto la soglia configurata)"),
+):
+    """Primi o ultimi N studenti per media voti, con nome e cognome."""
+    await ensure_module_or_404(module_id)
+    await leaderboard.ensure_fresh()
+    ranking = leaderboard.ranking(module_id)
+    threshold = max(min_exams or 0, ranking.min_exams)
+    items = list(ranking.entries(limit, bottom=order == "bottom", min_exams=threshold))
+
+    # Anagrafica dei soli studenti restituiti (una query $in)
+    names = {
+        str(s["_id"]): s
+        async for s in get_collection("students").find(
+            {"_id": {"$in": [ObjectId(i["student_id"]) for i in items if ObjectId.is_valid(i["student_id"])]}},
+            {"nome": 1, "cognome": 1},
+        )
+    }
+    for item in items:
+        student = names.get(item["student_id"], {})
+        item.update(nome=student.get("nome", ""), cognome=student.get("cognome", ""))
+    return {
+        "order": order,
+        "module_id": module_id,
+        "min_exams": threshold,
+        "classificati": ranking.count(threshold),
+        "items": items,
+    }
+
+
+@router.get("/students/{student_id}", response_model=StudentRank)
+async def student_rank(student_id: str, module_id: Optional[str] = None):
+    """Posizione dello studente nella classifica generale o del modulo."""
+    if not await get_collection("students").find_one({"_id": parse_object_id(student_id)}, {"_id": 1}):
+        raise HTTPException(status_code=404, detail="Studente non trovato")
+    await ensure_module_or_404(module_id)
+    await leaderboard.ensure_fresh()
+    ranking = leaderboard.ranking(module_id)
+    position = ranking.position(student_id) or {}
+    return {"student_id": student_id, "module_id": module_id, "classificati": len(ranking), **position}
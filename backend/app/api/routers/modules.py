@@ -5,29 +5,55 @@ Router per la gestione dei Moduli:
 - Ordinamento per nome nella lista
 - Controllo univocità del codice
 - Gestione ID non validi con errore 400 (anziché 500)
+- Report statistico dei voti per modulo (con cache invalidata dagli esami)
+- Roster degli studenti iscritti (collezione 'enrollments')
 """
 
-from typing import Any
+from statistics import median
+from typing import Any, Optional
 
 from bson import ObjectId
 from fastapi import APIRouter, HTTPException
+from pymongo import ReturnDocument
 
+from app.api.negotiation import NegotiatedResponse, NegotiatedRoute
+from app.api.projection import FieldsQuery, list_response, mongo_projection, parse_fields, project_response
+from app.core.audit import audit_log
+from app.core.cache import module_reports
+from app.core import enrollments, settings
 from app.core.db import get_collection
-from app.models.module import Module, ModuleDB
+from app.core.events import publish_change
+from app.core.exam_archive import Partition, partitions, union_stages
+from app.core.leaderboard import leaderboard
+from app.core.refs import ref_match, refs_to_db, refs_to_str
+from app.models.module import Module, ModuleDB, ModuleReport
+from app.models.student import StudentDB
 
-router = APIRouter()
+router = APIRouter(route_class=NegotiatedRoute, default_response_class=NegotiatedResponse)
 COLL = "modules"
 
+# Voto minimo per superare l'esame e massimo della scala
+VOTO_SUFFICIENZA = 18
+VOTO_MASSIMO = 30
+
 
 # -------------------------
 # Utility locali
 # -------------------------
 
 def to_str_id(doc: dict[str, Any]) -> dict[str, Any]:
-    """Converte l'_id Mongo in stringa 'id' e rimuove l'_id dal documento."""
+    """Converte l'_id Mongo in stringa 'id' (e i riferimenti in stringhe) e rimuove l'_id dal documento."""
     doc["id"] = str(doc["_id"])
     doc.pop("_id", None)
-    return doc
+    return refs_to_str(doc, COLL)
+
+
+async def with_roster(item: dict[str, Any], fields: Optional[tuple[str, ...]] = None) -> dict[str, Any]:
+    """Completa 'studenti_ids' dalle iscrizioni quando gli array di compatibilità sono disattivati."""
+    enrich = enrollments.roster_enricher(COLL, fields)
+    if enrich:
+        await enrich([item])
+    return item
 
 
 def parse_object_id(id_str: str) -> ObjectId:
@@ -41,20 +67,131 @@ def parse_object_id(id_str: str) -> ObjectId:
         raise HTTPException(status_code=400, detail="Identificativo non valido")
 
 
+def percentile(sorted_values: list[int], p: float) -> float:
+    """
+    Percentile p (0–100) con interpolazione lineare tra i ranghi vicini.
+    Richiede una lista già ordinata e non vuota.
+    """
+    pos = (len(sorted_values) - 1) * p / 100
+    lo = int(pos)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (pos - lo)
+
+
+def report_pipeline(module_id: str, parts: list[Partition]) -> list[dict[str, Any]]:
+    """
+    Pipeline unica ($facet) che calcola in un solo passaggio sugli esami del modulo
+    (collezione calda più archivi, uniti con $unionWith):
+    - istogramma dei voti sufficienti ($bucket 18–30, gli altri in 'insufficienti')
+    - voti ordinati (per mediana e percentili) e conteggio dei sufficienti
+    - tentativi per studente (studenti distinti, ripetizioni, massimo tentativi)
+    - andamento mensile ($dateTrunc; $convert accetta le date non ancora migrate e scarta
+      quelle non convertibili)
+    """
+    match = {"module_id": ref_match(module_id), "voto": {"$type": "number"}}
+    return [
+        {"$match": {**match, **parts[0].date_filter}},
+        *union_stages(parts, match),
+        {"$facet": {
+            "istogramma": [
+                {"$bucket": {
+                    "groupBy": "$voto",
+                    "boundaries": list(range(VOTO_SUFFICIENZA, VOTO_MASSIMO + 2)),
+                    "default": "insufficienti",
+                    "output": {"count": {"$sum": 1}},
+                }},
+            ],
+            "voti": [
+                {"$sort": {"voto": 1}},
+                {"$group": {
+                    "_id": None,
+                    "voti": {"$push": "$voto"},
+                    "media": {"$avg": "$voto"},
+                    "promossi": {"$sum": {"$cond": [{"$gte": ["$voto", VOTO_SUFFICIENZA]}, 1, 0]}},
+                }},
+            ],
+            "tentativi": [
+                # $toString: stesso studente anche se il riferimento è in forme diverse (migrazione)
+                {"$group": {"_id": {"$toString": "$student_id"}, "n": {"$sum": 1}}},
+                {"$group": {
+                    "_id": None,
+                    "studenti": {"$sum": 1},
+                    "con_ripetizioni": {"$sum": {"$cond": [{"$gt": ["$n", 1]}, 1, 0]}},
+                    "max_tentativi": {"$max": "$n"},
+                }},
+            ],
+            "mensile": [
+                # $convert con onError: una data rimasta stringa non convertibile (migrazione
+                # non riuscita su quel documento) esce solo dall'andamento, non rompe il report
+                {"$set": {"data": {"$convert": {"input": "$data", "to": "date", "onError": None, "onNull": None}}}},
+                {"$match": {"data": {"$ne": None}}},
+                {"$group": {
+                    "_id": {"$dateTrunc": {"date": "$data", "unit": "month"}},
+                    "tentativi": {"$sum": 1},
+                    "media": {"$avg": "$voto"},
+                }},
+                {"$sort": {"_id": 1}},
+            ],
+        }},
+    ]
+
+
+def build_report(module: dict[str, Any], facet: dict[str, Any]) -> dict[str, Any]:
+    """Compone il report a partire dal risultato della pipeline $facet."""
+    counts = {b["_id"]: b["count"] for b in facet.get("istogramma", [])}
+    report: dict[str, Any] = {
+        "module_id": str(module["_id"]),
+        "codice": module.get("codice", ""),
+        "nome": module.get("nome", ""),
+        "istogramma": [
+            {"voto": v, "count": counts.get(v, 0)}
+            for v in range(VOTO_SUFFICIENZA, VOTO_MASSIMO + 1)
+        ],
+        "insufficienti": counts.get("insufficienti", 0),
+    }
+
+    stats = (facet.get("voti") or [None])[0]
+    if stats and stats["voti"]:
+        voti = stats["voti"]
+        report.update(
+            media=round(stats["media"], 2),
+            mediana=float(median(voti)),
+            p10=round(percentile(voti, 10), 2),
+            p90=round(percentile(voti, 90), 2),
+            pass_rate=round(stats["promossi"] / len(voti), 4),
+            tentativi=len(voti),
+        )
+
+    attempts = (facet.get("tentativi") or [None])[0]
+    if attempts:
+        report.update(
+            studenti=attempts["studenti"],
+            studenti_con_ripetizioni=attempts["con_ripetizioni"],
+            max_tentativi=attempts["max_tentativi"],
+        )
+
+    report["andamento_mensile"] = [
+        {"mese": m["_id"].strftime("%Y-%m"), "tentativi": m["tentativi"], "media": round(m["media"], 2)}
+        for m in facet.get("mensile", [])
+        if m["_id"] is not None
+    ]
+    return report
+
+
 # -------------------------
 # Endpoints
 # -------------------------
 
 @router.get("", response_model=list[ModuleDB])
-async def list_modules():
+async def list_modules(fields: Optional[str] = FieldsQuery):
     """
     Elenco dei moduli ordinati per nome (asc).
+    Con 'fields' restituisce solo i campi richiesti (proiezione Mongo).
     """
-    coll = get_collection(COLL)
-    items: list[dict[str, Any]] = []
-    async for d in coll.find({}).sort("nome", 1):
-        items.append(to_str_id(d))
-    return items
+    selected = parse_fields(fields, ModuleDB)
+    return await list_response(
+        get_collection(COLL), ModuleDB, {}, ("nome", 1), selected, enrollments.roster_enricher(COLL, selected)
+    )
 
 
 @router.post("", response_model=ModuleDB)
@@ -62,27 +199,94 @@ async def create_module(payload: Module):
     """
     Crea un modulo.
     - Controlla che il codice sia univoco.
+    - Gli studenti indicati in studenti_ids diventano iscrizioni (400 se qualcuno non esiste;
+      con ENROLLMENT_ARRAYS aggiorna anche 'modules_ids' degli studenti).
     """
     coll = get_collection(COLL)
     exists = await coll.find_one({"codice": payload.codice})
     if exists:
         raise HTTPException(status_code=400, detail="Codice modulo già esistente")
+    unknown = await enrollments.missing("students", payload.studenti_ids)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Studenti inesistenti: {', '.join(unknown)}")
 
-    res = await coll.insert_one(payload.model_dump())
+    data = refs_to_db(payload.model_dump(), COLL)
+    student_ids = list(data["studenti_ids"])
+    if not settings.ENROLLMENT_ARRAYS:
+        data["studenti_ids"] = []
+    res = await coll.insert_one(data)
+    await enrollments.enroll_many((s, res.inserted_id) for s in student_ids)
+    if settings.ENROLLMENT_ARRAYS:
+        for s in student_ids:
+            await enrollments.push_compat_arrays(s, res.inserted_id)
     doc = await coll.find_one({"_id": res.inserted_id})
-    return to_str_id(doc)
+    await audit_log.record(COLL, "create", res.inserted_id, after=doc)
+    item = await with_roster(to_str_id(doc))
+    publish_change(COLL, "created", item["id"], item)
+    if student_ids:
+        publish_change("students", "resync")
+    return item
 
 
 @router.get("/{id}", response_model=ModuleDB)
-async def get_module(id: str):
+async def get_module(id: str, fields: Optional[str] = FieldsQuery):
     """
     Restituisce un modulo per ID.
+    Con 'fields' restituisce solo i campi richiesti.
     """
+    selected = parse_fields(fields, ModuleDB)
     coll = get_collection(COLL)
-    doc = await coll.find_one({"_id": parse_object_id(id)})
+    doc = await coll.find_one({"_id": parse_object_id(id)}, mongo_projection(selected))
     if not doc:
         raise HTTPException(status_code=404, detail="Modulo non trovato")
-    return to_str_id(doc)
+    item = await with_roster(to_str_id(doc), selected)
+    if selected:
+        return project_response(item, ModuleDB, selected)
+    return item
+
+
+@router.get("/{id}/students", response_model=list[StudentDB])
+async def module_students(id: str):
+    """Studenti iscritti al modulo (scansione dell'indice sulle iscrizioni), ordinati per cognome."""
+    oid = parse_object_id(id)
+    if not await get_collection(COLL).find_one({"_id": oid}, {"_id": 1}):
+        raise HTTPException(status_code=404, detail="Modulo non trovato")
+    student_ids = await enrollments.roster(COLL, oid)
+    items: list[dict[str, Any]] = []
+    async for s in get_collection("students").find({"_id": {"$in": student_ids}}).sort("cognome", 1):
+        s["id"] = str(s.pop("_id"))
+        items.append(refs_to_str(s, "students"))
+    enrich = enrollments.roster_enricher("students")
+    if enrich:
+        await enrich(items)
+    return items
+
+
+@router.get("/{id}/report", response_model=ModuleReport)
+async def module_report(id: str):
+    """
+    Distribuzione dei voti del modulo: istogramma 18–30, media, mediana, p10/p90,
+    tasso di superamento e conteggio dei tentativi.
+    Il risultato resta in cache finché non cambia un esame (o il modulo stesso).
+    """
+    cached = module_reports.get(id)
+    if cached is not None:
+        return cached
+
+    # Versione letta prima del calcolo: un'invalidazione concorrente scarta il risultato
+    version = module_reports.version(id)
+    module = await get_collection(COLL).find_one({"_id": parse_object_id(id)})
+    if not module:
+        raise HTTPException(status_code=404, detail="Modulo non trovato")
+
+    facet: dict[str, Any] = {}
+    parts = await partitions(everything=True)
+    async for doc in get_collection(parts[0].collection).aggregate(report_pipeline(id, parts)):
+        facet = doc
+
+    report = build_report(module, facet)
+    module_reports.set(id, report, version)
+    return report
 
 
 @router.put("/{id}", response_model=ModuleDB)
@@ -91,8 +295,8 @@ async def update_module(id: str, payload: Module):
     Aggiorna un modulo.
     - Controlla conflitti sul codice (codice univoco su altri documenti)
     - Applica un update con $set dei campi del payload
-    Nota: se il documento include altri campi (es. studenti_ids) e non sono nel payload,
-    verranno mantenuti finché non vengono sovrascritti esplicitamente.
+    Nota: le iscrizioni (studenti_ids) non sono modificate: si gestiscono solo con
+    l'assegnazione del modulo allo studente.
     """
     coll = get_collection(COLL)
 
@@ -103,22 +307,41 @@ async def update_module(id: str, payload: Module):
 
     oid = parse_object_id(id)
 
-    # Verifica esistenza per errore 404 più chiaro
-    if not await coll.find_one({"_id": oid}):
+    # Documento precedente letto atomicamente con l'update: before/after dell'audit sono consecutivi
+    changes = payload.model_dump(exclude={"studenti_ids"})
+    current = await coll.find_one_and_update({"_id": oid}, {"$set": changes}, return_document=ReturnDocument.BEFORE)
+    if not current:
         raise HTTPException(status_code=404, detail="Modulo non trovato")
-
-    await coll.update_one({"_id": oid}, {"$set": payload.model_dump()})
-    doc = await coll.find_one({"_id": oid})
-    return to_str_id(doc)
+    module_reports.invalidate(id)
+    doc = {**current, **changes}
+    await audit_log.record(COLL, "update", id, before=current, after=doc)
+    item = await with_roster(to_str_id(doc))
+    publish_change(COLL, "updated", id, item)
+    return item
 
 
 @router.delete("/{id}")
 async def delete_module(id: str):
     """
     Elimina un modulo per ID.
+    - elimina le iscrizioni al modulo (e il suo ID dagli elenchi 'modules_ids' degli studenti),
+      con una voce 'unenroll' nell'audit log per ciascuna
+    - toglie la sua classifica e i suoi voti da quella generale
     """
     coll = get_collection(COLL)
-    res = await coll.delete_one({"_id": parse_object_id(id)})
-    if res.deleted_count == 0:
+    oid = parse_object_id(id)
+    deleted = await coll.find_one_and_delete({"_id": oid})
+    if not deleted:
         raise HTTPException(status_code=404, detail="Modulo non trovato")
+    await audit_log.record(COLL, "delete", id, before=deleted)
+    for student_id in await enrollments.remove_module(oid):
+        # Come 'enroll', la voce è sullo studente
+        await audit_log.record("students", "unenroll", student_id, before={"module_id": oid})
+    leaderboard.remove_module(id)
+    # Array di compatibilità (entrambe le forme del riferimento)
+    students = get_collection("students")
+    await students.update_many({"modules_ids": ref_match(id)}, {"$pull": {"modules_ids": ref_match(id)}})
+    module_reports.invalidate(id)
+    publish_change(COLL, "deleted", id)
+    publish_change("students", "resync")
     return {"message": "Modulo eliminato"}
\ No newline at end of file
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""
+Router di amministrazione del registro delle query lente (sola lettura):
+- occorrenze più recenti, filtrabili per collezione, rotta, forma e durata minima
+- riepilogo per forma di query (occorrenze, durata media e massima, rotte, piano di esecuzione)
+
+Le voci sono scritte da app.core.slow_queries in una collezione capped: lo storico
+copre le ultime SLOW_QUERY_CAP_MB di registrazioni.
+"""
+
+from typing import Any, Optional
+
+from fastapi import APIRouter, Query
+
+from app.core.db import get_collection
+from app.core.slow_queries import COLL
+from app.models.slow_query import SlowQuery, SlowQueryShape
+
+router = APIRouter()
+
+
+def _filters(collection: Optional[str], route: Optional[str], min_ms: float) -> dict[str, Any]:
+    query: dict[str, Any] = {}
+    if collection:
+        query["collection"] = collection
+    if route:
+        query["route"] = route
+    if min_ms:
+        query["duration_ms"] = {"$gte": min_ms}
+    return query
+
+
+@router.get("", response_model=list[SlowQuery])
+async def list_slow_queries(
+    collection: Optional[str] = None,
+    route: Optional[str] = Query(None, description="Es. 'GET /api/students/{id}'"),
+    shape_hash: Optional[str] = None,
+    min_ms: float = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+):
+    """Occorrenze dalla più recente (ordine naturale inverso della collezione capped)."""
+    query = _filters(collection, route, min_ms)
+    if shape_hash:
+        query["shape_hash"] = shape_hash
+    cursor = get_collection(COLL).find(query).sort("$natural", -1).limit(limit)
+    return [{"id": str(d.pop("_id")), **d} async for d in cursor]
+
+
+@router.get("/shapes", response_model=list[SlowQueryShape])
+async def list_slow_query_shapes(
+    collection: Optional[str] = None,
+    route: Optional[str] = None,
+    min_ms: float = Query(0, ge=0),
+    limit: int = Query(50, ge=1, le=500),
+):
+    """Forme di query per tempo totale speso (le più costose prima), con l'ultimo explain."""
+    pipeline = [
+        {"$match": _filters(collection, route, min_ms)},
+        {"$sort": {"ts": 1}},
+        {"$group": {
+            "_id": "$shape_hash",
+            "collection": {"$last": "$collection"},
+            "command": {"$last": "$command"},
+            "shape": {"$last": "$shape"},
+            "count": {"$sum": 1},
+            "total_ms": {"$sum": "$duration_ms"},
+            "avg_ms": {"$avg": "$duration_ms"},
+            "max_ms": {"$max": "$duration_ms"},
+            "last_ts": {"$last": "$ts"},
+            "routes": {"$addToSet": "$route"},
+            "explains": {"$push": "$explain"},
+        }},
+        {"$sort": {"total_ms": -1}},
+        {"$limit": limit},
+    ]
+    shapes = []
+    async for d in get_collection(COLL).aggregate(pipeline):
+        explains = [e for e in d.pop("explains") if e]
+        shapes.append({
+            **d,
+            "shape_hash": d.pop("_id"),
+            "avg_ms": round(d["avg_ms"], 1),
+            "routes": sorted(r for r in d["routes"] if r),
+            "explain": explains[-1] if explains else None,
+        })
+    return shapes
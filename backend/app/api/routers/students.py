@@ -2,30 +2,50 @@
 """
 Router per la gestione degli Studenti:
 - CRUD
-- assegnazione moduli (sincronizza anche il modulo)
+- assegnazione moduli (iscrizione nella collezione 'enrollments')
+- elenco dei moduli dello studente
 - media voti e filtro esami per soglia
 """
 
-from typing import Any
+from typing import Any, Optional
 
 from bson import ObjectId
 from fastapi import APIRouter, HTTPException
+from pymongo import ReturnDocument
 
+from app.api.negotiation import NegotiatedResponse, NegotiatedRoute
+from app.api.projection import FieldsQuery, list_response, mongo_projection, parse_fields, project_response
+from app.core import enrollments, settings
+from app.core.audit import audit_log
 from app.core.db import get_collection
+from app.core.events import publish_change
+from app.core.exam_archive import partitions
+from app.core.leaderboard import leaderboard
+from app.core.exam_dates import to_iso_date
+from app.core.refs import ref_match, refs_to_db, refs_to_str
 from app.models.student import Student, StudentDB
 from app.models.exam import ExamDB
+from app.models.module import ModuleDB
 
-router = APIRouter()
+router = APIRouter(route_class=NegotiatedRoute, default_response_class=NegotiatedResponse)
 COLL = "students"
 
 
 # Utilità locali ---------------------------------------------------------------
 
 def to_str_id(doc: dict[str, Any]) -> dict[str, Any]:
-    """Converte l'_id in stringa 'id' e rimuove '_id' dal documento."""
+    """Converte l'_id in stringa 'id' (e i riferimenti in stringhe) e rimuove '_id' dal documento."""
     doc["id"] = str(doc["_id"])
     doc.pop("_id", None)
-    return doc
+    return refs_to_str(doc, COLL)
+
+
+async def with_roster(item: dict[str, Any], fields: Optional[tuple[str, ...]] = None) -> dict[str, Any]:
+    """Completa 'modules_ids' dalle iscrizioni quando gli array di compatibilità sono disattivati."""
+    enrich = enrollments.roster_enricher(COLL, fields)
+    if enrich:
+        await enrich([item])
+    return item
 
 
 def parse_object_id(id_str: str) -> ObjectId:
@@ -42,35 +62,57 @@ def parse_object_id(id_str: str) -> ObjectId:
 # Endpoints --------------------------------------------------------------------
 
 @router.get("", response_model=list[StudentDB])
-async def list_students():
-    """Elenca gli studenti ordinati per cognome (A→Z)."""
-    coll = get_collection(COLL)
-    items: list[dict[str, Any]] = []
-    async for d in coll.find({}).sort("cognome", 1):
-        items.append(to_str_id(d))
-    return items
+async def list_students(fields: Optional[str] = FieldsQuery):
+    """Elenca gli studenti ordinati per cognome (A→Z); con 'fields' solo i campi richiesti."""
+    selected = parse_fields(fields, StudentDB)
+    return await list_response(
+        get_collection(COLL), StudentDB, {}, ("cognome", 1), selected, enrollments.roster_enricher(COLL, selected)
+    )
 
 
 @router.post("", response_model=StudentDB)
 async def create_student(payload: Student):
-    """Crea uno studente, con controllo univocità email."""
+    """
+    Crea uno studente, con controllo univocità email; i moduli indicati diventano iscrizioni
+    (400 se qualcuno non esiste; con ENROLLMENT_ARRAYS aggiorna anche 'studenti_ids' dei moduli).
+    """
     coll = get_collection(COLL)
     exists = await coll.find_one({"email": payload.email})
     if exists:
         raise HTTPException(status_code=400, detail="Email già registrata")
-    res = await coll.insert_one(payload.model_dump())
+    unknown = await enrollments.missing("modules", payload.modules_ids)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Moduli inesistenti: {', '.join(unknown)}")
+    data = refs_to_db(payload.model_dump(), COLL)
+    module_ids = list(data["modules_ids"])
+    if not settings.ENROLLMENT_ARRAYS:
+        data["modules_ids"] = []
+    res = await coll.insert_one(data)
+    await enrollments.enroll_many((res.inserted_id, m) for m in module_ids)
+    if settings.ENROLLMENT_ARRAYS:
+        for m in module_ids:
+            await enrollments.push_compat_arrays(res.inserted_id, m)
     doc = await coll.find_one({"_id": res.inserted_id})
-    return to_str_id(doc)
+    await audit_log.record(COLL, "create", res.inserted_id, after=doc)
+    item = await with_roster(to_str_id(doc))
+    publish_change(COLL, "created", item["id"], item)
+    if module_ids:
+        publish_change("modules", "resync")
+    return item
 
 
 @router.get("/{id}", response_model=StudentDB)
-async def get_student(id: str):
-    """Dettaglio studente per ID."""
+async def get_student(id: str, fields: Optional[str] = FieldsQuery):
+    """Dettaglio studente per ID; con 'fields' solo i campi richiesti."""
+    selected = parse_fields(fields, StudentDB)
     coll = get_collection(COLL)
-    doc = await coll.find_one({"_id": parse_object_id(id)})
+    doc = await coll.find_one({"_id": parse_object_id(id)}, mongo_projection(selected))
     if not doc:
         raise HTTPException(status_code=404, detail="Studente non trovato")
-    return to_str_id(doc)
+    item = await with_roster(to_str_id(doc), selected)
+    if selected:
+        return project_response(item, StudentDB, selected)
+    return item
 
 
 @router.put("/{id}", response_model=StudentDB)
@@ -78,7 +120,7 @@ async def update_student(id: str, payload: Student):
     """
     Aggiorna i dati dello studente:
     - evita conflitti di email con altri record
-    - mantiene campi non presenti nel payload (es. modules_ids) grazie a $set
+    - non modifica le iscrizioni (modules_ids è gestito solo da assign-module)
     """
     coll = get_collection(COLL)
     oid = parse_object_id(id)
@@ -88,40 +130,53 @@ async def update_student(id: str, payload: Student):
     if exists:
         raise HTTPException(status_code=400, detail="Email già in uso")
 
-    # Verifica esistenza per un 404 chiaro
-    if not await coll.find_one({"_id": oid}):
+    # Documento precedente letto atomicamente con l'update: before/after dell'audit sono consecutivi
+    changes = payload.model_dump(exclude={"modules_ids"})
+    current = await coll.find_one_and_update({"_id": oid}, {"$set": changes}, return_document=ReturnDocument.BEFORE)
+    if not current:
         raise HTTPException(status_code=404, detail="Studente non trovato")
-
-    await coll.update_one({"_id": oid}, {"$set": payload.model_dump()})
-    doc = await coll.find_one({"_id": oid})
-    return to_str_id(doc)
+    doc = {**current, **changes}
+    await audit_log.record(COLL, "update", id, before=current, after=doc)
+    item = await with_roster(to_str_id(doc))
+    publish_change(COLL, "updated", id, item)
+    return item
 
 
 @router.delete("/{id}")
 async def delete_student(id: str):
     """
     Elimina uno studente:
-    - rimuove anche il suo ID dagli elenchi 'studenti_ids' dei moduli
+    - elimina le sue iscrizioni (e il suo ID dagli elenchi 'studenti_ids' dei moduli),
+      con una voce 'unenroll' nell'audit log per ciascuna
     """
     coll = get_collection(COLL)
     oid = parse_object_id(id)
 
-    res = await coll.delete_one({"_id": oid})
-    if res.deleted_count == 0:
+    deleted = await coll.find_one_and_delete({"_id": oid})
+    if not deleted:
         raise HTTPException(status_code=404, detail="Studente non trovato")
+    await audit_log.record(COLL, "delete", id, before=deleted)
 
+    for module_id in await enrollments.remove_student(oid):
+        await audit_log.record(COLL, "unenroll", id, before={"module_id": module_id})
+    leaderboard.remove_student(id)
+    # Array di compatibilità: sempre ripuliti, anche se non più scritti (dati pre-migrazione).
+    # Rimuove il riferimento in entrambe le forme (ObjectId o stringa non ancora migrata)
     modules = get_collection("modules")
-    # Gli ID salvati in studenti_ids sono stringhe; rimuoviamo la stringa 'id'
-    await modules.update_many({}, {"$pull": {"studenti_ids": id}})
+    await modules.update_many({"studenti_ids": ref_match(id)}, {"$pull": {"studenti_ids": ref_match(id)}})
+    publish_change(COLL, "deleted", id)
+    # Più moduli possono essere cambiati: i client ricaricano l'elenco
+    publish_change("modules", "resync")
     return {"message": "Studente eliminato"}
 
 
 @router.post("/{student_id}/assign-module/{module_id}")
 async def assign_module(student_id: str, module_id: str):
     """
-    Assegna un modulo allo studente e sincronizza il modulo.
-    - Evita duplicati con $addToSet
+    Iscrive lo studente al modulo (un documento in 'enrollments').
+    - Evita duplicati (indice unico; negli array anche con il riferimento ancora stringa)
     - Controlla che studente e modulo esistano
+    - Con ENROLLMENT_ARRAYS aggiorna anche gli array di compatibilità
     """
     students = get_collection("students")
     modules = get_collection("modules")
@@ -135,30 +190,43 @@ async def assign_module(student_id: str, module_id: str):
     if not module:
         raise HTTPException(status_code=404, detail="Modulo non trovato")
 
-    # Aggiorna lo studente: salva gli ID modulo come stringhe
-    await students.update_one(
-        {"_id": parse_object_id(student_id)},
-        {"$addToSet": {"modules_ids": module_id}},
-    )
-
-    # Aggiorna il modulo: salva gli ID studente come stringhe
-    await modules.update_one(
-        {"_id": parse_object_id(module_id)},
-        {"$addToSet": {"studenti_ids": student_id}},
-    )
+    if await enrollments.enroll(parse_object_id(student_id), parse_object_id(module_id)):
+        await audit_log.record(COLL, "enroll", student_id, after={"module_id": module["_id"]})
+    if settings.ENROLLMENT_ARRAYS:
+        await enrollments.push_compat_arrays(student["_id"], module["_id"])
+    # Senza 'data': i client rileggono il singolo documento
+    publish_change(COLL, "updated", student_id)
+    publish_change("modules", "updated", module_id)
     return {"message": "Modulo assegnato e aggiornato"}
 
 
+@router.get("/{student_id}/modules", response_model=list[ModuleDB])
+async def student_modules(student_id: str):
+    """Moduli a cui è iscritto lo studente (scansione dell'indice sulle iscrizioni), ordinati per nome."""
+    oid = parse_object_id(student_id)
+    if not await get_collection(COLL).find_one({"_id": oid}, {"_id": 1}):
+        raise HTTPException(status_code=404, detail="Studente non trovato")
+    module_ids = await enrollments.roster(COLL, oid)
+    items: list[dict[str, Any]] = []
+    async for m in get_collection("modules").find({"_id": {"$in": module_ids}}).sort("nome", 1):
+        m["id"] = str(m.pop("_id"))
+        items.append(refs_to_str(m, "modules"))
+    enrich = enrollments.roster_enricher("modules")
+    if enrich:
+        await enrich(items)
+    return items
+
+
 @router.get("/{student_id}/average")
 async def student_average(student_id: str):
-    """Calcola la media dei voti dello studente (arrotondata a 2 decimali)."""
-    exams = get_collection("exams")
-    cursor = exams.find({"student_id": student_id})
+    """Calcola la media dei voti dello studente (arrotondata a 2 decimali), archivi compresi."""
     votes: list[float] = []
-    async for e in cursor:
-        voto = e.get("voto")
-        if voto is not None:
-            votes.append(float(voto))
+    for part in await partitions(everything=True):
+        cursor = get_collection(part.collection).find({"student_id": ref_match(student_id), **part.date_filter})
+        async for e in cursor:
+            voto = e.get("voto")
+            if voto is not None:
+                votes.append(float(voto))
 
     if not votes:
         return {"average": None, "count": 0}
@@ -169,11 +237,13 @@ async def student_average(student_id: str):
 
 @router.get("/{student_id}/exams", response_model=dict[str, Any])
 async def student_exams_with_min(student_id: str, min_score: int = 24):
-    """Restituisce gli esami dello studente con voto >= soglia, ordinati per data (desc)."""
-    exams = get_collection("exams")
+    """Restituisce gli esami dello studente con voto >= soglia, ordinati per data (desc), archivi compresi."""
     items: list[ExamDB] = []
-    async for e in exams.find({"student_id": student_id, "voto": {"$gte": min_score}}).sort("data", -1):
-        e["id"] = str(e["_id"])
-        e.pop("_id", None)
-        items.append(e)
+    for part in await partitions(everything=True):
+        query = {"student_id": ref_match(student_id), "voto": {"$gte": min_score}, **part.date_filter}
+        async for e in get_collection(part.collection).find(query).sort("data", -1):
+            e["id"] = str(e["_id"])
+            e.pop("_id", None)
+            e["data"] = to_iso_date(e.get("data"))
+            items.append(refs_to_str(e, "exams"))
     return {"min_score": min_score, "items": items}
\ No newline at end of file
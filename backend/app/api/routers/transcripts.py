@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""
+Router per la generazione massiva dei libretti PDF:
+- avvio di una generazione (job 'transcripts.generate' nella coda di app.core.jobs)
+- stato/avanzamento con throughput in documenti al secondo
+- download dello zip finale
+
+Note pratiche:
+- Le generazioni sono job persistiti in MongoDB: stato e avanzamento sono visibili da
+  qualunque processo, e il job riparte se il processo che lo eseguiva termina.
+- Una sola generazione alla volta (tipo di job esclusivo): una seconda richiesta riceve 409.
+- Lo zip è scritto in TRANSCRIPTS_DIR dal processo che esegue il job: con più host la
+  cartella deve essere condivisa.
+"""
+
+import os
+from datetime import date
+from typing import Any
+
+from bson import ObjectId
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import FileResponse
+
+from app.core.db import get_collection
+from app.core.jobs import COLL, CANCELLED, FAILED, SUCCEEDED, JobConflict, job_queue
+from app.core.maintenance import transcripts_path
+
+router = APIRouter()
+
+KIND = "transcripts.generate"
+
+# Stato del job → stato della generazione esposto dall'API
+_STATUS = {SUCCEEDED: "completed", FAILED: "failed", CANCELLED: "failed"}
+
+
+def run_out(doc: dict[str, Any]) -> dict[str, Any]:
+    """Job → stato della generazione (queued | running | completed | failed) con l'avanzamento."""
+    stats = doc.get("result") or doc.get("progress") or {}
+    return {
+        "id": str(doc["_id"]),
+        "status": _STATUS.get(doc["status"], doc["status"]),
+        "error": doc.get("error") if doc["status"] != SUCCEEDED else None,
+        "total": stats.get("total", 0),
+        "done": stats.get("done", 0),
+        "failed": stats.get("failed", 0),
+        "elapsed_s": stats.get("elapsed_s", 0.0),
+        "docs_per_sec": stats.get("docs_per_sec", 0.0),
+    }
+
+
+async def get_run(run_id: str) -> dict[str, Any]:
+    doc = None
+    if ObjectId.is_valid(run_id):
+        doc = await get_collection(COLL).find_one({"_id": ObjectId(run_id), "kind": KIND})
+    if not doc:
+        raise HTTPException(status_code=404, detail="Generazione non trovata")
+    return doc
+
+
+@router.post("", status_code=202)
+async def start_transcripts():
+    """Avvia la generazione dei libretti di tutti gli studenti."""
+    try:
+        doc = await job_queue.submit(KIND)
+    except JobConflict:
+        raise HTTPException(status_code=409, detail="Generazione libretti già in corso")
+    return run_out(doc)
+
+
+@router.get("/{run_id}")
+async def get_transcripts_status(run_id: str):
+    """Stato e avanzamento di una generazione (completati, errori, doc/s)."""
+    return run_out(await get_run(run_id))
+
+
+@router.get("/{run_id}/download")
+async def download_transcripts(run_id: str):
+    """Scarica lo zip dei libretti (solo a generazione completata)."""
+    doc = await get_run(run_id)
+    if doc["status"] != SUCCEEDED:
+        raise HTTPException(status_code=409, detail="Generazione non ancora completata")
+    path = transcripts_path(doc["_id"])
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Zip dei libretti non disponibile su questo server")
+    return FileResponse(
+        path,
+        media_type="application/zip",
+        filename=f"libretti_{date.today().strftime('%Y%m%d')}.zip",
+    )
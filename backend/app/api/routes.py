@@ -5,23 +5,61 @@ Qui montiamo i router specifici per:
 - Moduli (/modules)
 - Studenti (/students)
 - Esami (/exams)
+- Esportazioni CSV/XLSX (/exports)
+- Libretti PDF in batch (/transcripts)
+- Feed modifiche in SSE (/events)
+- Classifica studenti per media voti (/leaderboard)
+- Job di manutenzione in background (/jobs)
+- Audit log delle modifiche (/audit)
+- Registro delle query lente (/admin/slow-queries)
+
+Le scritture di moduli, studenti ed esami registrano l'autore per l'audit log (bind_actor).
 
 Tenere tutto qui rende chiaro e modulare l'ordine di esposizione delle risorse.
 """
 
-from fastapi import APIRouter
+from fastapi import APIRouter, Depends
 
 from app.api.routers.modules import router as modules_router
 from app.api.routers.students import router as students_router
 from app.api.routers.exams import router as exams_router
+from app.api.routers.exports import router as exports_router
+from app.api.routers.transcripts import router as transcripts_router
+from app.api.routers.events import router as events_router
+from app.api.routers.leaderboard import router as leaderboard_router
+from app.api.routers.jobs import router as jobs_router
+from app.api.routers.audit import router as audit_router
+from app.api.routers.slow_queries import router as slow_queries_router
+from app.core.audit import bind_actor
 
 router = APIRouter()
 
 # Moduli didattici
-router.include_router(modules_router, prefix="/modules", tags=["modules"])
+router.include_router(modules_router, prefix="/modules", tags=["modules"], dependencies=[Depends(bind_actor)])
 
 # Anagrafiche studenti
-router.include_router(students_router, prefix="/students", tags=["students"])
+router.include_router(students_router, prefix="/students", tags=["students"], dependencies=[Depends(bind_actor)])
 
 # Esami e valutazioni
-router.include_router(exams_router, prefix="/exams", tags=["exams"])
\ No newline at end of file
+router.include_router(exams_router, prefix="/exams", tags=["exams"], dependencies=[Depends(bind_actor)])
+
+# Esportazioni (CSV/XLSX in streaming)
+router.include_router(exports_router, prefix="/exports", tags=["exports"])
+
+# Libretti PDF (generazione massiva in background)
+router.include_router(transcripts_router, prefix="/transcripts", tags=["transcripts"])
+
+# Feed modifiche (Server-Sent Events)
+router.include_router(events_router, prefix="/events", tags=["events"])
+
+# Classifica studenti (aggiornata a ogni scrittura sugli esami)
+router.include_router(leaderboard_router, prefix="/leaderboard", tags=["leaderboard"])
+
+# Job di manutenzione (coda in background con stato persistito)
+router.include_router(jobs_router, prefix="/jobs", tags=["jobs"])
+
+# Audit log (sola lettura)
+router.include_router(audit_router, prefix="/audit", tags=["audit"])
+
+# Amministrazione: query lente con piano di esecuzione (sola lettura)
+router.include_router(slow_queries_router, prefix="/admin/slow-queries", tags=["admin"])
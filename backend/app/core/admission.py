@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+"""
+Controllo di ammissione (admission control) davanti a MongoDB.
+
+Come funziona:
+- due budget di concorrenza separati: letture (GET/HEAD) e scritture (POST/PUT/DELETE...)
+- oltre il limite le richieste aspettano in una coda limitata (FIFO)
+- se la coda è piena, o l'attesa supera la scadenza, la richiesta riceve subito
+  503 con 'Retry-After' invece di accumularsi sul pool Motor
+
+Note pratiche:
+- È un middleware ASGI puro: funziona anche con le risposte in streaming (export),
+  che occupano lo slot finché lo stream non termina.
+- Sono esclusi i percorsi fuori dal prefisso API (/health, /ready, /docs) e le
+  connessioni di lunga durata (feed SSE /api/events).
+- I limiti sono per processo: con più worker il totale è limite × worker.
+"""
+
+import asyncio
+import json
+import time
+from collections import deque
+from typing import Any, Iterable
+
+from app.core import settings
+
+# Metodi instradati sul budget di lettura
+READ_METHODS = frozenset({"GET", "HEAD", "OPTIONS"})
+
+
+class ConcurrencyBudget:
+    """Semaforo con coda d'attesa limitata, scadenza e metriche."""
+
+    def __init__(self, name: str, limit: int, max_queue: int, queue_timeout_s: float) -> None:
+        self.name = name
+        self.limit = limit
+        self.max_queue = max_queue
+        self.queue_timeout_s = queue_timeout_s
+        self.active = 0
+        self._waiters: deque[asyncio.Future] = deque()
+        # Metriche cumulative
+        self.admitted = 0
+        self.queued = 0
+        self.rejected_queue_full = 0
+        self.rejected_timeout = 0
+        self.max_queue_depth = 0
+        self.wait_time_total_s = 0.0
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._waiters)
+
+    async def acquire(self) -> bool:
+        """
+        Ottiene uno slot. Restituisce False se la richiesta va scartata
+        (coda piena o scadenza dell'attesa superata).
+        """
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            self.admitted += 1
+            return True
+        if len(self._waiters) >= self.max_queue:
+            self.rejected_queue_full += 1
+            return False
+
+        fut: asyncio.Future = asyncio.get_running_loop().create_future()
+        self._waiters.append(fut)
+        self.queued += 1
+        self.max_queue_depth = max(self.max_queue_depth, len(self._waiters))
+        t0 = time.perf_counter()
+        try:
+            # Lo slot viene passato direttamente da release() (vedi sotto)
+            await asyncio.wait_for(fut, self.queue_timeout_s)
+        except asyncio.TimeoutError:
+            self._discard(fut)
+            self.rejected_timeout += 1
+            return False
+        except asyncio.CancelledError:
+            # Client disconnesso in coda: se lo slot era già stato assegnato, va restituito
+            if fut.done() and not fut.cancelled():
+                self.release()
+            else:
+                self._discard(fut)
+            raise
+        finally:
+            self.wait_time_total_s += time.perf_counter() - t0
+        self.admitted += 1
+        return True
+
+    def release(self) -> None:
+        """Libera uno slot passandolo al primo in coda ancora in attesa."""
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+    def _discard(self, fut: asyncio.Future) -> None:
+        try:
+            self._waiters.remove(fut)
+        except ValueError:
+            pass
+
+    def metrics(self) -> dict[str, Any]:
+        return {
+            "limit": self.limit,
+            "active": self.active,
+            "queue_depth": self.queue_depth,
+            "max_queue": self.max_queue,
+            "max_queue_depth": self.max_queue_depth,
+            "admitted": self.admitted,
+            "queued": self.queued,
+            "rejected_queue_full": self.rejected_queue_full,
+            "rejected_timeout": self.rejected_timeout,
+            "avg_wait_ms": round(self.wait_time_total_s / self.queued * 1000, 2) if self.queued else 0.0,
+        }
+
+
+class AdmissionController:
+    """Sceglie il budget in base al metodo HTTP e raccoglie le metriche."""
+
+    def __init__(self, read: ConcurrencyBudget, write: ConcurrencyBudget, retry_after_s: int) -> None:
+        self.read = read
+        self.write = write
+        self.retry_after_s = retry_after_s
+
+    @classmethod
+    def from_settings(cls) -> "AdmissionController":
+        timeout = settings.ADMISSION_QUEUE_TIMEOUT_MS / 1000
+        return cls(
+            read=ConcurrencyBudget("read", settings.ADMISSION_READ_LIMIT, settings.ADMISSION_MAX_QUEUE, timeout),
+            write=ConcurrencyBudget("write", settings.ADMISSION_WRITE_LIMIT, settings.ADMISSION_MAX_QUEUE, timeout),
+            retry_after_s=settings.ADMISSION_RETRY_AFTER_S,
+        )
+
+    def budget_for(self, method: str) -> ConcurrencyBudget:
+        return self.read if method in READ_METHODS else self.write
+
+    def metrics(self) -> dict[str, Any]:
+        return {"read": self.read.metrics(), "write": self.write.metrics()}
+
+
+class AdmissionMiddleware:
+    """Middleware ASGI che applica l'AdmissionController alle rotte API."""
+
+    def __init__(self, app, controller: AdmissionController, include_prefix: str, exclude_prefixes: Iterable[str] = ()) -> None:
+        self.app = app
+        self.controller = controller
+        self.include_prefix = include_prefix
+        self.exclude_prefixes = tuple(exclude_prefixes)
+
+    async def __call__(self, scope, receive, send):
+        path = scope.get("path", "")
+        if (
+            scope["type"] != "http"
+            or not path.startswith(self.include_prefix)
+            or path.startswith(self.exclude_prefixes)
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        budget = self.controller.budget_for(scope["method"])
+        if not await budget.acquire():
+            await self._reject(send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            budget.release()
+
+    async def _reject(self, send) -> None:
+        """Risposta 503 immediata con Retry-After."""
+        body = json.dumps({"detail": "Servizio sovraccarico, riprova tra poco"}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 503,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(self.controller.retry_after_s).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+
+# Istanza condivisa (usata dal middleware e dall'endpoint /metrics)
+admission = AdmissionController.from_settings()
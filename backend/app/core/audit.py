@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+"""
+Audit log delle modifiche a esami, studenti e moduli (collezione append-only 'audit_log').
+
+Voce: {ts, collection, entity_id, action, actor, ip, changes: {campo: {old, new}}}
+- action: create | update | delete | enroll | unenroll (iscrizioni: voce sullo studente)
+- create/delete registrano tutti i campi (old o new a None), update solo quelli cambiati
+- actor: header AUDIT_ACTOR_HEADER della richiesta (o 'job:<tipo>' per i job), ip del client
+
+Group commit:
+- record() accoda la voce in memoria e ritorna subito (nessun round-trip sul percorso della scrittura)
+- un task scrive il buffer con insert_many ogni AUDIT_FLUSH_MS, o prima se si raggiungono
+  AUDIT_BATCH_SIZE voci; allo shutdown il buffer viene svuotato
+- buffer pieno (AUDIT_MAX_BUFFER, es. DB lento): la richiesta che registra scrive lei stessa
+  il buffer (backpressure invece di perdere voci)
+- scrittura che continua a fallire (DB irraggiungibile): le nuove scritture API vengono
+  rifiutate con 503 prima di eseguirle (bind_actor). record() invece accoda sempre: la modifica
+  è già salvata e la sua voce non va persa, quindi il buffer supera AUDIT_MAX_BUFFER al più
+  delle voci delle scritture già in corso (e dei job)
+- gli _id sono assegnati prima dell'invio: un batch ripetuto dopo un errore non duplica le voci
+- un crash del processo può perdere al più le voci degli ultimi AUDIT_FLUSH_MS
+
+L'API non espone modifiche né cancellazioni dell'audit log.
+"""
+
+import asyncio
+import logging
+import time
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Any, Optional
+
+from bson import ObjectId
+from fastapi import HTTPException, Request
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import BulkWriteError
+
+from app.core import settings
+from app.core.db import get_collection
+
+logger = logging.getLogger(__name__)
+
+COLL = "audit_log"
+
+AUDIT_INDEXES: dict[str, list[tuple[str, int]]] = {
+    "entity_history": [("collection", ASCENDING), ("entity_id", ASCENDING), ("ts", DESCENDING)],
+    "actor_history": [("actor", ASCENDING), ("ts", DESCENDING)],
+    "recent": [("ts", DESCENDING)],
+}
+
+# Metodi che non scrivono: nessun controllo sullo spazio nel buffer
+_READ_METHODS = frozenset({"GET", "HEAD", "OPTIONS"})
+
+
+class AuditUnavailable(RuntimeError):
+    """Audit log non scrivibile e buffer pieno: la modifica non può essere registrata."""
+
+
+# Chi esegue la richiesta o il job corrente
+_actor: ContextVar[dict[str, Optional[str]]] = ContextVar("audit_actor", default={"actor": None, "ip": None})
+
+
+async def ensure_indexes() -> None:
+    """Storico per entità, per autore e cronologico."""
+    coll = get_collection(COLL)
+    for name, keys in AUDIT_INDEXES.items():
+        await coll.create_index(keys, name=name)
+
+
+def set_actor(actor: Optional[str], ip: Optional[str] = None) -> None:
+    """Imposta l'autore delle modifiche per il task corrente (richiesta o job)."""
+    _actor.set({"actor": actor, "ip": ip})
+
+
+async def bind_actor(request: Request) -> None:
+    """
+    Dipendenza dei router scriventi: autore dall'header configurato e IP del client.
+    Le scritture vengono rifiutate (503) se l'audit log non riesce a svuotare il buffer pieno.
+    """
+    set_actor(request.headers.get(settings.AUDIT_ACTOR_HEADER) or None, request.client.host if request.client else None)
+    if request.method not in _READ_METHODS:
+        try:
+            await audit_log.ensure_capacity()
+        except AuditUnavailable as e:
+            raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(settings.ADMISSION_RETRY_AFTER_S)})
+
+
+def diff(before: dict[str, Any], after: dict[str, Any]) -> dict[str, dict[str, Any]]:
+    """Campi cambiati tra due documenti: {campo: {old, new}} (senza _id)."""
+    return {
+        key: {"old": before.get(key), "new": after.get(key)}
+        for key in sorted(before.keys() | after.keys())
+        if key != "_id" and before.get(key) != after.get(key)
+    }
+
+
+class AuditLog:
+    """Buffer in memoria con scrittura a batch (group commit)."""
+
+    def __init__(self) -> None:
+        self._buffer: list[dict[str, Any]] = []
+        self._wake = asyncio.Event()
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        # Metriche cumulative del processo
+        self.recorded = 0
+        self.written = 0
+        self.batches = 0
+        self.failures = 0
+        self.rejected = 0
+        self.max_flush_ms = 0.0
+
+    async def ensure_capacity(self) -> None:
+        """Solleva AuditUnavailable se il buffer è pieno e non si riesce a scriverlo."""
+        if not settings.AUDIT_ENABLED or len(self._buffer) < settings.AUDIT_MAX_BUFFER:
+            return
+        await self.flush()
+        if len(self._buffer) >= settings.AUDIT_MAX_BUFFER:
+            self.rejected += 1
+            raise AuditUnavailable(f"Audit log non disponibile ({len(self._buffer)} voci in attesa), riprovare più tardi")
+
+    async def record(
+        self,
+        collection: str,
+        action: str,
+        entity_id: Any,
+        before: Optional[dict[str, Any]] = None,
+        after: Optional[dict[str, Any]] = None,
+    ) -> None:
+        """
+        Registra una modifica già salvata (update senza campi cambiati: nessuna voce).
+        Non solleva eccezioni: a buffer pieno la voce è accodata comunque (il limite è in bind_actor).
+        """
+        if not settings.AUDIT_ENABLED:
+            return
+        changes = diff(before or {}, after or {})
+        if action == "update" and not changes:
+            return
+        self._buffer.append({
+            "_id": ObjectId(),
+            "ts": datetime.now(timezone.utc),
+            "collection": collection,
+            "entity_id": str(entity_id),
+            "action": action,
+            **_actor.get(),
+            "changes": changes,
+        })
+        self.recorded += 1
+        if self._task is None or len(self._buffer) >= settings.AUDIT_MAX_BUFFER:
+            # Writer non attivo (script) o buffer appena riempito: scrittura sincrona
+            await self.flush()
+        elif len(self._buffer) >= settings.AUDIT_BATCH_SIZE:
+            self._wake.set()
+
+    async def flush(self) -> None:
+        """Scrive il buffer a batch di AUDIT_BATCH_SIZE; in caso di errore le voci restano nel buffer."""
+        async with self._lock:
+            coll = get_collection(COLL)
+            while self._buffer:
+                batch = self._buffer[: settings.AUDIT_BATCH_SIZE]
+                t0 = time.perf_counter()
+                try:
+                    await coll.insert_many(batch, ordered=False)
+                except BulkWriteError as e:
+                    # Chiave duplicata = voce già scritta da un tentativo precedente
+                    if any(err.get("code") != 11000 for err in e.details.get("writeErrors", [])):
+                        self.failures += 1
+                        logger.warning("Scrittura audit log non riuscita: %s", e)
+                        return
+                except Exception as e:
+                    self.failures += 1
+                    logger.warning("Scrittura audit log non riuscita (%d voci in attesa): %s", len(self._buffer), e)
+                    return
+                del self._buffer[: len(batch)]
+                self.written += len(batch)
+                self.batches += 1
+                self.max_flush_ms = max(self.max_flush_ms, (time.perf_counter() - t0) * 1000)
+
+    def start(self) -> None:
+        """Avvia il task di scrittura periodica."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Ferma il task e scrive le voci rimaste."""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), settings.AUDIT_FLUSH_MS / 1000)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await self.flush()
+
+    def metrics(self) -> dict[str, Any]:
+        return {
+            "recorded": self.recorded,
+            "written": self.written,
+            "pending": len(self._buffer),
+            "batches": self.batches,
+            "avg_batch": round(self.written / self.batches, 1) if self.batches else 0.0,
+            "max_flush_ms": round(self.max_flush_ms, 1),
+            "failures": self.failures,
+            "rejected": self.rejected,
+        }
+
+
+# Audit log condiviso dal processo (avviato nel lifespan dell'app)
+audit_log = AuditLog()
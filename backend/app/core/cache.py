@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+"""
+Cache in memoria per risultati calcolati (es. report dei moduli).
+
+Note pratiche:
+- La cache è per processo: ogni worker Uvicorn ha la sua copia.
+- L'invalidazione è esplicita (es. quando cambia un esame del modulo); le scritture fatte
+  da altri worker non la raggiungono, quindi ogni valore scade comunque dopo ttl_s secondi.
+- Ogni chiave ha una 'versione': un calcolo iniziato prima di un'invalidazione
+  non può salvare un risultato ormai vecchio (vedi KeyedCache.set).
+"""
+
+import time
+from typing import Any, Hashable, Optional
+
+from app.core import settings
+
+
+class KeyedCache:
+    """Cache chiave → valore con invalidazione esplicita per chiave e scadenza (ttl_s, None = mai)."""
+
+    def __init__(self, ttl_s: Optional[float] = None) -> None:
+        self.ttl_s = ttl_s
+        self._data: dict[Hashable, tuple[Any, float]] = {}
+        self._versions: dict[Hashable, int] = {}
+
+    def get(self, key: Hashable) -> Any | None:
+        """Restituisce il valore in cache oppure None (anche se scaduto)."""
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if time.monotonic() >= expires_at:
+            self._data.pop(key, None)
+            return None
+        return value
+
+    def version(self, key: Hashable) -> int:
+        """Versione corrente della chiave: da leggere PRIMA di avviare il calcolo."""
+        return self._versions.get(key, 0)
+
+    def set(self, key: Hashable, value: Any, version: int) -> None:
+        """Salva il valore solo se nel frattempo la chiave non è stata invalidata."""
+        if self._versions.get(key, 0) == version:
+            expires_at = time.monotonic() + self.ttl_s if self.ttl_s else float("inf")
+            self._data[key] = (value, expires_at)
+
+    def invalidate(self, *keys: Hashable) -> None:
+        """Invalida una o più chiavi (le chiavi vuote/None vengono ignorate)."""
+        for key in keys:
+            if key is None:
+                continue
+            self._versions[key] = self._versions.get(key, 0) + 1
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        """Svuota completamente la cache."""
+        for key in list(self._data):
+            self.invalidate(key)
+
+
+# Report per modulo (/api/modules/{id}/report), invalidati dal router esami
+module_reports = KeyedCache(settings.MODULE_REPORT_TTL_S)
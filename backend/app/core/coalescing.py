@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+"""
+Coalescing "single-flight" delle GET identiche concorrenti.
+
+Come funziona:
+- la chiave è (percorso, query string normalizzata, Accept)
+- la prima richiesta (leader) avvia l'esecuzione in un task separato che cattura
+  la risposta completa (stato, header, corpo già serializzato)
+- le richieste identiche che arrivano mentre il task è in corso (follower)
+  attendono lo stesso risultato: una sola query Mongo, una sola serializzazione
+- il task è indipendente dalla richiesta leader: se il client leader si disconnette
+  (cancellazione), i follower ricevono comunque la risposta; se se ne vanno tutti,
+  il task viene cancellato (la query non consuma più il DB per nessuno)
+
+Note pratiche:
+- Niente cache: a task concluso la chiave viene rimossa, la richiesta successiva riesegue.
+- Solo risposte bufferizzabili: gli stream (export, feed SSE, download) vanno esclusi.
+- Le richieste con l'header di profilazione (PROFILE_HEADER) sono eseguite da sole: il
+  profilo è della singola richiesta. Gli header legati alla richiesta che ha eseguito l'app
+  (PER_REQUEST_HEADERS, es. 'x-profile-file' di una richiesta campionata) non vengono
+  inoltrati alle risposte condivise.
+- Va montato dentro CORS (gli header CORS dipendono dalla singola richiesta)
+  e fuori dall'admission control (i follower non occupano slot).
+"""
+
+import asyncio
+from typing import Any, Awaitable, Callable, Iterable
+from urllib.parse import parse_qsl, urlencode
+
+from app.core import settings
+from app.core.query_budget import run_until_disconnect
+
+# Risposta catturata: (status, header, corpo)
+CapturedResponse = tuple[int, list[tuple[bytes, bytes]], bytes]
+
+# Header di risposta che valgono solo per la richiesta che ha eseguito l'app
+PER_REQUEST_HEADERS = frozenset({b"x-profile-file"})
+
+
+def request_key(scope: dict[str, Any]) -> tuple[str, str, bytes]:
+    """Chiave della richiesta (coalescing e cache delle risposte): percorso, query ordinata e header Accept."""
+    query = urlencode(sorted(parse_qsl(scope.get("query_string", b"").decode("latin-1"), keep_blank_values=True)))
+    accept = b""
+    for name, value in scope.get("headers", []):
+        if name == b"accept":
+            accept = value
+            break
+    return scope["path"], query, accept
+
+
+def wants_profile(scope: dict[str, Any]) -> bool:
+    """La richiesta chiede la profilazione (header PROFILE_HEADER): va eseguita da sola."""
+    if not settings.PROFILE_ENABLED:
+        return False
+    header = settings.PROFILE_HEADER.lower().encode("latin-1")
+    return any(name == header for name, _ in scope.get("headers", []))
+
+
+def shared_headers(headers: list[tuple[bytes, bytes]]) -> list[tuple[bytes, bytes]]:
+    """Header di una risposta catturata senza quelli della singola richiesta."""
+    return [(name, value) for name, value in headers if name.lower() not in PER_REQUEST_HEADERS]
+
+
+class SingleFlight:
+    """Gruppo di esecuzioni in volo per chiave, con metriche."""
+
+    def __init__(self) -> None:
+        self._inflight: dict[Any, asyncio.Task] = {}
+        self._waiting: dict[asyncio.Task, int] = {}
+        # Metriche cumulative
+        self.leaders = 0
+        self.followers = 0
+        self.abandoned = 0
+
+    async def do(self, key: Any, factory: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Esegue factory() una sola volta per chiave tra le chiamate concorrenti
+        e restituisce a tutte lo stesso risultato (o la stessa eccezione).
+        """
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(factory())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t, k=key: self._forget(k, t))
+            self.leaders += 1
+        else:
+            self.followers += 1
+        self._waiting[task] = self._waiting.get(task, 0) + 1
+        try:
+            # shield: la cancellazione di questo chiamante non ferma il task condiviso...
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            # ...a meno che non fosse l'ultimo ad attenderlo
+            if self._waiting[task] == 1 and not task.done():
+                task.cancel()
+                self.abandoned += 1
+            raise
+        finally:
+            self._waiting[task] -= 1
+            if not self._waiting[task]:
+                del self._waiting[task]
+
+    def _forget(self, key: Any, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Evita il warning "exception was never retrieved" se nessuno attendeva più
+        if not task.cancelled():
+            task.exception()
+
+    def metrics(self) -> dict[str, Any]:
+        total = self.leaders + self.followers
+        return {
+            "inflight": len(self._inflight),
+            "leaders": self.leaders,
+            "followers": self.followers,
+            "coalesced_ratio": round(self.followers / total, 4) if total else 0.0,
+            "abandoned": self.abandoned,
+        }
+
+
+class CoalescingMiddleware:
+    """Middleware ASGI che unisce le GET identiche in volo."""
+
+    def __init__(
+        self,
+        app,
+        group: SingleFlight,
+        include_prefix: str,
+        exclude_prefixes: Iterable[str] = (),
+        cancel_on_disconnect: bool = True,
+    ) -> None:
+        self.app = app
+        self.group = group
+        self.include_prefix = include_prefix
+        self.exclude_prefixes = tuple(exclude_prefixes)
+        self.cancel_on_disconnect = cancel_on_disconnect
+
+    async def __call__(self, scope, receive, send):
+        path = scope.get("path", "")
+        if (
+            scope["type"] != "http"
+            or scope["method"] != "GET"
+            or not path.startswith(self.include_prefix)
+            or path.startswith(self.exclude_prefixes)
+            or wants_profile(scope)
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        leader_scope = dict(scope)
+
+        async def respond(scope, receive, send) -> None:
+            status, headers, body = await self.group.do(
+                request_key(scope), lambda: self._execute(leader_scope)
+            )
+            await send({"type": "http.response.start", "status": status, "headers": headers})
+            await send({"type": "http.response.body", "body": body})
+
+        if self.cancel_on_disconnect:
+            # Il task condiviso non vede il client: la disconnessione si rileva qui
+            await run_until_disconnect(respond, scope, receive, send)
+        else:
+            await respond(scope, receive, send)
+
+    async def _execute(self, scope: dict[str, Any]) -> CapturedResponse:
+        """Esegue l'app e ne cattura la risposta completa."""
+        status = 500
+        headers: list[tuple[bytes, bytes]] = []
+        chunks: list[bytes] = []
+        request_sent = False
+
+        async def receive() -> dict[str, Any]:
+            nonlocal request_sent
+            if not request_sent:
+                request_sent = True
+                return {"type": "http.request", "body": b"", "more_body": False}
+            # Nessun client reale dietro al task: non arriva mai una disconnessione
+            await asyncio.Event().wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message: dict[str, Any]) -> None:
+            nonlocal status, headers
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = list(message.get("headers", []))
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+
+        await self.app(scope, receive, send)
+        return status, shared_headers(headers), b"".join(chunks)
+
+
+# Gruppo condiviso (usato dal middleware e dall'endpoint /metrics)
+single_flight = SingleFlight()
@@ -6,10 +6,15 @@ Offre funzioni semplici per ottenere client, database e collezioni.
 Note pratiche:
 - Il client Motor è thread-safe e va riutilizzato: qui lo istanziamo una volta sola (lazy).
 - I nomi di DB e URI arrivano dalle impostazioni (vedi app/core/settings.py).
+- Il pool è configurabile da settings (MONGO_MAX_POOL_SIZE, MONGO_MIN_POOL_SIZE, timeout, compressori).
+- Con SLOW_QUERY_LOG il client registra le operazioni lente (app.core.slow_queries).
+- warm_up() apre in anticipo le connessioni minime, così la prima richiesta non paga il setup.
 - Se serve chiudere la connessione a fine vita dell'app, usa close_client() nel ciclo di shutdown.
 """
 
-from typing import Optional
+import asyncio
+import time
+from typing import Any, Optional
 
 from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase, AsyncIOMotorCollection
 from app.core import settings
@@ -18,18 +23,64 @@ from app.core import settings
 _client: Optional[AsyncIOMotorClient] = None
 
 
+def client_options() -> dict[str, Any]:
+    """
+    Opzioni del pool di connessioni lette dalle impostazioni.
+    I timeout a 0 non vengono passati: resta il default del driver.
+    """
+    opts: dict[str, Any] = {
+        "maxPoolSize": settings.MONGO_MAX_POOL_SIZE,
+        "minPoolSize": settings.MONGO_MIN_POOL_SIZE,
+    }
+    optional_ms = {
+        "maxIdleTimeMS": settings.MONGO_MAX_IDLE_TIME_MS,
+        "connectTimeoutMS": settings.MONGO_CONNECT_TIMEOUT_MS,
+        "serverSelectionTimeoutMS": settings.MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        "socketTimeoutMS": settings.MONGO_SOCKET_TIMEOUT_MS,
+        "waitQueueTimeoutMS": settings.MONGO_WAIT_QUEUE_TIMEOUT_MS,
+    }
+    opts.update({k: v for k, v in optional_ms.items() if v > 0})
+    if settings.MONGO_COMPRESSORS:
+        opts["compressors"] = settings.MONGO_COMPRESSORS
+    if settings.SLOW_QUERY_LOG:
+        # Import locale: slow_queries usa get_collection di questo modulo
+        from app.core.slow_queries import slow_queries
+        opts["event_listeners"] = [slow_queries]
+    return opts
+
+
 def get_client() -> AsyncIOMotorClient:
     """
     Restituisce il client MongoDB asincrono.
-    Se non esiste ancora, lo crea usando l'URI dalle impostazioni (settings.MONGO_URL).
+    Se non esiste ancora, lo crea usando l'URI e le opzioni di pool dalle impostazioni.
     """
     global _client
     if _client is None:
         # Istanzia il client una volta sola; Motor gestisce internamente il pool di connessioni.
-        _client = AsyncIOMotorClient(settings.MONGO_URL)
+        _client = AsyncIOMotorClient(settings.MONGO_URL, **client_options())
     return _client
 
 
+async def ping() -> float:
+    """Esegue 'ping' sul server e restituisce la latenza in millisecondi."""
+    t0 = time.perf_counter()
+    await get_client().admin.command("ping")
+    return (time.perf_counter() - t0) * 1000
+
+
+async def warm_up() -> float:
+    """
+    Prepara il pool all'avvio: verifica il server con un ping e apre subito
+    le connessioni minime (ping concorrenti), invece di aspettare il driver.
+    Restituisce la latenza del primo ping (ms); solleva eccezione se il DB non risponde.
+    """
+    latency = await ping()
+    extra = max(settings.MONGO_MIN_POOL_SIZE - 1, 0)
+    if extra:
+        await asyncio.gather(*(ping() for _ in range(extra)))
+    return latency
+
+
 def close_client() -> None:
     """
     Chiude il client MongoDB, se inizializzato.
@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+"""
+Iscrizioni studente ↔ modulo nella collezione dedicata 'enrollments'.
+
+Documento: {student_id: ObjectId, module_id: ObjectId, created_at}
+Indici unici composti in entrambe le direzioni:
+- (student_id, module_id): moduli di uno studente, iscrizione duplicata → rifiutata
+- (module_id, student_id): roster di un modulo
+Entrambe le letture sono scansioni d'indice "coperte" (nessun documento da leggere).
+
+Array di compatibilità (students.modules_ids, modules.studenti_ids):
+- con ENROLLMENT_ARRAYS attivo (default, fase di migrazione) sono mantenuti in doppia
+  scrittura e restano la vista usata dalle risposte API
+- disattivato, non vengono più scritti: le risposte li ricostruiscono dalle iscrizioni
+  (attach_rosters, una query $in per pagina) e i documenti non crescono più
+"""
+
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Iterable, Optional
+
+from bson import ObjectId
+from pymongo import ASCENDING, UpdateOne
+
+from app.core import settings
+from app.core.db import get_collection
+from app.core.refs import ref_forms
+
+COLL = "enrollments"
+
+# Vista a array per collezione: (campo array, chiave della collezione, chiave dell'altra parte)
+ROSTER_VIEWS: dict[str, tuple[str, str, str]] = {
+    "students": ("modules_ids", "student_id", "module_id"),
+    "modules": ("studenti_ids", "module_id", "student_id"),
+}
+
+
+# Indici unici composti (nome → chiavi)
+ENROLLMENT_INDEXES: dict[str, list[tuple[str, int]]] = {
+    "student_module": [("student_id", ASCENDING), ("module_id", ASCENDING)],
+    "module_student": [("module_id", ASCENDING), ("student_id", ASCENDING)],
+}
+
+
+async def ensure_indexes() -> None:
+    """Indici unici composti nelle due direzioni."""
+    coll = get_collection(COLL)
+    for name, keys in ENROLLMENT_INDEXES.items():
+        await coll.create_index(keys, unique=True, name=name)
+
+
+def _upsert_spec(student_id: ObjectId, module_id: ObjectId) -> tuple[dict[str, Any], dict[str, Any]]:
+    """Filtro e update per un'iscrizione idempotente (upsert con $setOnInsert)."""
+    key = {"student_id": student_id, "module_id": module_id}
+    return key, {"$setOnInsert": {**key, "created_at": datetime.now(timezone.utc)}}
+
+
+def enrollment_upsert(student_id: ObjectId, module_id: ObjectId) -> UpdateOne:
+    """Operazione idempotente di iscrizione (per bulk_write)."""
+    return UpdateOne(*_upsert_spec(student_id, module_id), upsert=True)
+
+
+async def enroll(student_id: ObjectId, module_id: ObjectId) -> bool:
+    """Iscrive lo studente al modulo. False se era già iscritto."""
+    result = await get_collection(COLL).update_one(*_upsert_spec(student_id, module_id), upsert=True)
+    return result.upserted_id is not None
+
+
+async def enroll_many(pairs: Iterable[tuple[ObjectId, ObjectId]]) -> int:
+    """Iscrizioni multiple in un solo bulk_write; restituisce quante erano nuove."""
+    ops = [enrollment_upsert(s, m) for s, m in pairs]
+    if not ops:
+        return 0
+    result = await get_collection(COLL).bulk_write(ops, ordered=False)
+    return result.upserted_count
+
+
+async def missing(collection: str, ids: Iterable[Any]) -> list[str]:
+    """Riferimenti (stringhe API) senza documento nella collezione ('students' o 'modules')."""
+    ids = [str(i) for i in ids]
+    valid = [ObjectId(i) for i in ids if ObjectId.is_valid(i)]
+    found = {str(d["_id"]) async for d in get_collection(collection).find({"_id": {"$in": valid}}, {"_id": 1})}
+    return [i for i in dict.fromkeys(ids) if i not in found]
+
+
+async def push_compat_arrays(student_id: ObjectId, module_id: ObjectId) -> None:
+    """Doppia scrittura negli array di compatibilità (modules_ids / studenti_ids)."""
+    # Aggiunge l'ObjectId solo se non presente in nessuna forma (anche stringa non migrata)
+    await get_collection("students").update_one(
+        {"_id": student_id, "modules_ids": {"$nin": ref_forms(str(module_id))}},
+        {"$push": {"modules_ids": module_id}},
+    )
+    await get_collection("modules").update_one(
+        {"_id": module_id, "studenti_ids": {"$nin": ref_forms(str(student_id))}},
+        {"$push": {"studenti_ids": student_id}},
+    )
+
+
+async def _remove(own: str, oid: ObjectId, other: str) -> list[ObjectId]:
+    """Elimina le iscrizioni lette (own=oid) e restituisce gli ID dell'altra parte (per l'audit log)."""
+    coll = get_collection(COLL)
+    ids = [d[other] async for d in coll.find({own: oid}, {"_id": 0, other: 1})]
+    if ids:
+        await coll.delete_many({own: oid, other: {"$in": ids}})
+    return ids
+
+
+async def remove_student(student_id: ObjectId) -> list[ObjectId]:
+    """Elimina tutte le iscrizioni di uno studente; restituisce i moduli a cui era iscritto."""
+    return await _remove("student_id", student_id, "module_id")
+
+
+async def remove_module(module_id: ObjectId) -> list[ObjectId]:
+    """Elimina tutte le iscrizioni a un modulo; restituisce gli studenti che erano iscritti."""
+    return await _remove("module_id", module_id, "student_id")
+
+
+async def roster(collection: str, oid: ObjectId) -> list[ObjectId]:
+    """ID dell'altra parte: moduli di uno studente ('students') o studenti di un modulo ('modules')."""
+    _, own, other = ROSTER_VIEWS[collection]
+    cursor = get_collection(COLL).find({own: oid}, {"_id": 0, other: 1}).sort(other, ASCENDING)
+    return [d[other] async for d in cursor]
+
+
+async def attach_rosters(items: list[dict[str, Any]], collection: str) -> None:
+    """
+    Ricostruisce l'array di compatibilità (stringhe) per i documenti API indicati,
+    con una sola query $in sulle iscrizioni.
+    """
+    if not items:
+        return
+    field, own, other = ROSTER_VIEWS[collection]
+    by_id: dict[str, list[str]] = {item["id"]: [] for item in items}
+    cursor = get_collection(COLL).find(
+        {own: {"$in": [ObjectId(i) for i in by_id]}}, {"_id": 0, own: 1, other: 1}
+    ).sort([(own, ASCENDING), (other, ASCENDING)])
+    async for d in cursor:
+        by_id[str(d[own])].append(str(d[other]))
+    for item in items:
+        item[field] = by_id[item["id"]]
+
+
+def roster_enricher(
+    collection: str, fields: Optional[Iterable[str]] = None
+) -> Optional[Callable[[list[dict[str, Any]]], Awaitable[None]]]:
+    """
+    Funzione che completa le risposte con l'array ricostruito dalle iscrizioni,
+    oppure None se non serve (array di compatibilità attivi o campo non richiesto).
+    """
+    field = ROSTER_VIEWS[collection][0]
+    if settings.ENROLLMENT_ARRAYS or (fields is not None and field not in fields):
+        return None
+    return lambda items: attach_rosters(items, collection)
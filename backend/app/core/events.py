@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+"""
+Feed delle modifiche (create/update/delete) per l'aggiornamento live della UI.
+
+Come funziona:
+- i router pubblicano un ChangeEvent dopo ogni scrittura (publish_change)
+- EventBus lo consegna a ogni sottoscrittore (una coda per connessione SSE)
+- in alternativa, con settings.EVENTS_SOURCE = "changestream" (Mongo in replica set),
+  gli eventi arrivano dal change stream del database: vedono anche le scritture
+  fatte da altri worker/processi e i router non pubblicano nulla (niente doppioni)
+
+Note pratiche:
+- Le code sono limitate: un client troppo lento riceve un evento 'resync'
+  (ricaricare la lista) invece di far crescere la memoria senza limite.
+- Il bus è per processo: con più worker usa la sorgente "changestream".
+"""
+
+import asyncio
+import itertools
+import logging
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from typing import Any, Iterator, Optional
+
+from app.core import settings
+from app.core.db import get_db
+from app.core.exam_dates import to_iso_date
+from app.core.refs import refs_to_str
+
+logger = logging.getLogger(__name__)
+
+# Collezioni osservate dal feed
+WATCHED_COLLECTIONS = ("modules", "students", "exams")
+
+# Mappa operazioni del change stream → azioni del feed
+_CHANGE_STREAM_ACTIONS = {
+    "insert": "created",
+    "update": "updated",
+    "replace": "updated",
+    "delete": "deleted",
+}
+
+_seq = itertools.count(1)
+
+
+@dataclass
+class ChangeEvent:
+    """
+    Evento del feed.
+    - action: created | updated | deleted | resync
+    - id: ID del documento (None per 'resync': ricaricare l'intera collezione)
+    - data: documento aggiornato come restituito dall'API (None se non disponibile)
+    """
+    collection: str
+    action: str
+    id: Optional[str] = None
+    data: Optional[dict[str, Any]] = None
+    seq: int = field(default_factory=lambda: next(_seq))
+    ts: float = field(default_factory=time.time)
+
+    def as_dict(self) -> dict[str, Any]:
+        return asdict(self)
+
+
+class EventBus:
+    """Pub/sub in memoria: ogni sottoscrittore ha la sua coda limitata."""
+
+    def __init__(self, queue_size: int = 256) -> None:
+        self.queue_size = queue_size
+        self._subscribers: set[asyncio.Queue] = set()
+
+    @property
+    def subscribers(self) -> int:
+        return len(self._subscribers)
+
+    def publish(self, event: ChangeEvent) -> None:
+        """Consegna l'evento a tutte le code senza mai bloccare chi scrive."""
+        for queue in self._subscribers:
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # Client troppo lento: scarta l'arretrato e chiedi una ricarica completa
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(ChangeEvent(collection=event.collection, action="resync"))
+
+    @contextmanager
+    def subscribe(self) -> Iterator[asyncio.Queue]:
+        """Registra una coda per la durata del blocco 'with'."""
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers.add(queue)
+        try:
+            yield queue
+        finally:
+            self._subscribers.discard(queue)
+
+
+# Bus condiviso dal processo
+bus = EventBus(queue_size=settings.EVENTS_QUEUE_SIZE)
+
+
+def publish_change(collection: str, action: str, id: Optional[str] = None, data: Optional[dict[str, Any]] = None) -> None:
+    """
+    Pubblica una modifica fatta da un router.
+    Con la sorgente "changestream" non fa nulla: l'evento arriva dal database.
+    """
+    if settings.EVENTS_SOURCE != "local":
+        return
+    bus.publish(ChangeEvent(collection=collection, action=action, id=id, data=data))
+
+
+# ---------------------------------------------------------------------------
+# Sorgente opzionale: change stream di MongoDB (richiede replica set)
+# ---------------------------------------------------------------------------
+
+def _event_from_change(change: dict[str, Any]) -> Optional[ChangeEvent]:
+    """Converte un documento del change stream in ChangeEvent."""
+    action = _CHANGE_STREAM_ACTIONS.get(change.get("operationType", ""))
+    if not action:
+        return None
+    doc_id = str(change["documentKey"]["_id"])
+    collection = change["ns"]["coll"]
+    data = change.get("fullDocument")
+    if data is not None:
+        # Stessa forma delle risposte API: riferimenti in stringa, data 'YYYY-MM-DD'
+        data = refs_to_str({**data, "id": doc_id}, collection)
+        data.pop("_id", None)
+        if "data" in data:
+            data["data"] = to_iso_date(data["data"])
+    return ChangeEvent(collection=collection, action=action, id=doc_id, data=data)
+
+
+async def watch_change_stream(retry_delay: float = 5.0) -> None:
+    """
+    Legge il change stream del database e inoltra gli eventi sul bus.
+    In caso di errore (es. rete) riprende dal resume token dopo una pausa.
+    """
+    pipeline = [{"$match": {
+        "ns.coll": {"$in": list(WATCHED_COLLECTIONS)},
+        "operationType": {"$in": list(_CHANGE_STREAM_ACTIONS)},
+    }}]
+    resume_token = None
+    while True:
+        try:
+            async with get_db().watch(pipeline, full_document="updateLookup", resume_after=resume_token) as stream:
+                async for change in stream:
+                    resume_token = stream.resume_token
+                    event = _event_from_change(change)
+                    if event:
+                        bus.publish(event)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning("Change stream interrotto (%s), nuovo tentativo tra %.0fs", e, retry_delay)
+            # I client potrebbero aver perso eventi: chiedi una ricarica
+            for coll in WATCHED_COLLECTIONS:
+                bus.publish(ChangeEvent(collection=coll, action="resync"))
+            await asyncio.sleep(retry_delay)
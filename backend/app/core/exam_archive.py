@@ -0,0 +1,301 @@
+# -*- coding: utf-8 -*-
+"""
+Archiviazione degli esami per anno accademico (collezione "calda" + archivi per anno).
+
+Partizioni:
+- anno accademico da settembre (ACADEMIC_YEAR_START_MONTH) ad agosto: 2023 = 2023/24
+- 'exams' (calda) contiene l'anno in corso e gli anni non ancora archiviati
+- un anno chiuso viene spostato in 'exams_archive_<anno>', con gli stessi indici sulla data
+- il registro 'exam_archives' elenca gli anni archiviati: le letture lo usano per scegliere
+  le partizioni in base all'intervallo di date richiesto (partitions)
+
+Spostamento di un anno (archive_year), a batch e ripartibile:
+1. l'anno è registrato come 'copying': da qui è in sola lettura (le scritture dell'API con
+   data in quell'anno ricevono 409) e le letture restano sulla collezione calda
+2. copia a batch (ReplaceOne upsert per _id, idempotente) con checkpoint dell'ultimo _id
+3. verifica dei conteggi, poi 'archived': le letture passano all'archivio
+4. eliminazione a batch dalla collezione calda, poi 'done'
+Prima della copia e prima dell'eliminazione si attende l'intervallo di aggiornamento del
+registro (ARCHIVE_REFRESH_S), così anche gli altri worker vedono il nuovo stato.
+
+L'archiviazione richiede date in BSON date (migrazione app.core.exam_dates completata): le
+date ancora in stringa non corrispondono ai filtri sull'anno e resterebbero nella collezione
+calda, fuori dalle letture (sotto il 'floor').
+
+Gli anni si archiviano dal più vecchio: la collezione calda contiene solo date successive
+all'ultimo anno archiviato (le letture la filtrano da quella data, il 'floor'). Leggendo le
+partizioni in ordine (calda, poi archivi dal più recente) l'ordine per data decrescente
+è quindi già quello globale, senza merge.
+"""
+
+import asyncio
+import logging
+import time as clock
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from typing import Any, Callable, Optional
+
+from bson import ObjectId
+from pymongo import ASCENDING, ReplaceOne
+
+from app.core import settings
+from app.core.db import get_collection, get_db
+from app.core.exam_dates import EXAM_INDEXES, date_range_filter, dates_migrated, to_bson_date
+
+logger = logging.getLogger(__name__)
+
+HOT = "exams"
+ARCHIVE_PREFIX = "exams_archive_"
+REGISTRY_COLL = "exam_archives"
+
+# Stati del registro per anno: sola lettura, letture dall'archivio, spostamento concluso
+COPYING, ARCHIVED, DONE = "copying", "archived", "done"
+
+# Registro in memoria: {anno: stato}, ricaricato ogni ARCHIVE_REFRESH_S secondi
+_registry: dict[int, str] = {}
+_loaded_at: Optional[float] = None
+
+
+@dataclass(frozen=True)
+class Partition:
+    """Collezione da interrogare e filtro sulla data da applicare in essa."""
+    collection: str
+    date_filter: dict[str, Any]
+
+
+# -------------------------
+# Anni accademici
+# -------------------------
+
+def academic_year(value: date) -> int:
+    """Anno di inizio dell'anno accademico a cui appartiene la data."""
+    return value.year if value.month >= settings.ACADEMIC_YEAR_START_MONTH else value.year - 1
+
+
+def year_bounds(year: int) -> tuple[date, date]:
+    """Primo e ultimo giorno (inclusi) dell'anno accademico."""
+    start = date(year, settings.ACADEMIC_YEAR_START_MONTH, 1)
+    return start, date(year + 1, settings.ACADEMIC_YEAR_START_MONTH, 1) - timedelta(days=1)
+
+
+def year_label(year: int) -> str:
+    """Etichetta leggibile dell'anno accademico (es. '2023/24')."""
+    return f"{year}/{(year + 1) % 100:02d}"
+
+
+def archive_collection(year: int) -> str:
+    """Nome della collezione di archivio dell'anno."""
+    return f"{ARCHIVE_PREFIX}{year}"
+
+
+# -------------------------
+# Registro e routing delle letture
+# -------------------------
+
+async def registry(refresh: bool = False) -> dict[int, str]:
+    """Anni presenti nel registro e relativo stato (copia in memoria con breve scadenza)."""
+    global _registry, _loaded_at
+    now = clock.monotonic()
+    if refresh or _loaded_at is None or now - _loaded_at >= settings.ARCHIVE_REFRESH_S:
+        _registry = {d["_id"]: d["state"] async for d in get_collection(REGISTRY_COLL).find({}, {"state": 1})}
+        _loaded_at = now
+    return _registry
+
+
+def _archived_years(years: dict[int, str]) -> list[int]:
+    """Anni le cui letture passano all'archivio, dal più recente."""
+    return sorted((y for y, state in years.items() if state != COPYING), reverse=True)
+
+
+async def partitions(
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    everything: bool = False,
+) -> list[Partition]:
+    """
+    Partizioni da leggere per l'intervallo richiesto, in ordine di data decrescente.
+    Senza intervallo si legge solo la collezione calda, a meno di everything=True
+    (letture "di carriera": medie, libretti, report).
+    """
+    archived = _archived_years(await registry())
+    parts: list[Partition] = []
+
+    # Collezione calda: solo date dopo l'ultimo anno archiviato (esclude i documenti
+    # di un anno già passato all'archivio ma non ancora eliminati)
+    floor = year_bounds(archived[0])[1] + timedelta(days=1) if archived else None
+    hot_from = max(date_from, floor) if date_from and floor else (date_from or floor)
+    if date_to is None or hot_from is None or hot_from <= date_to:
+        parts.append(Partition(HOT, date_range_filter(hot_from, date_to)))
+
+    if date_from is None and date_to is None and not everything:
+        return parts
+    for year in archived:
+        start, end = year_bounds(year)
+        if (date_to and date_to < start) or (date_from and date_from > end):
+            continue
+        parts.append(Partition(archive_collection(year), date_range_filter(date_from, date_to)))
+    return parts
+
+
+def union_stages(parts: list[Partition], match: dict[str, Any]) -> list[dict[str, Any]]:
+    """
+    Stadi $unionWith per aggiungere a un'aggregazione sulla prima partizione le altre
+    (ognuna con il proprio $match: 'match' + filtro sulla data della partizione).
+    """
+    return [
+        {"$unionWith": {"coll": p.collection, "pipeline": [{"$match": {**match, **p.date_filter}}]}}
+        for p in parts[1:]
+    ]
+
+
+async def find_exam(oid: ObjectId, projection: Optional[dict[str, Any]] = None) -> tuple[Optional[dict[str, Any]], str]:
+    """Cerca un esame per _id nella collezione calda e poi negli archivi (documento, collezione)."""
+    doc = await get_collection(HOT).find_one({"_id": oid}, projection)
+    if doc:
+        return doc, HOT
+    for year in _archived_years(await registry()):
+        doc = await get_collection(archive_collection(year)).find_one({"_id": oid}, projection)
+        if doc:
+            return doc, archive_collection(year)
+    return None, HOT
+
+
+async def is_closed(value: Any) -> bool:
+    """True se la data cade in un anno accademico archiviato o in archiviazione (sola lettura)."""
+    value = to_bson_date(value)
+    if not isinstance(value, datetime):
+        return False
+    return academic_year(value.date()) in await registry()
+
+
+# -------------------------
+# Archiviazione
+# -------------------------
+
+async def _publish_state(state: dict[str, Any], grace_s: float) -> None:
+    """Salva lo stato nel registro e attende che gli altri worker lo rileggano."""
+    await get_collection(REGISTRY_COLL).replace_one({"_id": state["_id"]}, state, upsert=True)
+    await registry(refresh=True)
+    if grace_s:
+        await asyncio.sleep(grace_s)
+
+
+async def archive_year(
+    year: int,
+    batch_size: int = 500,
+    pause_s: float = 0.0,
+    grace_s: Optional[float] = None,
+    on_progress: Optional[Callable[[dict[str, Any]], None]] = None,
+) -> dict[str, Any]:
+    """
+    Sposta gli esami dell'anno accademico nel suo archivio (vedi docstring del modulo).
+    Ripartibile: rieseguita riprende dallo stato salvato nel registro.
+    Solleva ValueError se l'anno non è chiuso, se restano anni precedenti da archiviare
+    o se la migrazione delle date degli esami non è completata.
+    """
+    if year >= academic_year(date.today()):
+        raise ValueError(f"L'anno accademico {year_label(year)} non è ancora chiuso")
+    grace_s = settings.ARCHIVE_REFRESH_S if grace_s is None else grace_s
+
+    hot = get_collection(HOT)
+    registry_coll = get_collection(REGISTRY_COLL)
+    start, end = year_bounds(year)
+    in_year = {"data": {"$gte": to_bson_date(start), "$lt": to_bson_date(end + timedelta(days=1))}}
+
+    state = await registry_coll.find_one({"_id": year})
+    if state and state["state"] == DONE:
+        return state
+    if not await dates_migrated():
+        raise ValueError(
+            "Esami con data ancora in formato stringa: completare prima la migrazione "
+            "(python -m app.scripts.migrate_exam_dates)"
+        )
+    if state is None:
+        older = await hot.find_one({"data": {"$type": "date", "$lt": to_bson_date(start)}}, {"_id": 1})
+        if older:
+            raise ValueError("Archiviare prima gli anni accademici precedenti")
+        state = {
+            "_id": year,
+            "collection": archive_collection(year),
+            "state": COPYING,
+            "copied": 0,
+            "removed": 0,
+            "started_at": datetime.utcnow(),
+        }
+        await _publish_state(state, grace_s)
+
+    archive = get_collection(state["collection"])
+    if state["state"] == COPYING:
+        while True:
+            query = dict(in_year)
+            if state.get("last_id") is not None:
+                query["_id"] = {"$gt": state["last_id"]}
+            batch = await hot.find(query).sort("_id", ASCENDING).limit(batch_size).to_list(batch_size)
+            if not batch:
+                break
+            await archive.bulk_write([ReplaceOne({"_id": d["_id"]}, d, upsert=True) for d in batch], ordered=False)
+            state["copied"] += len(batch)
+            state["last_id"] = batch[-1]["_id"]
+            await registry_coll.replace_one({"_id": year}, state, upsert=True)
+            if on_progress:
+                on_progress(state)
+            if pause_s:
+                await asyncio.sleep(pause_s)
+
+        for name, keys in EXAM_INDEXES.items():
+            await archive.create_index(keys, name=name)
+        hot_count = await hot.count_documents(in_year)
+        archived_count = await archive.count_documents(in_year)
+        if archived_count != hot_count:
+            raise RuntimeError(
+                f"Archivio {state['collection']} incompleto: {archived_count} esami su {hot_count}"
+            )
+        state.update(state=ARCHIVED, archived=archived_count, archived_at=datetime.utcnow())
+        await _publish_state(state, grace_s)
+
+    # Letture già sull'archivio: eliminazione a batch dalla collezione calda
+    while True:
+        ids = [d["_id"] for d in await hot.find(in_year, {"_id": 1}).limit(batch_size).to_list(batch_size)]
+        if not ids:
+            break
+        result = await hot.delete_many({"_id": {"$in": ids}})
+        state["removed"] += result.deleted_count
+        await registry_coll.replace_one({"_id": year}, state, upsert=True)
+        if on_progress:
+            on_progress(state)
+        if pause_s:
+            await asyncio.sleep(pause_s)
+
+    state.update(state=DONE, completed_at=datetime.utcnow())
+    await _publish_state(state, 0)
+    logger.info("Anno accademico %s archiviato: %s esami", year_label(year), state["archived"])
+    return state
+
+
+async def closed_years() -> list[int]:
+    """Anni accademici chiusi con esami ancora nella collezione calda, dal più vecchio."""
+    hot = get_collection(HOT)
+    oldest = await hot.find_one({"data": {"$type": "date"}}, {"data": 1}, sort=[("data", ASCENDING)])
+    if not oldest:
+        return []
+    current = academic_year(date.today())
+    registered = await registry(refresh=True)
+    years = []
+    for year in range(academic_year(oldest["data"].date()), current):
+        start, end = year_bounds(year)
+        query = {"data": {"$gte": to_bson_date(start), "$lt": to_bson_date(end + timedelta(days=1))}}
+        if await hot.find_one(query, {"_id": 1}) or registered.get(year, DONE) != DONE:
+            years.append(year)
+    return years
+
+
+async def drop_archives() -> list[str]:
+    """Elimina archivi e registro (reset del database); restituisce le collezioni eliminate."""
+    global _loaded_at
+    db = get_db()
+    names = [n for n in await db.list_collection_names() if n.startswith(ARCHIVE_PREFIX)]
+    for name in names:
+        await db.drop_collection(name)
+    await get_collection(REGISTRY_COLL).delete_many({})
+    _loaded_at = None
+    return names
@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+"""
+Date degli esami come date BSON native (exams.data) e migrazione online dal formato stringa.
+
+Formato:
+- in scrittura 'data' è salvata come datetime a mezzanotte UTC (BSON date)
+- l'API continua a esporre 'YYYY-MM-DD' (contratto invariato per il frontend)
+- durante la transizione convivono stringhe ISO e date: i filtri per intervallo
+  interrogano entrambi i formati (date_range_filter), le letture convertono entrambi
+
+Migrazione (migrate_exam_dates):
+- a batch, in ordine di _id, solo sui documenti con 'data' ancora stringa
+- ripartibile: il punto raggiunto è salvato in 'migrations_state' dopo ogni batch
+- sicura con l'API attiva: ogni update ha come condizione la stringa letta, quindi
+  non sovrascrive un esame modificato nel frattempo (che è già stato salvato come data)
+- pausa configurabile tra i batch per non competere con il traffico
+- un solo esecutore alla volta (più worker, script): lease sul documento di stato,
+  rinnovato a ogni batch; gli altri processi rinunciano (MigrationLocked) e, se chi la
+  esegue muore, la riprende il primo avvio dopo la scadenza del lease
+- al termine verifica gli indici su 'data' (create_index, senza eliminarli: restano
+  utilizzabili dalle query per tutta la durata)
+- ogni batch con conversioni invalida la cache delle risposte sugli esami
+"""
+
+import asyncio
+import logging
+from datetime import date, datetime, time, timedelta
+from typing import Any, Callable, Optional
+
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING, ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+from app.core import response_cache
+from app.core.db import get_collection
+
+logger = logging.getLogger(__name__)
+
+COLL = "exams"
+STATE_COLL = "migrations_state"
+STATE_ID = "exam_dates"
+# Durata del lease dell'esecutore (rinnovato dopo ogni batch)
+LEASE_S = 120
+
+
+class MigrationLocked(RuntimeError):
+    """La migrazione è in corso in un altro processo."""
+
+# Indici sugli esami che coinvolgono la data (nome → chiavi)
+EXAM_INDEXES: dict[str, list[tuple[str, int]]] = {
+    "data_desc": [("data", DESCENDING)],
+    "student_data": [("student_id", ASCENDING), ("data", DESCENDING)],
+    "module_data": [("module_id", ASCENDING), ("data", DESCENDING)],
+}
+
+
+def to_bson_date(value: Any) -> Any:
+    """date/datetime/'YYYY-MM-DD' → datetime a mezzanotte (BSON date). Altri valori invariati."""
+    if isinstance(value, datetime):
+        return datetime.combine(value.date(), time.min)
+    if isinstance(value, date):
+        return datetime.combine(value, time.min)
+    if isinstance(value, str):
+        try:
+            return datetime.combine(date.fromisoformat(value[:10]), time.min)
+        except ValueError:
+            return value
+    return value
+
+
+def to_iso_date(value: Any) -> Any:
+    """BSON date → 'YYYY-MM-DD' per le risposte API. Le stringhe restano invariate."""
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()[:10]
+    return value
+
+
+def date_range_filter(date_from: Optional[date], date_to: Optional[date]) -> dict[str, Any]:
+    """
+    Filtro per intervallo su 'data' valido per entrambi i formati.
+    I confronti Mongo non attraversano i tipi BSON: serve un ramo per le date e uno per
+    le stringhe (entrambi usano l'indice). A migrazione conclusa il ramo stringa è vuoto.
+    """
+    if not date_from and not date_to:
+        return {}
+    as_date: dict[str, Any] = {}
+    as_str: dict[str, Any] = {}
+    if date_from:
+        as_date["$gte"] = to_bson_date(date_from)
+        as_str["$gte"] = date_from.isoformat()
+    if date_to:
+        as_date["$lte"] = to_bson_date(date_to)
+        as_str["$lte"] = date_to.isoformat()
+    return {"$or": [{"data": as_date}, {"data": as_str}]}
+
+
+async def ensure_indexes() -> None:
+    """Crea (se mancano) gli indici sugli esami che coinvolgono la data."""
+    coll = get_collection(COLL)
+    for name, keys in EXAM_INDEXES.items():
+        await coll.create_index(keys, name=name)
+
+
+async def dates_migrated() -> bool:
+    """True se exams.data è tutto in BSON date: migrazione completata o nessuna data stringa."""
+    state = await get_collection(STATE_COLL).find_one({"_id": STATE_ID}, {"completed": 1})
+    if state and state.get("completed"):
+        return True
+    return await get_collection(COLL).find_one({"data": {"$type": "string"}}, {"_id": 1}) is None
+
+
+async def _acquire_lease(owner: str) -> Optional[dict[str, Any]]:
+    """Prende (o rinnova) il lease sul documento di stato; None se è di un altro processo."""
+    now = datetime.utcnow()
+    try:
+        return await get_collection(STATE_COLL).find_one_and_update(
+            {"_id": STATE_ID, "$or": [
+                {"lease_until": {"$exists": False}},
+                {"lease_until": {"$lt": now}},
+                {"lease_owner": owner},
+            ]},
+            {"$set": {"lease_owner": owner, "lease_until": now + timedelta(seconds=LEASE_S)}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+    except DuplicateKeyError:
+        # Il documento esiste con un lease valido di un altro processo
+        return None
+
+
+async def migrate_exam_dates(
+    batch_size: int = 500,
+    pause_s: float = 0.0,
+    on_progress: Optional[Callable[[dict[str, Any]], None]] = None,
+    restart: bool = False,
+) -> dict[str, Any]:
+    """
+    Converte exams.data da stringa ISO a BSON date, a batch e in modo ripartibile.
+    Con restart=True ignora lo stato salvato e ricontrolla tutta la collezione.
+    Restituisce lo stato finale (convertiti, ignorati, completata).
+    """
+    exams = get_collection(COLL)
+    states = get_collection(STATE_COLL)
+    if not restart:
+        saved = await states.find_one({"_id": STATE_ID})
+        if saved and saved.get("completed"):
+            return saved
+
+    owner = str(ObjectId())
+    saved = await _acquire_lease(owner)
+    if saved is None:
+        raise MigrationLocked("Migrazione date esami già in corso in un altro processo")
+    if restart or saved.get("completed"):
+        saved = {"_id": STATE_ID}
+    state = {"converted": 0, "skipped": 0, **saved, "lease_owner": owner}
+    state.pop("completed", None)
+
+    async def save() -> None:
+        # Salva lo stato rinnovando il lease; se nel frattempo è passato ad altri ci si ferma
+        state["lease_until"] = datetime.utcnow() + timedelta(seconds=LEASE_S)
+        result = await states.replace_one({"_id": STATE_ID, "lease_owner": owner}, state)
+        if not result.matched_count:
+            raise MigrationLocked("Lease della migrazione date esami perso (scaduto e preso da un altro processo)")
+
+    while True:
+        query: dict[str, Any] = {"data": {"$type": "string"}}
+        if state.get("last_id") is not None:
+            query["_id"] = {"$gt": state["last_id"]}
+        batch = await exams.find(query, {"data": 1}).sort("_id", ASCENDING).limit(batch_size).to_list(batch_size)
+        if not batch:
+            break
+
+        ops = []
+        for doc in batch:
+            converted = to_bson_date(doc["data"])
+            if isinstance(converted, datetime):
+                # Condizione sul valore letto: un esame aggiornato nel frattempo non viene toccato
+                ops.append(UpdateOne({"_id": doc["_id"], "data": doc["data"]}, {"$set": {"data": converted}}))
+            else:
+                state["skipped"] += 1
+                logger.warning("Esame %s: data non convertibile (%r)", doc["_id"], doc["data"])
+        if ops:
+            result = await exams.bulk_write(ops, ordered=False)
+            state["converted"] += result.modified_count
+            if result.modified_count:
+                await response_cache.invalidate("exams")
+
+        state["last_id"] = batch[-1]["_id"]
+        await save()
+        if on_progress:
+            on_progress(state)
+        if pause_s:
+            await asyncio.sleep(pause_s)
+
+    await ensure_indexes()
+    state.update(completed=True, completed_at=datetime.utcnow())
+    await save()
+    await states.update_one({"_id": STATE_ID, "lease_owner": owner}, {"$unset": {"lease_owner": "", "lease_until": ""}})
+    return state
+
+
+async def run_in_background(batch_size: int, pause_s: float) -> None:
+    """Task del lifespan: migrazione con log a fine lavoro (errori registrati, non propagati)."""
+    try:
+        state = await migrate_exam_dates(batch_size=batch_size, pause_s=pause_s)
+        logger.info("Migrazione date esami: %s convertiti, %s non convertibili", state["converted"], state["skipped"])
+    except asyncio.CancelledError:
+        raise
+    except MigrationLocked as e:
+        logger.info("%s", e)
+    except Exception as e:
+        # Ripartirà dal punto salvato al prossimo avvio
+        logger.warning("Migrazione date esami interrotta: %s", e)
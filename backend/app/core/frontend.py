@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+"""
+Bundle Angular di produzione servito dal backend (profilo 'python run.py --prod').
+
+- file statici dalla cartella FRONTEND_DIST (output di 'ng build --configuration=production')
+- le rotte del router Angular (es. /students/123, senza estensione) ricevono index.html
+- i percorsi sotto il prefisso API non trovati restano 404 (niente shell HTML al posto del JSON)
+
+Cache del browser:
+- file con hash nel nome (main-ABCD1234.js, chunk-..., styles-...): immutabili per un anno
+- index.html: 'no-cache' (rivalidato a ogni caricamento, così un nuovo deploy è subito visibile)
+- altri asset: solo ETag/Last-Modified di FileResponse
+"""
+
+import re
+from typing import Any
+
+from starlette.exceptions import HTTPException
+from starlette.responses import Response
+from starlette.staticfiles import StaticFiles
+
+# Nome con hash di contenuto generato dal builder Angular (esbuild)
+_HASHED = re.compile(r"-[A-Z0-9]{8}\.(?:js|mjs|css)$")
+_IMMUTABLE = "public, max-age=31536000, immutable"
+
+
+class SPAStaticFiles(StaticFiles):
+    """StaticFiles con fallback a index.html per le rotte della single-page app."""
+
+    def __init__(self, *, directory: str, api_prefix: str) -> None:
+        super().__init__(directory=directory, html=True)
+        self.api_prefix = api_prefix.rstrip("/") + "/"
+
+    async def get_response(self, path: str, scope: dict[str, Any]) -> Response:
+        try:
+            response = await super().get_response(path, scope)
+        except HTTPException as e:
+            if e.status_code != 404 or not self._is_client_route(scope["path"]):
+                raise
+            response = await super().get_response("index.html", scope)
+            path = "index.html"
+
+        if _HASHED.search(path):
+            response.headers["cache-control"] = _IMMUTABLE
+        elif path in ("", ".", "index.html") or path.endswith("/index.html"):
+            response.headers["cache-control"] = "no-cache"
+        return response
+
+    def _is_client_route(self, path: str) -> bool:
+        """Percorso gestito dal router Angular: fuori dall'API e senza estensione di file."""
+        last = path.rsplit("/", 1)[-1]
+        return not path.startswith(self.api_prefix) and "." not in last
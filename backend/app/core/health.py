@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""
+Controllo di readiness del servizio (raggiungibilità di MongoDB).
+
+Note pratiche:
+- Il ping al DB gira in background ogni settings.READY_CHECK_INTERVAL_S secondi:
+  l'endpoint /ready legge solo l'ultimo esito in cache, senza interrogare il DB
+  a ogni chiamata (i probe di orchestratori/load balancer sono frequenti).
+- /health resta un controllo di 'liveness' (il processo risponde).
+- Preparazione dello schema (indici, collezioni capped): i passi registrati con set_setup()
+  vengono eseguiti al primo ping riuscito e ripetuti a ogni controllo finché non riescono
+  tutti; fino ad allora il servizio non è 'ready' (es. DB irraggiungibile all'avvio).
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Optional
+
+from app.core.db import ping
+
+logger = logging.getLogger(__name__)
+
+
+class ReadinessProbe:
+    """Ultimo esito del controllo sul DB, aggiornato periodicamente."""
+
+    def __init__(self) -> None:
+        self.ready: bool = False
+        self.latency_ms: Optional[float] = None
+        self.error: Optional[str] = None
+        self.checked_at: Optional[float] = None
+        # Passi di preparazione ancora da completare: {nome: funzione}
+        self._setup_pending: dict[str, Callable[[], Awaitable[Any]]] = {}
+
+    @property
+    def setup_complete(self) -> bool:
+        return not self._setup_pending
+
+    @property
+    def serving(self) -> bool:
+        """DB raggiungibile e schema pronto."""
+        return self.ready and self.setup_complete
+
+    def set_setup(self, steps: dict[str, Callable[[], Awaitable[Any]]]) -> None:
+        """Registra i passi di preparazione (idempotenti: indici, collezioni)."""
+        self._setup_pending = dict(steps)
+
+    async def run_setup(self) -> bool:
+        """Esegue i passi ancora in sospeso; quelli non riusciti restano per il controllo successivo."""
+        for name, step in list(self._setup_pending.items()):
+            try:
+                await step()
+            except Exception as e:
+                logger.warning("Preparazione '%s' non riuscita (nuovo tentativo al prossimo controllo): %s", name, e)
+                continue
+            del self._setup_pending[name]
+        return self.setup_complete
+
+    def record(self, latency_ms: Optional[float] = None, error: Optional[Exception] = None) -> None:
+        """Registra l'esito di un ping (latenza se riuscito, altrimenti l'errore)."""
+        if error is not None:
+            if self.ready:
+                logger.warning("MongoDB non raggiungibile: %s", error)
+            self.ready, self.latency_ms, self.error = False, None, str(error)
+        else:
+            self.ready, self.latency_ms, self.error = True, round(latency_ms or 0.0, 2), None
+        self.checked_at = time.time()
+
+    async def check(self) -> bool:
+        """Esegue un ping e aggiorna lo stato."""
+        try:
+            self.record(latency_ms=await ping())
+        except Exception as e:
+            self.record(error=e)
+        if self.ready and self._setup_pending:
+            await self.run_setup()
+        return self.serving
+
+    async def run(self, interval: float) -> None:
+        """Loop di controllo in background (da cancellare allo shutdown)."""
+        while True:
+            await asyncio.sleep(interval)
+            await self.check()
+
+    def snapshot(self) -> dict[str, Any]:
+        """Stato corrente, con l'età del controllo in secondi."""
+        age = round(time.time() - self.checked_at, 1) if self.checked_at else None
+        return {
+            "status": "ready" if self.serving else "unavailable",
+            "db": {"reachable": self.ready, "ping_ms": self.latency_ms, "error": self.error},
+            "setup_pending": sorted(self._setup_pending),
+            "checked_s_ago": age,
+        }
+
+
+# Istanza condivisa dal processo
+readiness = ReadinessProbe()
@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+"""
+Chiavi di idempotenza ('Idempotency-Key') per le POST di creazione.
+
+Come funziona:
+- il client invia un header 'Idempotency-Key' univoco per ogni operazione logica
+  e lo riusa identico nei retry
+- al primo arrivo salviamo un segnaposto 'processing' (l'_id univoco evita le corse
+  tra retry concorrenti), eseguiamo la richiesta e memorizziamo la risposta
+- i retry con la stessa chiave ricevono la risposta memorizzata, senza rieseguire
+  validazione, controlli di esistenza o insert (header 'Idempotency-Replayed: true')
+- stessa chiave ma corpo, Content-Type o Accept diversi → 422 (l'impronta li comprende: un
+  retry in un altro formato, es. MessagePack invece di JSON, non riceve la risposta
+  memorizzata nel formato originale); richiesta originale ancora in corso → 409
+- il segnaposto ha una scadenza ('lease_until', settings.IDEMPOTENCY_LEASE_S): se il worker
+  che lo ha creato muore, un retry lo rileva scaduto e subentra (find_one_and_update);
+  l'aggiornamento finale è filtrato per 'owner', quindi il vecchio proprietario non lo sovrascrive
+
+Note pratiche:
+- Le chiavi scadono grazie a un indice TTL su 'created_at' (settings.IDEMPOTENCY_TTL_S).
+- Le risposte 5xx non vengono memorizzate: il retry riesegue la richiesta.
+- La durata del segnaposto deve superare quella massima di una richiesta (QUERY_BUDGET_WRITE_MS).
+- Il corpo viene letto per intero prima di eseguire la richiesta: oltre
+  settings.IDEMPOTENCY_MAX_BODY_BYTES si risponde 413 senza bufferizzarlo.
+"""
+
+import hashlib
+import json
+from datetime import datetime, timedelta, timezone
+from typing import Any, Iterable, Optional
+
+from bson import Binary, ObjectId
+from pymongo.errors import DuplicateKeyError
+
+from app.core import settings
+from app.core.db import get_collection
+
+COLL = "idempotency_keys"
+HEADER = b"idempotency-key"
+MAX_KEY_LENGTH = 255
+
+# Header della risposta originale da ripetere nel replay
+_REPLAYED_HEADERS = {b"content-type"}
+
+# Header della richiesta compresi nell'impronta (formato del corpo e della risposta)
+_FINGERPRINT_HEADERS = (b"content-type", b"accept")
+
+
+async def ensure_indexes() -> None:
+    """Indice TTL per la scadenza automatica delle chiavi."""
+    await get_collection(COLL).create_index(
+        "created_at", expireAfterSeconds=settings.IDEMPOTENCY_TTL_S, name="ttl_idempotency_keys"
+    )
+
+
+def fingerprint(headers: dict[bytes, bytes], body: bytes) -> str:
+    """Impronta della richiesta: corpo più Content-Type e Accept."""
+    digest = hashlib.sha256()
+    for name in _FINGERPRINT_HEADERS:
+        digest.update(headers.get(name, b"").strip().lower() + b"\0")
+    digest.update(body)
+    return digest.hexdigest()
+
+
+def _json_response(status: int, detail: str, extra_headers: Iterable[tuple[bytes, bytes]] = ()) -> tuple[int, list[tuple[bytes, bytes]], bytes]:
+    body = json.dumps({"detail": detail}).encode()
+    headers = [(b"content-type", b"application/json"), *extra_headers]
+    return status, headers, body
+
+
+class IdempotencyMiddleware:
+    """Middleware ASGI per le POST sui percorsi indicati."""
+
+    def __init__(self, app, paths: Iterable[str]) -> None:
+        self.app = app
+        self.paths = frozenset(paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+        request_headers = dict(scope.get("headers", []))
+        key = request_headers.get(HEADER)
+        if key is None:
+            await self.app(scope, receive, send)
+            return
+        if not key or len(key) > MAX_KEY_LENGTH:
+            await self._send(send, *_json_response(400, "Idempotency-Key non valida"))
+            return
+
+        max_body = settings.IDEMPOTENCY_MAX_BODY_BYTES
+        too_large = _json_response(413, f"Corpo della richiesta troppo grande (massimo {max_body} byte)")
+        length = request_headers.get(b"content-length")
+        if length is not None and length.isdigit() and int(length) > max_body:
+            await self._send(send, *too_large)
+            return
+
+        # Legge tutto il corpo: serve per l'impronta e va poi ripassato all'app
+        body = b""
+        more = True
+        while more:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+            body += message.get("body", b"")
+            if len(body) > max_body:
+                await self._send(send, *too_large)
+                return
+            more = message.get("more_body", False)
+
+        coll = get_collection(COLL)
+        doc_id = f"POST {scope['path']} {key.decode('latin-1')}"
+        now = datetime.now(timezone.utc)
+        placeholder = {
+            "_id": doc_id,
+            "status": "processing",
+            "fingerprint": fingerprint(request_headers, body),
+            "owner": str(ObjectId()),
+            "created_at": now,
+            "lease_until": now + timedelta(seconds=settings.IDEMPOTENCY_LEASE_S),
+        }
+        existing = await self._claim(coll, placeholder)
+        if existing is not None:
+            await self._send(send, *self._replay(existing, placeholder["fingerprint"]))
+            return
+
+        await self._execute(scope, body, receive, send, coll, {"_id": doc_id, "owner": placeholder["owner"]})
+
+    @staticmethod
+    async def _claim(coll, placeholder: dict[str, Any]) -> Optional[dict[str, Any]]:
+        """
+        Prende la chiave per questa richiesta (None) o restituisce il documento esistente.
+        Un segnaposto 'processing' scaduto con lo stesso payload viene rilevato.
+        """
+        while True:
+            try:
+                await coll.insert_one(placeholder)
+                return None
+            except DuplicateKeyError:
+                pass
+            now = placeholder["created_at"]
+            stale = await coll.find_one_and_update(
+                {
+                    "_id": placeholder["_id"],
+                    "status": "processing",
+                    "fingerprint": placeholder["fingerprint"],
+                    "$or": [
+                        {"lease_until": {"$lt": now}},
+                        # Segnaposto creati prima dell'introduzione della scadenza
+                        {"lease_until": {"$exists": False},
+                         "created_at": {"$lt": now - timedelta(seconds=settings.IDEMPOTENCY_LEASE_S)}},
+                    ],
+                },
+                {"$set": {k: placeholder[k] for k in ("owner", "created_at", "lease_until")}},
+            )
+            if stale is not None:
+                return None
+            existing = await coll.find_one({"_id": placeholder["_id"]})
+            if existing is not None:
+                return existing
+            # Chiave appena scaduta/rimossa: nuovo tentativo come prima richiesta
+
+    def _replay(self, existing: dict[str, Any], fingerprint: str) -> tuple[int, list[tuple[bytes, bytes]], bytes]:
+        """Risposta per un retry: replay, conflitto o payload diverso."""
+        if existing.get("fingerprint") != fingerprint:
+            return _json_response(422, "Idempotency-Key già usata con un payload o un formato diverso")
+        if existing.get("status") != "completed":
+            return _json_response(409, "Richiesta originale ancora in elaborazione", [(b"retry-after", b"1")])
+        headers = [(k.encode("latin-1"), v.encode("latin-1")) for k, v in existing.get("headers", [])]
+        headers.append((b"idempotency-replayed", b"true"))
+        return existing["response_status"], headers, bytes(existing.get("response_body", b""))
+
+    async def _execute(self, scope, body: bytes, client_receive, send, coll, owned: dict[str, Any]) -> None:
+        """Esegue la richiesta originale inoltrando la risposta e memorizzandola."""
+        body_sent = False
+        status = 500
+        headers: list[tuple[bytes, bytes]] = []
+        chunks: list[bytes] = []
+
+        async def receive() -> dict[str, Any]:
+            nonlocal body_sent
+            if not body_sent:
+                body_sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            # Corpo già consumato: resta solo l'eventuale disconnessione del client
+            return await client_receive()
+
+        async def capture(message: dict[str, Any]) -> None:
+            nonlocal status, headers
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = list(message.get("headers", []))
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, capture)
+        except BaseException:
+            await coll.delete_one(owned)
+            raise
+
+        if status >= 500:
+            # Errore lato server: nessun replay, il retry deve poter rieseguire
+            await coll.delete_one(owned)
+            return
+        # Filtro per 'owner': se un retry è subentrato (segnaposto scaduto) vale la sua risposta
+        await coll.update_one(owned, {"$unset": {"lease_until": ""}, "$set": {
+            "status": "completed",
+            "response_status": status,
+            "headers": [
+                (k.decode("latin-1"), v.decode("latin-1")) for k, v in headers if k.lower() in _REPLAYED_HEADERS
+            ],
+            "response_body": Binary(b"".join(chunks)),
+        }})
+
+    @staticmethod
+    async def _send(send, status: int, headers: list[tuple[bytes, bytes]], body: bytes) -> None:
+        headers = [*headers, (b"content-length", str(len(body)).encode())]
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,357 @@
+# -*- coding: utf-8 -*-
+"""
+Coda di job in background (operazioni di manutenzione lunghe) con record persistiti in MongoDB.
+
+Modello:
+- ogni job è un documento della collezione 'jobs': tipo, parametri, stato, avanzamento,
+  risultato/errore, tentativi
+- stati: queued → running → succeeded | failed | cancelled (con retry: running → queued)
+- i tipi di job si registrano con il decoratore @job (vedi app.core.maintenance):
+  l'handler riceve un JobContext e i parametri, e restituisce il risultato (dict o None)
+- i parametri sono validati all'accodamento con un modello Pydantic ricavato dalla firma
+  dell'handler (annotazioni, default, vincoli con Annotated[..., Field(...)]); nessun
+  parametro estraneo, e nel documento si salvano i valori validati con i default
+- tipi esclusivi (@job(..., exclusive=True)): al più un job in coda o in esecuzione per tipo,
+  garantito da un indice unico parziale sul campo 'active' (rimosso negli stati finali);
+  un secondo submit solleva JobConflict
+
+Esecuzione:
+- ogni processo avvia JOBS_CONCURRENCY worker asyncio; un job viene preso con un
+  find_one_and_update atomico, quindi più worker Uvicorn condividono la stessa coda
+- un job in esecuzione rinnova il suo lease ogni JOBS_LEASE_S / 4 secondi salvando anche
+  l'avanzamento; se il processo muore il lease scade e il job torna in coda (recover)
+- errore: nuovo tentativo dopo JOBS_RETRY_BACKOFF_S × 2^(tentativo-1) secondi, fino a max_attempts
+- annullamento: immediato se in coda, altrimenti il task viene cancellato al rinnovo successivo
+- allo shutdown i job in corso tornano in coda senza consumare un tentativo
+- i job conclusi vengono eliminati dopo JOBS_RETENTION_DAYS (indice TTL su finished_at)
+
+Gli handler devono essere idempotenti o ripartibili: un job può essere ripreso da capo.
+"""
+
+import asyncio
+import inspect
+import logging
+import os
+import socket
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Optional
+
+from bson import ObjectId
+from pydantic import BaseModel, ConfigDict, ValidationError, create_model
+from pymongo import ASCENDING, DESCENDING, ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from app.core import settings
+from app.core.db import get_collection
+
+logger = logging.getLogger(__name__)
+
+COLL = "jobs"
+
+QUEUED, RUNNING, SUCCEEDED, FAILED, CANCELLED = "queued", "running", "succeeded", "failed", "cancelled"
+FINAL_STATES = (SUCCEEDED, FAILED, CANCELLED)
+
+JOB_INDEXES: dict[str, dict[str, Any]] = {
+    "claim": {"keys": [("status", ASCENDING), ("run_after", ASCENDING)]},
+    "recent": {"keys": [("created_at", DESCENDING)]},
+}
+
+
+class JobConflict(Exception):
+    """Job di un tipo esclusivo già in coda o in esecuzione."""
+
+
+@dataclass(frozen=True)
+class JobKind:
+    """Tipo di job registrato."""
+    name: str
+    handler: Callable[..., Awaitable[Optional[dict[str, Any]]]]
+    description: str
+    max_attempts: int
+    params: type[BaseModel]
+    exclusive: bool = False
+
+
+_kinds: dict[str, JobKind] = {}
+
+
+def params_model(name: str, handler: Callable[..., Any]) -> type[BaseModel]:
+    """Modello dei parametri dell'handler (tutti tranne il JobContext iniziale)."""
+    fields: dict[str, Any] = {}
+    for p in list(inspect.signature(handler).parameters.values())[1:]:
+        annotation = Any if p.annotation is p.empty else p.annotation
+        fields[p.name] = (annotation, ... if p.default is p.empty else p.default)
+    model_name = "".join(part.capitalize() for part in name.replace(".", "_").split("_")) + "Params"
+    return create_model(model_name, __config__=ConfigDict(extra="forbid"), **fields)
+
+
+def job(name: str, description: str, max_attempts: int = 3, exclusive: bool = False):
+    """Decoratore che registra un handler come tipo di job."""
+    def register(handler):
+        _kinds[name] = JobKind(name, handler, description, max_attempts, params_model(name, handler), exclusive)
+        return handler
+    return register
+
+
+def kinds() -> list[JobKind]:
+    """Tipi di job registrati, in ordine di nome."""
+    return sorted(_kinds.values(), key=lambda k: k.name)
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+async def ensure_indexes() -> None:
+    """Indici per la presa dei job e l'elenco, unicità dei tipi esclusivi, TTL sui job conclusi."""
+    coll = get_collection(COLL)
+    for name, spec in JOB_INDEXES.items():
+        await coll.create_index(spec["keys"], name=name)
+    # Un solo job attivo per i tipi esclusivi ('active' = tipo, presente solo finché non concluso)
+    await coll.create_index(
+        "active", unique=True, partialFilterExpression={"active": {"$exists": True}}, name="exclusive_active"
+    )
+    await coll.create_index(
+        "finished_at", expireAfterSeconds=settings.JOBS_RETENTION_DAYS * 86400, name="ttl_finished_jobs"
+    )
+
+
+class JobContext:
+    """Passato all'handler: id del job, tentativo e avanzamento (salvato dal rinnovo del lease)."""
+
+    def __init__(self, doc: dict[str, Any]) -> None:
+        self.id: ObjectId = doc["_id"]
+        self.claim: ObjectId = doc["claim"]
+        self.attempt: int = doc.get("attempts", 1)
+        self.progress: dict[str, Any] = dict(doc.get("progress") or {})
+        self.cancel_requested = False
+
+    def update(self, **values: Any) -> None:
+        """Aggiorna l'avanzamento (chiamabile anche da callback sincrone); salvato entro un rinnovo."""
+        self.progress.update(values)
+
+
+class JobQueue:
+    """Worker della coda nel processo corrente."""
+
+    def __init__(self) -> None:
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._wake = asyncio.Event()
+        self._tasks: list[asyncio.Task] = []
+        self._stopping = False
+
+    # -- API -------------------------------------------------------------------
+
+    async def submit(self, kind: str, params: Optional[dict[str, Any]] = None, max_attempts: Optional[int] = None) -> dict[str, Any]:
+        """
+        Accoda un job e restituisce il documento creato.
+        Solleva ValueError se il tipo non esiste o i parametri non corrispondono all'handler,
+        JobConflict se il tipo è esclusivo e ce n'è già uno attivo.
+        """
+        spec = _kinds.get(kind)
+        if spec is None:
+            raise ValueError(f"Tipo di job sconosciuto: {kind!r} (disponibili: {', '.join(sorted(_kinds))})")
+        try:
+            params = spec.params.model_validate(params or {}).model_dump()
+        except ValidationError as e:
+            errors = "; ".join(f"{'.'.join(map(str, err['loc'])) or 'params'}: {err['msg']}" for err in e.errors())
+            raise ValueError(f"Parametri non validi per {kind}: {errors}") from None
+
+        now = _now()
+        doc = {
+            "kind": kind,
+            "params": params,
+            "status": QUEUED,
+            "progress": {},
+            "result": None,
+            "error": None,
+            "attempts": 0,
+            "max_attempts": max_attempts or spec.max_attempts,
+            "cancel_requested": False,
+            "created_at": now,
+            "run_after": now,
+            "updated_at": now,
+        }
+        if spec.exclusive:
+            doc["active"] = kind
+        try:
+            doc["_id"] = (await get_collection(COLL).insert_one(doc)).inserted_id
+        except DuplicateKeyError:
+            raise JobConflict(f"Un job {kind} è già in coda o in esecuzione") from None
+        self._wake.set()
+        return doc
+
+    async def cancel(self, job_id: ObjectId) -> Optional[dict[str, Any]]:
+        """Annulla un job in coda, o chiede l'annullamento di uno in esecuzione. None se non esiste."""
+        coll = get_collection(COLL)
+        now = _now()
+        doc = await coll.find_one_and_update(
+            {"_id": job_id, "status": QUEUED},
+            {
+                "$set": {"status": CANCELLED, "cancel_requested": True, "finished_at": now, "updated_at": now},
+                "$unset": {"active": ""},
+            },
+            return_document=ReturnDocument.AFTER,
+        )
+        if doc is None:
+            doc = await coll.find_one_and_update(
+                {"_id": job_id, "status": RUNNING},
+                {"$set": {"cancel_requested": True, "updated_at": now}},
+                return_document=ReturnDocument.AFTER,
+            )
+        return doc or await coll.find_one({"_id": job_id})
+
+    # -- worker ------------------------------------------------------------------
+
+    def start(self, concurrency: int) -> None:
+        """Avvia i worker e il recupero dei job con lease scaduto."""
+        self._stopping = False
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(max(1, concurrency))]
+        self._tasks.append(asyncio.create_task(self._recover_loop()))
+
+    async def stop(self) -> None:
+        """Ferma i worker; i job in corso tornano in coda."""
+        self._stopping = True
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _worker(self) -> None:
+        while True:
+            try:
+                doc = await self._claim()
+            except Exception as e:
+                logger.warning("Coda job non disponibile: %s", e)
+                doc = None
+            if doc is None:
+                try:
+                    await asyncio.wait_for(self._wake.wait(), settings.JOBS_POLL_S)
+                except asyncio.TimeoutError:
+                    pass
+                self._wake.clear()
+                continue
+            await self._execute(doc)
+
+    async def _claim(self) -> Optional[dict[str, Any]]:
+        now = _now()
+        return await get_collection(COLL).find_one_and_update(
+            {"status": QUEUED, "run_after": {"$lte": now}},
+            {
+                "$set": {
+                    "status": RUNNING,
+                    "worker": self.worker_id,
+                    "claim": ObjectId(),  # identifica questa esecuzione (aggiornamenti successivi)
+                    "started_at": now,
+                    "lease_until": now + timedelta(seconds=settings.JOBS_LEASE_S),
+                    "updated_at": now,
+                },
+                "$inc": {"attempts": 1},
+            },
+            sort=[("run_after", ASCENDING), ("_id", ASCENDING)],
+            return_document=ReturnDocument.AFTER,
+        )
+
+    async def _finish(self, ctx: JobContext, fields: dict[str, Any], inc_attempts: int = 0) -> None:
+        update: dict[str, Any] = {"$set": {**fields, "progress": ctx.progress, "updated_at": _now()}, "$unset": {"lease_until": ""}}
+        if fields["status"] in FINAL_STATES:
+            update["$unset"]["active"] = ""
+        if inc_attempts:
+            update["$inc"] = {"attempts": inc_attempts}
+        await get_collection(COLL).update_one({"_id": ctx.id, "claim": ctx.claim}, update)
+
+    async def _execute(self, doc: dict[str, Any]) -> None:
+        ctx = JobContext(doc)
+        spec = _kinds.get(doc["kind"])
+        if spec is None:
+            await self._finish(ctx, {"status": FAILED, "error": f"Tipo di job non registrato: {doc['kind']}", "finished_at": _now()})
+            return
+
+        t0 = time.perf_counter()
+        task = asyncio.create_task(spec.handler(ctx, **doc.get("params", {})))
+        heartbeat = asyncio.create_task(self._heartbeat(ctx, task))
+        try:
+            result = await task
+        except asyncio.CancelledError:
+            if ctx.cancel_requested and not self._stopping:
+                await self._finish(ctx, {"status": CANCELLED, "finished_at": _now()})
+                return
+            # Shutdown: il job torna in coda senza consumare il tentativo
+            await asyncio.shield(self._finish(ctx, {"status": QUEUED, "run_after": _now()}, inc_attempts=-1))
+            raise
+        except Exception as e:
+            if ctx.attempt < doc["max_attempts"]:
+                delay = settings.JOBS_RETRY_BACKOFF_S * 2 ** (ctx.attempt - 1)
+                logger.warning("Job %s (%s) fallito, nuovo tentativo tra %.0f s: %s", ctx.id, doc["kind"], delay, e)
+                await self._finish(ctx, {"status": QUEUED, "error": str(e), "run_after": _now() + timedelta(seconds=delay)})
+            else:
+                logger.error("Job %s (%s) fallito definitivamente: %s", ctx.id, doc["kind"], e)
+                await self._finish(ctx, {"status": FAILED, "error": str(e), "finished_at": _now()})
+        else:
+            await self._finish(ctx, {
+                "status": SUCCEEDED,
+                "result": result,
+                "error": None,
+                "finished_at": _now(),
+                "duration_s": round(time.perf_counter() - t0, 3),
+            })
+        finally:
+            heartbeat.cancel()
+
+    async def _heartbeat(self, ctx: JobContext, task: asyncio.Task) -> None:
+        """Rinnova il lease, salva l'avanzamento e applica le richieste di annullamento."""
+        coll = get_collection(COLL)
+        while not task.done():
+            await asyncio.sleep(settings.JOBS_LEASE_S / 4)
+            now = _now()
+            try:
+                doc = await coll.find_one_and_update(
+                    {"_id": ctx.id, "status": RUNNING, "claim": ctx.claim},
+                    {"$set": {
+                        "progress": ctx.progress,
+                        "lease_until": now + timedelta(seconds=settings.JOBS_LEASE_S),
+                        "updated_at": now,
+                    }},
+                    projection={"cancel_requested": 1},
+                )
+            except Exception as e:
+                logger.warning("Rinnovo del lease del job %s non riuscito: %s", ctx.id, e)
+                continue
+            if doc is None or doc.get("cancel_requested"):
+                # Annullato, oppure il lease è scaduto e il job è stato ripreso altrove
+                ctx.cancel_requested = True
+                task.cancel()
+                return
+
+    async def _recover_loop(self) -> None:
+        while True:
+            try:
+                await recover_expired()
+            except Exception as e:
+                logger.warning("Recupero dei job non riuscito: %s", e)
+            await asyncio.sleep(settings.JOBS_LEASE_S)
+
+
+async def recover_expired() -> int:
+    """Job 'running' con lease scaduto (processo terminato): di nuovo in coda o falliti. Restituisce quanti."""
+    coll = get_collection(COLL)
+    now = _now()
+    recovered = 0
+    async for doc in coll.find({"status": RUNNING, "lease_until": {"$lt": now}}, {"attempts": 1, "max_attempts": 1}):
+        if doc["attempts"] < doc["max_attempts"]:
+            fields = {"status": QUEUED, "run_after": now, "error": "Lease scaduto: job ripreso"}
+        else:
+            fields = {"status": FAILED, "error": "Lease scaduto all'ultimo tentativo", "finished_at": now}
+        unset = {"lease_until": ""} if fields["status"] == QUEUED else {"lease_until": "", "active": ""}
+        result = await coll.update_one(
+            {"_id": doc["_id"], "status": RUNNING, "lease_until": {"$lt": now}},
+            {"$set": {**fields, "updated_at": now}, "$unset": unset},
+        )
+        recovered += result.modified_count
+    return recovered
+
+
+# Coda condivisa dal processo (avviata nel lifespan dell'app)
+job_queue = JobQueue()
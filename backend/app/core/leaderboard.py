@@ -0,0 +1,340 @@
+# -*- coding: utf-8 -*-
+"""
+Classifica degli studenti per media voti, generale e per modulo, aggiornata in modo incrementale.
+
+Struttura:
+- per ogni categoria (generale, ogni modulo) una Ranking: somma e numero dei voti per
+  studente + SortedList delle chiavi di ordinamento degli studenti classificati
+- chiave: media decrescente, poi più esami sostenuti, poi ID studente (ordine stabile)
+- classificati solo gli studenti con almeno LEADERBOARD_MIN_EXAMS esami nella categoria
+- primi/ultimi N: O(log n + N); posizione di uno studente: O(log n) (SortedList.index)
+
+Aggiornamento:
+- il router esami applica la variazione di ogni scrittura (exam_added / exam_removed):
+  O(log n) per esame, nessun ricalcolo
+- studenti e moduli eliminati escono dalle classifiche (remove_student / remove_module);
+  il ricalcolo ignora gli esami che li riferiscono ancora (orfani non ancora ripuliti)
+- la classifica è per processo (come app.core.cache): le scritture fatte da altri worker
+  arrivano con il ricalcolo completo ogni LEADERBOARD_REBUILD_S secondi (un'aggregazione
+  su esami e archivi)
+
+Ricalcolo:
+- gira in un task in background: le letture intanto usano la classifica precedente (solo la
+  prima costruzione viene attesa dalla richiesta)
+- le coppie studente/modulo scritte durante il ricalcolo vengono riaggregate a parte prima
+  di pubblicare il risultato (delta), senza ripetere il ricalcolo
+- il router esami esegue scrittura e variazione dentro writing(): prima di pubblicare, il
+  ricalcolo sospende le nuove scritture, attende quelle in corso e riaggrega le loro coppie.
+  Così nessuna variazione arriva dopo la pubblicazione su un risultato che la contiene già
+  (la sospensione dura una riaggregazione delle sole coppie toccate)
+"""
+
+import asyncio
+import contextvars
+import itertools
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Iterator, Optional
+
+from sortedcontainers import SortedList
+
+from app.core import settings
+from app.core.db import get_collection
+from app.core.exam_archive import partitions
+from app.core.refs import ref_forms, ref_str
+
+logger = logging.getLogger(__name__)
+
+# Chiave di ordinamento: (-media, -esami, student_id)
+RankKey = tuple[float, int, str]
+
+
+class Ranking:
+    """Classifica di una categoria: studente → (somma voti, numero esami)."""
+
+    def __init__(self, min_exams: int = 1) -> None:
+        self.min_exams = max(1, min_exams)
+        self._stats: dict[str, tuple[float, int]] = {}
+        self._order: SortedList = SortedList()
+
+    @classmethod
+    def from_totals(cls, totals: dict[str, tuple[float, int]], min_exams: int = 1) -> "Ranking":
+        """Classifica costruita in blocco da somma e numero dei voti per studente."""
+        ranking = cls(min_exams)
+        ranking._stats = dict(totals)
+        ranking._order = SortedList(
+            cls._key(sid, total, count) for sid, (total, count) in totals.items() if count >= ranking.min_exams
+        )
+        return ranking
+
+    def __len__(self) -> int:
+        """Numero di studenti classificati (con almeno min_exams esami)."""
+        return len(self._order)
+
+    @staticmethod
+    def _key(student_id: str, total: float, count: int) -> RankKey:
+        return (-total / count, -count, student_id)
+
+    def _ranked(self, student_id: str) -> Optional[RankKey]:
+        total, count = self._stats.get(student_id, (0.0, 0))
+        return self._key(student_id, total, count) if count >= self.min_exams else None
+
+    def add(self, student_id: str, voto: float, sign: int = 1) -> None:
+        """Aggiunge (sign=1) o toglie (sign=-1) un voto dello studente."""
+        self.adjust(student_id, sign * voto, sign)
+
+    def adjust(self, student_id: str, total_delta: float, count_delta: int) -> None:
+        """Somma alle statistiche dello studente una variazione di somma e numero dei voti."""
+        old = self._ranked(student_id)
+        if old is not None:
+            self._order.remove(old)
+        total, count = self._stats.get(student_id, (0.0, 0))
+        total, count = total + total_delta, count + count_delta
+        if count <= 0:
+            self._stats.pop(student_id, None)
+            return
+        self._stats[student_id] = (total, count)
+        new = self._ranked(student_id)
+        if new is not None:
+            self._order.add(new)
+
+    def discard(self, student_id: str) -> None:
+        """Rimuove lo studente dalla categoria."""
+        old = self._ranked(student_id)
+        if old is not None:
+            self._order.remove(old)
+        self._stats.pop(student_id, None)
+
+    def _keys(self, min_exams: Optional[int]) -> Any:
+        """Chiavi ordinate dei classificati; con una soglia più alta filtra scorrendo la lista (O(n))."""
+        if min_exams and min_exams > self.min_exams:
+            return [key for key in self._order if -key[1] >= min_exams]
+        return self._order
+
+    def count(self, min_exams: Optional[int] = None) -> int:
+        """Numero di classificati con almeno min_exams esami (default: soglia della classifica)."""
+        return len(self._keys(min_exams))
+
+    def entries(self, limit: int, bottom: bool = False, min_exams: Optional[int] = None) -> Iterator[dict[str, Any]]:
+        """
+        Primi (o ultimi) 'limit' classificati con posizione, media e numero di esami.
+        Con una soglia più alta di quella della classifica le posizioni sono calcolate
+        tra i soli studenti che la superano.
+        """
+        keys = self._keys(min_exams)
+        n = len(keys)
+        ordered = reversed(keys) if bottom else iter(keys)
+        for offset, (neg_avg, neg_count, student_id) in enumerate(itertools.islice(ordered, limit)):
+            yield {
+                "rank": n - offset if bottom else offset + 1,
+                "student_id": student_id,
+                "media": round(-neg_avg, 2),
+                "esami": -neg_count,
+            }
+
+    def position(self, student_id: str) -> Optional[dict[str, Any]]:
+        """Posizione (1 = migliore) e statistiche dello studente; None se non ha esami."""
+        if student_id not in self._stats:
+            return None
+        total, count = self._stats[student_id]
+        key = self._ranked(student_id)
+        return {
+            "rank": self._order.index(key) + 1 if key is not None else None,
+            "media": round(total / count, 2),
+            "esami": count,
+        }
+
+
+class Leaderboard:
+    """Classifica generale e per modulo, con ricalcolo periodico dal database."""
+
+    def __init__(self) -> None:
+        self.overall = Ranking(settings.LEADERBOARD_MIN_EXAMS)
+        self.modules: dict[str, Ranking] = {}
+        self._built_at: Optional[float] = None
+        # Durante un ricalcolo: coppie (studente, modulo) scritte e studenti/moduli eliminati
+        self._touched: Optional[set[tuple[str, str]]] = None
+        self._removed: tuple[set[str], set[str]] = (set(), set())
+        self._task: Optional[asyncio.Task] = None
+        # Scritture di esami in corso (writing) e sospensione durante la pubblicazione
+        self._writers = 0
+        self._idle: Optional[asyncio.Event] = None
+        self._gate: Optional[asyncio.Event] = None
+
+    def ranking(self, module_id: Optional[str] = None) -> Ranking:
+        """Classifica generale o del modulo (vuota se il modulo non ha esami)."""
+        if module_id is None:
+            return self.overall
+        return self.modules.get(module_id) or Ranking(settings.LEADERBOARD_MIN_EXAMS)
+
+    # -- aggiornamento incrementale ------------------------------------------
+
+    @asynccontextmanager
+    async def writing(self) -> AsyncIterator[None]:
+        """Scrittura di un esame con la sua variazione (exam_added/exam_removed) dentro il blocco."""
+        while self._gate is not None:
+            # Pubblicazione di un ricalcolo in corso
+            await self._gate.wait()
+        self._writers += 1
+        try:
+            yield
+        finally:
+            self._writers -= 1
+            if self._writers == 0 and self._idle is not None:
+                self._idle.set()
+
+    def _apply(self, doc: Optional[dict[str, Any]], sign: int) -> None:
+        if not doc or not isinstance(doc.get("voto"), (int, float)):
+            return
+        student_id = ref_str(doc.get("student_id"))
+        module_id = ref_str(doc.get("module_id"))
+        if self._touched is not None:
+            self._touched.add((student_id, module_id))
+        if self._built_at is None:
+            return  # non ancora costruita: la leggerà il primo ricalcolo
+        self.overall.add(student_id, doc["voto"], sign)
+        ranking = self.modules.setdefault(module_id, Ranking(settings.LEADERBOARD_MIN_EXAMS))
+        ranking.add(student_id, doc["voto"], sign)
+
+    def exam_added(self, doc: Optional[dict[str, Any]]) -> None:
+        """Esame creato (o nuova versione di un esame aggiornato)."""
+        self._apply(doc, 1)
+
+    def exam_removed(self, doc: Optional[dict[str, Any]]) -> None:
+        """Esame eliminato (o versione precedente di un esame aggiornato)."""
+        self._apply(doc, -1)
+
+    def remove_student(self, student_id: str) -> None:
+        """Studente eliminato: esce da tutte le classifiche."""
+        if self._touched is not None:
+            self._removed[0].add(student_id)
+        self.overall.discard(student_id)
+        for ranking in self.modules.values():
+            ranking.discard(student_id)
+
+    def remove_module(self, module_id: str) -> None:
+        """Modulo eliminato: la sua classifica sparisce e i suoi voti escono dalla generale."""
+        if self._touched is not None:
+            self._removed[1].add(module_id)
+        ranking = self.modules.pop(module_id, None)
+        if ranking is None:
+            return
+        for student_id, (total, count) in ranking._stats.items():
+            self.overall.adjust(student_id, -total, -count)
+
+    # -- ricalcolo completo ------------------------------------------------------
+
+    def _stale(self) -> bool:
+        return self._built_at is None or time.monotonic() - self._built_at >= settings.LEADERBOARD_REBUILD_S
+
+    async def ensure_fresh(self) -> None:
+        """
+        Avvia il ricalcolo se la classifica manca o è più vecchia di LEADERBOARD_REBUILD_S.
+        Si attende solo la prima costruzione; dopo, le letture usano la classifica attuale.
+        """
+        if not self._stale():
+            return
+        if self._task is None or self._task.done():
+            # Contesto vuoto: niente budget, profilo o rotta della richiesta che lo avvia
+            self._task = asyncio.create_task(self._rebuild_in_background(), context=contextvars.Context())
+        if self._built_at is None:
+            await asyncio.shield(self._task)
+
+    async def _rebuild_in_background(self) -> None:
+        try:
+            await self.rebuild()
+        except Exception as e:
+            logger.warning("Ricalcolo della classifica non riuscito: %s", e)
+            if self._built_at is None:
+                raise
+
+    @staticmethod
+    async def _aggregate(match: dict[str, Any]) -> dict[tuple[str, str], tuple[float, int]]:
+        """Somma e numero dei voti per coppia (studente, modulo) su esami e archivi."""
+        pairs: dict[tuple[str, str], tuple[float, int]] = {}
+        for part in await partitions(everything=True):
+            pipeline = [
+                {"$match": {"voto": {"$type": "number"}, **match, **part.date_filter}},
+                {"$group": {
+                    "_id": {"s": {"$toString": "$student_id"}, "m": {"$toString": "$module_id"}},
+                    "total": {"$sum": "$voto"},
+                    "n": {"$sum": 1},
+                }},
+            ]
+            async for row in get_collection(part.collection).aggregate(pipeline):
+                # Stesso studente/modulo anche in più partizioni (anni diversi): si sommano
+                key = (row["_id"]["s"], row["_id"]["m"])
+                total, count = pairs.get(key, (0.0, 0))
+                pairs[key] = (total + row["total"], count + row["n"])
+        return pairs
+
+    async def _reaggregate(self, pairs: dict[tuple[str, str], tuple[float, int]], fresh: set[tuple[str, str]]) -> None:
+        """Riaggrega le coppie scritte durante il ricalcolo, finché non ne arrivano altre."""
+        while self._touched:
+            touched, self._touched = self._touched, set()
+            for key in touched:
+                pairs.pop(key, None)
+            fresh |= touched
+            pairs.update(await self._aggregate({"$or": [
+                {"student_id": {"$in": ref_forms(sid)}, "module_id": {"$in": ref_forms(mid)}}
+                for sid, mid in touched
+            ]}))
+
+    async def rebuild(self) -> None:
+        """Ricostruisce tutte le classifiche con un'aggregazione per partizione degli esami."""
+        self._touched = set()
+        self._removed = (set(), set())
+        fresh: set[tuple[str, str]] = set()
+        try:
+            students = {str(d["_id"]) async for d in get_collection("students").find({}, {"_id": 1})}
+            modules = {str(d["_id"]) async for d in get_collection("modules").find({}, {"_id": 1})}
+            pairs = await self._aggregate({})
+            await self._reaggregate(pairs, fresh)
+
+            # Pubblicazione: nuove scritture sospese, si attendono quelle in corso (già
+            # salvate o no: la loro variazione non è ancora applicata) e si riaggregano
+            self._gate = asyncio.Event()
+            while self._writers:
+                self._idle = asyncio.Event()
+                await self._idle.wait()
+            self._idle = None
+            await self._reaggregate(pairs, fresh)
+            self._publish(pairs, students, modules, fresh)
+        finally:
+            self._touched = None
+            if self._gate is not None:
+                self._gate.set()
+                self._gate = None
+
+    def _publish(
+        self,
+        pairs: dict[tuple[str, str], tuple[float, int]],
+        students: set[str],
+        modules: set[str],
+        fresh: set[tuple[str, str]],
+    ) -> None:
+        """
+        Sostituisce le classifiche con il risultato del ricalcolo. Sono escluse le coppie di
+        studenti o moduli inesistenti (orfani) o eliminati nel frattempo; le coppie riaggregate
+        valgono anche se studente o modulo sono stati creati dopo la lettura degli elenchi.
+        """
+        removed_students, removed_modules = self._removed
+        overall: dict[str, tuple[float, int]] = {}
+        by_module: dict[str, dict[str, tuple[float, int]]] = {}
+        for (student_id, module_id), (total, count) in pairs.items():
+            known = (student_id, module_id) in fresh or (student_id in students and module_id in modules)
+            if not known or student_id in removed_students or module_id in removed_modules:
+                continue
+            for totals in (overall, by_module.setdefault(module_id, {})):
+                t, c = totals.get(student_id, (0.0, 0))
+                totals[student_id] = (t + total, c + count)
+
+        min_exams = settings.LEADERBOARD_MIN_EXAMS
+        self.overall = Ranking.from_totals(overall, min_exams)
+        self.modules = {mid: Ranking.from_totals(totals, min_exams) for mid, totals in by_module.items()}
+        self._built_at = time.monotonic()
+
+
+# Classifica condivisa dal processo (aggiornata dal router esami)
+leaderboard = Leaderboard()
@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+"""
+Operazioni di manutenzione eseguibili come job in background (POST /api/jobs).
+
+- exams.archive: archivia gli anni accademici chiusi (app.core.exam_archive), ripartibile
+- cleanup.orphans: elimina iscrizioni ed esami che riferiscono studenti o moduli non più
+  esistenti (cancellazioni a cascata non fatte in linea dalle DELETE)
+- transcripts.generate: libretti PDF di tutti gli studenti in uno zip (avviato da
+  POST /api/transcripts, esclusivo: una generazione alla volta in tutti i processi)
+
+Gli archivi non vengono toccati dalla pulizia: sono in sola lettura. Gli esami e le
+iscrizioni eliminati sono registrati nell'audit log ('delete', 'unenroll') con autore
+'job:cleanup.orphans'. Archiviazione e pulizia
+invalidano la cache delle risposte delle collezioni toccate (app.core.response_cache); la
+pulizia aggiorna anche classifica e report dei moduli del processo che la esegue.
+"""
+
+import os
+from typing import Annotated, Any, Iterable, Optional
+
+from pydantic import Field
+
+from app.core import response_cache, settings
+from app.core.audit import audit_log, set_actor
+from app.core.cache import module_reports
+from app.core.db import get_collection
+from app.core.enrollments import COLL as ENROLLMENTS_COLL, missing
+from app.core.events import publish_change
+from app.core.exam_archive import HOT, archive_year, closed_years
+from app.core.jobs import JobContext, job
+from app.core.leaderboard import leaderboard
+from app.core.refs import ref_str
+from app.core.transcripts import default_workers, generate_transcripts_zip
+
+
+def transcripts_path(job_id: Any) -> str:
+    """Zip dei libretti generato dal job (TRANSCRIPTS_DIR deve essere condivisa tra i processi)."""
+    return os.path.join(settings.TRANSCRIPTS_DIR, f"libretti_{job_id}.zip")
+
+
+@job("exams.archive", "Archivia gli anni accademici chiusi (tutti o solo 'year')")
+async def archive_exams(
+    ctx: JobContext,
+    year: Optional[int] = None,
+    batch_size: Annotated[int, Field(ge=1, le=10000)] = 500,
+    pause_ms: Annotated[int, Field(ge=0)] = 50,
+) -> dict[str, Any]:
+    years = [year] if year is not None else await closed_years()
+    archived = []
+    for i, y in enumerate(years):
+        ctx.update(year=y, years_done=i, years_total=len(years))
+        state = await archive_year(
+            y,
+            batch_size=batch_size,
+            pause_s=pause_ms / 1000,
+            on_progress=lambda s: ctx.update(state=s["state"], copied=s["copied"], removed=s["removed"]),
+        )
+        archived.append({"year": y, "collection": state["collection"], "archived": state.get("archived", 0)})
+        await response_cache.invalidate("exams")
+    ctx.update(years_done=len(years))
+    return {"years": archived}
+
+
+async def _refresh(known: set[str], collection: str, refs: Iterable[Any]) -> None:
+    """Aggiunge a 'known' i riferimenti sconosciuti che ora hanno un documento nella collezione."""
+    unknown = {r for r in refs if r not in known}
+    if unknown:
+        known.update(unknown.difference(await missing(collection, unknown)))
+
+
+async def _remove_orphans(
+    ctx: JobContext, collection: str, students: set[str], modules: set[str], batch_size: int, dry_run: bool
+) -> int:
+    """
+    Scansiona la collezione ed elimina (a batch) i documenti con studente o modulo inesistente.
+    'students' e 'modules' sono gli id esistenti, aggiornati con quelli creati durante la scansione.
+    """
+    coll = get_collection(collection)
+    # Degli esami si legge il documento intero: serve all'audit log
+    projection = None if collection == HOT else {"student_id": 1, "module_id": 1}
+    scanned = removed = 0
+    orphans: list[dict[str, Any]] = []
+
+    async def remove() -> int:
+        # Studenti e moduli creati dopo l'elenco iniziale (con i loro esami o iscrizioni):
+        # si ricontrolla l'esistenza dei riferimenti subito prima di eliminare il batch
+        await _refresh(students, "students", (ref_str(d.get("student_id")) for d in orphans))
+        await _refresh(modules, "modules", (ref_str(d.get("module_id")) for d in orphans))
+        batch = [
+            d for d in orphans
+            if ref_str(d.get("student_id")) not in students or ref_str(d.get("module_id")) not in modules
+        ]
+        if dry_run or not batch:
+            return len(batch)
+        deleted = (await coll.delete_many({"_id": {"$in": [d["_id"] for d in batch]}})).deleted_count
+        if collection == HOT:
+            for doc in batch:
+                await audit_log.record(HOT, "delete", doc["_id"], before=doc)
+                student_id, module_id = ref_str(doc.get("student_id")), ref_str(doc.get("module_id"))
+                # Un esame orfano conta in classifica solo finché non si sa che studente o modulo
+                # mancano: toglierli (idempotente) equivale a sottrarre i suoi voti, senza doppioni
+                if student_id not in students:
+                    leaderboard.remove_student(student_id)
+                if module_id not in modules:
+                    leaderboard.remove_module(module_id)
+                module_reports.invalidate(module_id)
+        else:
+            for doc in batch:
+                await audit_log.record("students", "unenroll", doc["student_id"], before={"module_id": doc["module_id"]})
+        return deleted
+
+    async for doc in coll.find({}, projection).batch_size(batch_size):
+        scanned += 1
+        if ref_str(doc.get("student_id")) not in students or ref_str(doc.get("module_id")) not in modules:
+            orphans.append(doc)
+        if len(orphans) >= batch_size:
+            removed += await remove()
+            orphans = []
+        if scanned % batch_size == 0:
+            ctx.update(**{collection: {"scanned": scanned, "removed": removed}})
+    if orphans:
+        removed += await remove()
+    ctx.update(**{collection: {"scanned": scanned, "removed": removed}})
+    return removed
+
+
+@job("cleanup.orphans", "Elimina iscrizioni ed esami di studenti o moduli non più esistenti")
+async def cleanup_orphans(
+    ctx: JobContext, dry_run: bool = False, batch_size: Annotated[int, Field(ge=1, le=10000)] = 1000
+) -> dict[str, Any]:
+    set_actor("job:cleanup.orphans")
+    students = {str(d["_id"]) async for d in get_collection("students").find({}, {"_id": 1})}
+    modules = {str(d["_id"]) async for d in get_collection("modules").find({}, {"_id": 1})}
+    result = {"dry_run": dry_run}
+    for collection in (ENROLLMENTS_COLL, HOT):
+        result[collection] = await _remove_orphans(ctx, collection, students, modules, batch_size, dry_run)
+    if not dry_run and (result[HOT] or result[ENROLLMENTS_COLL]):
+        # Esami e iscrizioni compaiono nelle risposte di esami, studenti (medie) e moduli (roster, report)
+        await response_cache.invalidate("exams", "students", "modules")
+    if result[HOT] and not dry_run:
+        publish_change(HOT, "resync")
+    return result
+
+
+@job("transcripts.generate", "Genera i libretti PDF di tutti gli studenti in uno zip", max_attempts=2, exclusive=True)
+async def generate_transcripts(ctx: JobContext, workers: Annotated[int, Field(ge=0, le=256)] = 0) -> dict[str, Any]:
+    os.makedirs(settings.TRANSCRIPTS_DIR, exist_ok=True)
+    stats = await generate_transcripts_zip(
+        transcripts_path(ctx.id),
+        workers=workers or settings.TRANSCRIPT_WORKERS or default_workers(),
+        on_progress=lambda s: ctx.update(**s.as_dict()),
+    )
+    return stats.as_dict()
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+"""
+Generatore PDF minimale (solo testo), senza dipendenze esterne.
+
+Note pratiche:
+- Produce PDF 1.4 con font standard Courier/Courier-Bold (monospazio: le colonne
+  delle tabelle restano allineate con semplici f-string).
+- Il testo è codificato in WinAnsi (cp1252): accenti italiani supportati,
+  i caratteri non rappresentabili diventano '?'.
+- I contenuti di pagina sono compressi (FlateDecode): il lavoro CPU resta nel
+  processo che genera il PDF (utile con ProcessPoolExecutor).
+"""
+
+import zlib
+from typing import Sequence
+
+# Formato A4 in punti tipografici e margine uniforme
+PAGE_WIDTH = 595
+PAGE_HEIGHT = 842
+MARGIN = 50
+
+# Una riga: (testo, grassetto)
+Line = tuple[str, bool]
+
+
+def _escape(text: str) -> str:
+    """Esegue l'escape dei caratteri speciali nelle stringhe PDF."""
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def _content_stream(lines: Sequence[Line], font_size: int, leading: int) -> bytes:
+    """Costruisce lo stream di contenuto di una pagina (operatori di testo PDF)."""
+    ops = ["BT", f"{leading} TL", f"{MARGIN} {PAGE_HEIGHT - MARGIN} Td"]
+    current_font = ""
+    for text, bold in lines:
+        font = "/F2" if bold else "/F1"
+        if font != current_font:
+            ops.append(f"{font} {font_size} Tf")
+            current_font = font
+        # L'operatore ' va a capo (TL) e mostra la stringa
+        ops.append(f"({_escape(text)}) '")
+    ops.append("ET")
+    return "\n".join(ops).encode("cp1252", errors="replace")
+
+
+def paginate(lines: Sequence[Line], font_size: int = 10, leading: int = 14) -> list[list[Line]]:
+    """Divide le righe in pagine in base allo spazio verticale disponibile."""
+    per_page = max(1, (PAGE_HEIGHT - 2 * MARGIN) // leading - 1)
+    return [list(lines[i:i + per_page]) for i in range(0, len(lines), per_page)] or [[]]
+
+
+def build_pdf(lines: Sequence[Line], font_size: int = 10, leading: int = 14) -> bytes:
+    """
+    Restituisce i byte di un PDF con le righe indicate (paginazione automatica).
+    Oggetti: 1 catalogo, 2 albero pagine, 3–4 font, poi coppie (pagina, contenuto).
+    """
+    pages = paginate(lines, font_size, leading)
+    page_ids = [5 + 2 * i for i in range(len(pages))]
+    kids = " ".join(f"{pid} 0 R" for pid in page_ids)
+    font = "<< /Type /Font /Subtype /Type1 /BaseFont /{} /Encoding /WinAnsiEncoding >>"
+
+    objects: list[bytes] = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        f"<< /Type /Pages /Kids [{kids}] /Count {len(pages)} >>".encode(),
+        font.format("Courier").encode(),
+        font.format("Courier-Bold").encode(),
+    ]
+    for pid, page_lines in zip(page_ids, pages):
+        content = zlib.compress(_content_stream(page_lines, font_size, leading))
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {PAGE_WIDTH} {PAGE_HEIGHT}] "
+            f"/Resources << /Font << /F1 3 0 R /F2 4 0 R >> >> /Contents {pid + 1} 0 R >>".encode()
+        )
+        objects.append(
+            f"<< /Length {len(content)} /Filter /FlateDecode >>\nstream\n".encode()
+            + content
+            + b"\nendstream"
+        )
+
+    out = bytearray(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+    offsets: list[int] = []
+    for num, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{num} 0 obj\n".encode() + body + b"\nendobj\n"
+
+    xref_pos = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    for off in offsets:
+        out += f"{off:010d} 00000 n \n".encode()
+    out += (
+        f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\n"
+        f"startxref\n{xref_pos}\n%%EOF\n"
+    ).encode()
+    return bytes(out)
@@ -0,0 +1,237 @@
+# -*- coding: utf-8 -*-
+"""
+Profilazione su richiesta delle singole richieste API (dove va il tempo di CPU Python:
+validazione Pydantic, conversione degli id, statistiche...).
+
+Attivazione (PROFILE_ENABLED, altrimenti il middleware non viene nemmeno montato):
+- header PROFILE_HEADER (default 'X-Profile') con valore uguale a PROFILE_TOKEN
+  (senza token l'header è ignorato)
+- campionamento: una richiesta ogni 1/PROFILE_SAMPLE_RATE, scelta a caso
+
+Come funziona (profiler statistico pesato sul tempo):
+- durante una richiesta profilata è installato sys.setprofile sul thread dell'event loop;
+  la callback riconosce le richieste profilate da una contextvar, quindi gli altri task
+  intercalati sull'event loop non vengono attribuiti alla richiesta
+- il tempo tra un evento e il precedente (di qualunque task) è sommato alla richiesta
+  in esecuzione: le attese (I/O, await) non contano, conta solo il tempo passato nel suo codice
+- ogni PROFILE_INTERVAL_MS di tempo accumulato si registra lo stack corrente (funzioni Python
+  e funzione C in uscita, es. la validazione di pydantic_core) con quel peso
+- l'output è in formato "collapsed stacks" (una riga 'radice;...;foglia microsecondi'),
+  leggibile da flamegraph.pl, speedscope e inferno: PROFILE_DIR/<metodo-rotta>/<ora>-<pid>-<n>.folded
+  (al più PROFILE_MAX_FILES file per rotta, i più vecchi vengono eliminati)
+
+Note pratiche:
+- Costo: finché una richiesta profilata è in corso, ogni chiamata di funzione sull'event loop
+  passa dalla callback (anche quelle delle altre richieste, che però escono subito).
+- Il codice eseguito nel threadpool (endpoint sincroni) non è visibile al profiler.
+- La risposta riporta il file generato nell'header 'X-Profile-File' (percorso relativo a PROFILE_DIR).
+"""
+
+import asyncio
+import hmac
+import itertools
+import os
+import random
+import re
+import sys
+import time
+from collections import defaultdict
+from contextvars import ContextVar
+from types import FrameType
+from typing import Any, Optional
+
+from app.core import settings
+
+# Profilo della richiesta in esecuzione (None = non profilata)
+_active: ContextVar[Optional["RequestProfile"]] = ContextVar("request_profile", default=None)
+
+# Radici del percorso dei file sorgente, tolte dalle etichette dei frame
+_ROOTS = sorted({os.path.dirname(os.path.dirname(os.path.dirname(__file__)))} | {p for p in sys.path if p}, key=len, reverse=True)
+_ASYNCIO_DIR = os.path.dirname(asyncio.__file__)
+
+
+def frame_label(frame: FrameType) -> str:
+    """'modulo/file.py:funzione' (niente ';', separatore degli stack)."""
+    path = frame.f_code.co_filename
+    for root in _ROOTS:
+        if path.startswith(root + os.sep):
+            path = path[len(root) + 1:]
+            break
+    return f"{path}:{frame.f_code.co_qualname}".replace(";", ",")
+
+
+class RequestProfile:
+    """Stack campionati di una richiesta: {stack: microsecondi}."""
+
+    def __init__(self, interval_s: float) -> None:
+        self.interval_s = interval_s
+        self.pending = 0.0
+        self.total = 0.0
+        self.stacks: dict[tuple[str, ...], float] = defaultdict(float)
+
+    def sample(self, frame: Optional[FrameType], leaf: Optional[str]) -> None:
+        stack = [leaf] if leaf else []
+        while frame is not None:
+            # I frame dell'event loop sono la radice comune di tutti i task: non interessano
+            if frame.f_code.co_filename.startswith(_ASYNCIO_DIR):
+                break
+            stack.append(frame_label(frame))
+            frame = frame.f_back
+        if stack:
+            self.stacks[tuple(reversed(stack))] += self.pending
+        self.total += self.pending
+        self.pending = 0.0
+
+    def collapsed(self) -> str:
+        """Formato collapsed stacks, pesi in microsecondi."""
+        lines = [f"{';'.join(stack)} {round(us * 1e6)}" for stack, us in self.stacks.items() if us >= 1e-6]
+        return "\n".join(sorted(lines)) + "\n"
+
+
+class _Dispatcher:
+    """Callback di sys.setprofile condivisa dalle richieste profilate in corso."""
+
+    def __init__(self) -> None:
+        self.active = 0
+        self.last = 0.0
+
+    def __call__(self, frame: FrameType, event: str, arg: Any) -> None:
+        now = time.perf_counter()
+        elapsed, self.last = now - self.last, now
+        profile = _active.get()
+        if profile is None:
+            return
+        profile.pending += elapsed
+        if profile.pending < profile.interval_s:
+            return
+        # Il tempo trascorso era del chiamante ('call'), della funzione C ('c_return') o del frame stesso
+        if event == "call":
+            profile.sample(frame.f_back, None)
+        elif event in ("c_return", "c_exception"):
+            profile.sample(frame, getattr(arg, "__qualname__", None) or repr(arg))
+        else:
+            profile.sample(frame, None)
+
+    def acquire(self) -> None:
+        if self.active == 0:
+            self.last = time.perf_counter()
+            sys.setprofile(self)
+        self.active += 1
+
+    def release(self) -> None:
+        self.active -= 1
+        if self.active == 0:
+            sys.setprofile(None)
+
+
+_dispatcher = _Dispatcher()
+
+
+def route_slug(scope: dict[str, Any]) -> str:
+    """'GET /api/students/{id}' → 'GET-api-students-id' (nome della cartella dei profili)."""
+    route = scope.get("route")
+    path = getattr(route, "path", None) or scope.get("path", "")
+    return re.sub(r"[^A-Za-z0-9_]+", "-", f"{scope.get('method', '')} {path}").strip("-")
+
+
+def write_profile(directory: str, filename: str, content: str, max_files: int) -> None:
+    """Scrive il profilo ed elimina i più vecchi oltre max_files (eseguita in un thread)."""
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, filename), "w", encoding="utf-8") as f:
+        f.write(content)
+    files = sorted((e for e in os.scandir(directory) if e.name.endswith(".folded")), key=lambda e: e.stat().st_mtime)
+    for entry in files[: max(len(files) - max_files, 0)]:
+        try:
+            os.remove(entry.path)
+        except OSError:
+            pass
+
+
+class RequestProfiler:
+    """Sceglie le richieste da profilare (header con token o campionamento) e raccoglie le metriche."""
+
+    def __init__(self, header: str, token: str, sample_rate: float) -> None:
+        self.header = header.lower().encode("latin-1")
+        self.token = token.encode()
+        self.sample_rate = sample_rate
+        self._seq = itertools.count(1)
+        # Metriche cumulative
+        self.by_header = 0
+        self.by_sampling = 0
+        self.written = 0
+
+    @classmethod
+    def from_settings(cls) -> "RequestProfiler":
+        return cls(settings.PROFILE_HEADER, settings.PROFILE_TOKEN, settings.PROFILE_SAMPLE_RATE)
+
+    def selected(self, scope: dict[str, Any]) -> bool:
+        if self.token:
+            for name, value in scope.get("headers", []):
+                if name == self.header:
+                    if hmac.compare_digest(value, self.token):
+                        self.by_header += 1
+                        return True
+                    break
+        if self.sample_rate > 0 and random.random() < self.sample_rate:
+            self.by_sampling += 1
+            return True
+        return False
+
+    def next_filename(self) -> str:
+        return f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{next(self._seq)}.folded"
+
+    def metrics(self) -> dict[str, Any]:
+        return {
+            "sample_rate": self.sample_rate,
+            "by_header": self.by_header,
+            "by_sampling": self.by_sampling,
+            "written": self.written,
+        }
+
+
+class ProfilingMiddleware:
+    """Middleware ASGI che profila le richieste API scelte dal RequestProfiler."""
+
+    def __init__(self, app, profiler: RequestProfiler, prefix: str) -> None:
+        self.app = app
+        self.profiler = profiler
+        self.prefix = prefix
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope.get("path", "").startswith(self.prefix) or not self.profiler.selected(scope):
+            await self.app(scope, receive, send)
+            return
+
+        profile = RequestProfile(settings.PROFILE_INTERVAL_MS / 1000)
+        slug = ""
+        filename = ""
+
+        async def send_tagged(message: dict[str, Any]) -> None:
+            nonlocal slug, filename
+            if message["type"] == "http.response.start":
+                # Qui il router ha già risolto la rotta
+                slug = route_slug(scope)
+                filename = self.profiler.next_filename()
+                message = {**message, "headers": [*message.get("headers", []), (b"x-profile-file", f"{slug}/{filename}".encode())]}
+            await send(message)
+
+        token = _active.set(profile)
+        _dispatcher.acquire()
+        try:
+            await self.app(scope, receive, send_tagged)
+        finally:
+            _dispatcher.release()
+            _active.reset(token)
+            if slug:
+                await asyncio.to_thread(
+                    write_profile,
+                    os.path.join(settings.PROFILE_DIR, slug),
+                    filename,
+                    profile.collapsed(),
+                    settings.PROFILE_MAX_FILES,
+                )
+                self.profiler.written += 1
+
+
+# Istanza condivisa (usata dal middleware e dall'endpoint /metrics)
+request_profiler = RequestProfiler.from_settings()
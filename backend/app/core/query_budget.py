@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+"""
+Budget di tempo delle query MongoDB per rotta e cancellazione alla disconnessione del client.
+
+Come funziona:
+- ogni richiesta API riceve un budget (ms) scelto per rotta: regole QUERY_BUDGETS, poi la
+  tabella ROUTE_BUDGETS_MS, poi il default per letture (QUERY_BUDGET_MS) o scritture
+  (QUERY_BUDGET_WRITE_MS); 0 = nessun budget
+- il budget è una scadenza unica per la richiesta (pymongo.timeout): ogni operazione Motor
+  eseguita dai router parte con maxTimeMS pari al tempo rimasto, attesa del pool compresa
+- a budget esaurito il driver interrompe l'operazione (anche lato server); una lettura
+  riceve 503 con 'Retry-After' (ripeterla è sicuro), una scrittura 504 senza 'Retry-After':
+  i primi passi (es. inserimento dello studente prima delle iscrizioni) possono essere già
+  stati salvati, l'esito va verificato prima di ripetere
+- letture (GET/HEAD): se il client si disconnette prima della risposta, l'handler viene
+  cancellato; il cursore abbandonato non chiede altri batch e viene chiuso (killCursors),
+  l'operazione già inviata termina al più allo scadere del suo maxTimeMS
+
+Note pratiche:
+- Le scritture non vengono cancellate alla disconnessione: una POST interrotta a metà
+  lascerebbe aggiornamenti parziali (classifica, iscrizioni, audit log).
+- Il contesto del budget è ereditato dai task creati dalla richiesta: le rotte che avviano
+  lavoro in background (/transcripts) o in streaming (/exports, /events) non hanno budget.
+- Va montato dentro l'admission control: il budget parte quando la richiesta ha uno slot.
+"""
+
+import asyncio
+import json
+from fnmatch import fnmatchcase
+from typing import Any
+
+import pymongo
+from pymongo.errors import PyMongoError
+
+from app.core import settings
+
+# Metodi di sola lettura: budget di lettura e cancellazione alla disconnessione
+READ_METHODS = frozenset({"GET", "HEAD"})
+
+# Budget per rotta (percorsi relativi al prefisso API, glob: '*' attraversa anche '/')
+ROUTE_BUDGETS_MS: dict[str, int] = {
+    "/events*": 0,              # feed SSE: connessione di lunga durata
+    "/exports*": 0,             # CSV/XLSX in streaming: durata proporzionale ai dati
+    "/transcripts*": 0,         # la POST avvia la generazione in background
+    "/modules/*/report": 15000,  # aggregazioni su tutti gli esami del modulo (archivi compresi)
+}
+
+
+def parse_budgets(spec: str) -> list[tuple[str, int]]:
+    """Regole "glob=ms,glob=ms" (es. "/modules*=8000,/exams=3000") → [(glob, ms)]."""
+    rules = []
+    for item in spec.split(","):
+        if not item.strip():
+            continue
+        pattern, sep, ms = item.rpartition("=")
+        if not sep or not pattern.strip():
+            raise ValueError(f"Regola QUERY_BUDGETS non valida: {item!r} (atteso percorso=ms)")
+        rules.append((pattern.strip(), int(ms)))
+    return rules
+
+
+def is_timeout(exc: BaseException) -> bool:
+    """Errore del driver dovuto alla scadenza (maxTimeMS lato server o timeout lato client)."""
+    return isinstance(exc, PyMongoError) and exc.timeout
+
+
+async def run_until_disconnect(app, scope, receive, send) -> bool:
+    """
+    Esegue l'app ASGI in un task e lo cancella se il client si disconnette prima della fine
+    della risposta. Restituisce True se la richiesta è stata cancellata.
+    """
+    inbox: asyncio.Queue = asyncio.Queue()
+    complete = False
+
+    async def send_tracking(message: dict[str, Any]) -> None:
+        nonlocal complete
+        if message["type"] == "http.response.body" and not message.get("more_body", False):
+            complete = True
+        await send(message)
+
+    async def pump() -> None:
+        # Inoltra i messaggi del server all'app; termina alla disconnessione
+        while True:
+            message = await receive()
+            inbox.put_nowait(message)
+            if message["type"] == "http.disconnect":
+                return
+
+    app_task = asyncio.create_task(app(scope, inbox.get, send_tracking))
+    pump_task = asyncio.create_task(pump())
+    cancelled = False
+    try:
+        await asyncio.wait({app_task, pump_task}, return_when=asyncio.FIRST_COMPLETED)
+        if not app_task.done() and not complete:
+            # Client andato via: nessuno leggerà la risposta, si liberano cursore e slot
+            app_task.cancel()
+            cancelled = True
+        await asyncio.wait({app_task})
+        if not app_task.cancelled():
+            app_task.result()
+        return cancelled
+    finally:
+        # Anche in caso di cancellazione dall'esterno (shutdown del server)
+        for task in (pump_task, app_task):
+            task.cancel()
+        await asyncio.gather(pump_task, app_task, return_exceptions=True)
+
+
+class QueryBudgets:
+    """Sceglie il budget della richiesta e raccoglie le metriche."""
+
+    def __init__(self, rules: list[tuple[str, int]], read_ms: int, write_ms: int, retry_after_s: int) -> None:
+        self.rules = rules
+        self.read_ms = read_ms
+        self.write_ms = write_ms
+        self.retry_after_s = retry_after_s
+        # Metriche cumulative
+        self.applied = 0
+        self.timeouts = 0
+        self.cancelled = 0
+
+    @classmethod
+    def from_settings(cls) -> "QueryBudgets":
+        return cls(
+            rules=parse_budgets(settings.QUERY_BUDGETS) + list(ROUTE_BUDGETS_MS.items()),
+            read_ms=settings.QUERY_BUDGET_MS,
+            write_ms=settings.QUERY_BUDGET_WRITE_MS,
+            retry_after_s=settings.ADMISSION_RETRY_AFTER_S,
+        )
+
+    def budget_ms(self, method: str, path: str) -> int:
+        """Budget della rotta (percorso relativo al prefisso API): prima regola che corrisponde."""
+        for pattern, ms in self.rules:
+            if fnmatchcase(path, pattern):
+                return ms
+        return self.read_ms if method in READ_METHODS else self.write_ms
+
+    def metrics(self) -> dict[str, Any]:
+        return {
+            "read_ms": self.read_ms,
+            "write_ms": self.write_ms,
+            "applied": self.applied,
+            "timeouts": self.timeouts,
+            "cancelled_on_disconnect": self.cancelled,
+        }
+
+
+class QueryBudgetMiddleware:
+    """Middleware ASGI: scadenza delle query per richiesta, 503/504 al timeout, cancellazione al disconnect."""
+
+    def __init__(self, app, budgets: QueryBudgets, prefix: str, cancel_on_disconnect: bool = True) -> None:
+        self.app = app
+        self.budgets = budgets
+        self.prefix = prefix
+        self.cancel_on_disconnect = cancel_on_disconnect
+
+    async def __call__(self, scope, receive, send):
+        path = scope.get("path", "")
+        if scope["type"] != "http" or not path.startswith(self.prefix):
+            await self.app(scope, receive, send)
+            return
+        method = scope["method"]
+        budget_ms = self.budgets.budget_ms(method, path[len(self.prefix):] or "/")
+        if budget_ms <= 0:
+            await self.app(scope, receive, send)
+            return
+
+        self.budgets.applied += 1
+        state = {"started": False}
+
+        async def send_tracking(message: dict[str, Any]) -> None:
+            if message["type"] == "http.response.start":
+                state["started"] = True
+            await send(message)
+
+        try:
+            with pymongo.timeout(budget_ms / 1000):
+                if self.cancel_on_disconnect and method in READ_METHODS:
+                    if await run_until_disconnect(self.app, scope, receive, send_tracking):
+                        self.budgets.cancelled += 1
+                else:
+                    await self.app(scope, receive, send_tracking)
+        except PyMongoError as e:
+            if not is_timeout(e) or state["started"]:
+                raise
+            self.budgets.timeouts += 1
+            await self._reject(send, budget_ms, read=method in READ_METHODS)
+
+    async def _reject(self, send, budget_ms: int, read: bool) -> None:
+        """Budget esaurito: 503 con Retry-After per le letture, 504 per le scritture (esito incerto)."""
+        if read:
+            status, detail = 503, f"Tempo massimo delle query superato ({budget_ms} ms), riprova tra poco"
+        else:
+            status, detail = 504, (
+                f"Tempo massimo delle query superato ({budget_ms} ms): la modifica potrebbe essere "
+                "stata applicata in parte, verificare prima di ripetere"
+            )
+        body = json.dumps({"detail": detail}).encode()
+        headers = [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+        if read:
+            headers.append((b"retry-after", str(self.budgets.retry_after_s).encode()))
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
+
+
+# Istanza condivisa (usata dal middleware e dall'endpoint /metrics)
+query_budgets = QueryBudgets.from_settings()
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""
+Lettura "raw BSON" per i percorsi di lettura più caldi (liste).
+
+Percorso standard: il driver decodifica ogni documento in dict, to_str_id lo ritocca,
+Pydantic lo rivalida e il JSON encoder lo percorre di nuovo (2–3 passate per campo).
+
+Percorso raw:
+- find_raw_batches: il driver restituisce i batch BSON così come arrivano dal server,
+  già ridotti dalla proiezione ai soli campi della risposta
+- ogni batch è decodificato in un'unica chiamata C (bson.decode_all)
+- '_id' diventa 'id' (stringa), si aggiungono i default del modello mancanti e i
+  campi 'date' (BSON date) tornano 'YYYY-MM-DD'
+- il risultato va direttamente al renderer (JSON/MessagePack), senza rivalidazione
+
+Note pratiche:
+- I documenti sono già validati in scrittura: il percorso raw si limita a non
+  ripetere la validazione in lettura. Facoltativo: si attiva con RAW_BSON_READS=true.
+- L'accesso campo per campo con RawBSONDocument è stato misurato più lento della
+  decodifica C dell'intero batch proiettato (vedi app.scripts.bench_raw_reads).
+"""
+
+from typing import Any, Callable, Iterable, Optional
+
+import bson
+
+# Default da applicare ai campi assenti: (nome, fabbrica del valore)
+Defaults = Iterable[tuple[str, Callable[[], Any]]]
+# Conversioni per la risposta sui campi presenti: (nome, funzione)
+Converters = Iterable[tuple[str, Callable[[Any], Any]]]
+
+
+def decode_batch(batch: bytes, defaults: Defaults = (), converters: Converters = ()) -> list[dict[str, Any]]:
+    """Decodifica un batch BSON grezzo e prepara i documenti per la risposta."""
+    docs = bson.decode_all(batch)
+    defaults = tuple(defaults)
+    converters = tuple(converters)
+    for d in docs:
+        d["id"] = str(d.pop("_id"))
+        for name, factory in defaults:
+            if name not in d:
+                d[name] = factory()
+        for name, convert in converters:
+            if name in d:
+                d[name] = convert(d[name])
+    return docs
+
+
+async def find_raw(
+    coll,
+    filter: dict[str, Any],
+    projection: Optional[dict[str, Any]] = None,
+    sort: Optional[tuple[str, int]] = None,
+    defaults: Defaults = (),
+    converters: Converters = (),
+) -> list[dict[str, Any]]:
+    """Esegue una find leggendo batch BSON grezzi; restituisce i documenti pronti al rendering."""
+    cursor = coll.find_raw_batches(filter, projection)
+    if sort is not None:
+        cursor = cursor.sort(*sort)
+    defaults = tuple(defaults)
+    converters = tuple(converters)
+    items: list[dict[str, Any]] = []
+    async for batch in cursor:
+        items.extend(decode_batch(batch, defaults, converters))
+    return items
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+"""
+Riferimenti tra documenti (studenti ↔ moduli ↔ esami) salvati come ObjectId.
+
+Campi di riferimento:
+- exams.student_id, exams.module_id
+- students.modules_ids, modules.studenti_ids
+
+Contratto:
+- nel DB i riferimenti sono ObjectId (metà spazio negli indici, $lookup senza conversioni)
+- l'API continua a ricevere e restituire stringhe: conversione in scrittura (to_ref/to_refs)
+  e in lettura (refs_to_str)
+- finché la migrazione (app.scripts.migrate, versione 1) non è applicata convivono
+  stringhe e ObjectId: i filtri usano ref_match, che cerca entrambe le forme
+"""
+
+from typing import Any, Iterable
+
+from bson import ObjectId
+
+# Campi di riferimento per collezione: singoli e array
+REF_FIELDS: dict[str, tuple[str, ...]] = {
+    "exams": ("student_id", "module_id"),
+    "students": (),
+    "modules": (),
+}
+REF_ARRAY_FIELDS: dict[str, tuple[str, ...]] = {
+    "exams": (),
+    "students": ("modules_ids",),
+    "modules": ("studenti_ids",),
+}
+
+
+def to_ref(value: Any) -> Any:
+    """Stringa ObjectId → ObjectId; valori non convertibili restano invariati."""
+    if isinstance(value, str) and ObjectId.is_valid(value):
+        return ObjectId(value)
+    return value
+
+
+def to_refs(values: Iterable[Any]) -> list[Any]:
+    """Converte un elenco di riferimenti, senza duplicati e mantenendo l'ordine."""
+    return list(dict.fromkeys(to_ref(v) for v in values))
+
+
+def ref_str(value: Any) -> Any:
+    """ObjectId → stringa (contratto API); gli altri valori restano invariati."""
+    return str(value) if isinstance(value, ObjectId) else value
+
+
+def refs_str(values: Any) -> Any:
+    """Versione per array di ref_str (valori non lista invariati)."""
+    if isinstance(values, list):
+        return [ref_str(v) for v in values]
+    return values
+
+
+def ref_forms(value: str) -> list[Any]:
+    """Le due forme con cui un riferimento può essere salvato (ObjectId e stringa)."""
+    return [ObjectId(value), value] if ObjectId.is_valid(value) else [value]
+
+
+def ref_match(value: str) -> Any:
+    """Condizione di filtro su un campo di riferimento che accetta entrambe le forme."""
+    forms = ref_forms(value)
+    return {"$in": forms} if len(forms) > 1 else value
+
+
+def refs_to_str(doc: dict[str, Any], collection: str) -> dict[str, Any]:
+    """Converte in stringa i riferimenti del documento (in place) per le risposte API."""
+    for name in REF_FIELDS.get(collection, ()):
+        if name in doc:
+            doc[name] = ref_str(doc[name])
+    for name in REF_ARRAY_FIELDS.get(collection, ()):
+        if name in doc:
+            doc[name] = refs_str(doc[name])
+    return doc
+
+
+def refs_to_db(doc: dict[str, Any], collection: str) -> dict[str, Any]:
+    """Converte in ObjectId i riferimenti di un documento da salvare (in place)."""
+    for name in REF_FIELDS.get(collection, ()):
+        if name in doc:
+            doc[name] = to_ref(doc[name])
+    for name in REF_ARRAY_FIELDS.get(collection, ()):
+        if name in doc:
+            doc[name] = to_refs(doc[name])
+    return doc
@@ -0,0 +1,435 @@
+# -*- coding: utf-8 -*-
+"""
+Cache delle risposte GET dell'API, con backend intercambiabile.
+
+Come funziona:
+- chiave: percorso, query ordinata e Accept (come il coalescing)
+- si mettono in cache solo le risposte 200 delle risorse in READ_TAGS, ognuna con i
+  tag delle collezioni da cui dipende (es. un report modulo dipende anche dagli esami)
+- eviction LRU (numero di voci e byte totali) + scadenza TTL
+- una scrittura riuscita (POST/PUT/PATCH/DELETE 2xx) invalida i tag della risorsa scritta
+
+Correttezza con scritture concorrenti:
+- ogni tag ha una generazione, incrementata a ogni invalidazione
+- una GET legge le generazioni dei suoi tag PRIMA di eseguire l'app e salva la risposta
+  solo se nel frattempo non sono cambiate (come KeyedCache in app.core.cache)
+
+Backend (settings.RESPONSE_CACHE):
+- "memory": dizionario LRU nel processo; con più worker ogni processo ha la sua copia e
+  non vede le invalidazioni degli altri → adatto a un solo worker
+- "sqlite": file SQLite locale (WAL) condiviso da tutti i worker dell'host: voci,
+  tag e generazioni stanno nel file, quindi una scrittura su un worker invalida per tutti.
+  Le chiamate SQLite girano su un thread dedicato per non bloccare l'event loop.
+
+Note pratiche:
+- Le scritture fatte fuori dalle richieste API (job, migrazione delle date) invalidano con
+  invalidate(*tags); con 'memory' solo nel processo che le esegue. Seeder e script che non
+  passano da qui restano visibili al più dopo RESPONSE_CACHE_TTL_S secondi.
+- 'Cache-Control: no-cache' nella richiesta salta la lettura (la risposta viene salvata).
+- Le richieste con l'header di profilazione passano sempre dall'app; le risposte sono
+  salvate senza gli header della singola richiesta (es. 'x-profile-file').
+- Le metriche di hit/miss e byte sono per processo; voci e byte in cache sono del backend.
+"""
+
+import asyncio
+import json
+import os
+import sqlite3
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Optional, Sequence
+
+from app.core import settings
+from app.core.coalescing import CapturedResponse, request_key, shared_headers, wants_profile
+
+# Collezioni da cui dipendono le GET di ogni risorsa (primo segmento dopo il prefisso API).
+# Le risorse non elencate (feed SSE, export, libretti) non passano dalla cache.
+READ_TAGS: dict[str, tuple[str, ...]] = {
+    "modules": ("modules", "students", "exams"),   # roster studenti, report voti
+    "students": ("students", "modules", "exams"),  # moduli dello studente, media, esami
+    "exams": ("exams",),
+    "leaderboard": ("exams", "students", "modules"),  # un modulo eliminato esce dalla classifica
+}
+# Collezioni modificate dalle scritture su ogni risorsa
+WRITE_TAGS: dict[str, tuple[str, ...]] = {
+    "modules": ("modules",),
+    "students": ("students",),
+    "exams": ("exams",),
+}
+
+Generations = tuple[int, ...]
+
+
+def _encode_headers(headers: list[tuple[bytes, bytes]]) -> str:
+    return json.dumps([[k.decode("latin-1"), v.decode("latin-1")] for k, v in headers])
+
+
+def _decode_headers(raw: str) -> list[tuple[bytes, bytes]]:
+    return [(k.encode("latin-1"), v.encode("latin-1")) for k, v in json.loads(raw)]
+
+
+class MemoryBackend:
+    """Cache LRU + TTL nel processo."""
+
+    name = "memory"
+
+    def __init__(self, max_entries: int, max_bytes: int) -> None:
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        # chiave → (scadenza, risposta, tag, dimensione); ordine = uso più recente in fondo
+        self._entries: OrderedDict[str, tuple[float, CapturedResponse, tuple[str, ...], int]] = OrderedDict()
+        self._by_tag: dict[str, set[str]] = {}
+        self._generations: dict[str, int] = {}
+        self._bytes = 0
+        self.evictions = 0
+
+    async def get(self, key: str) -> Optional[CapturedResponse]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= time.time():
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    async def generations(self, tags: Sequence[str]) -> Generations:
+        return tuple(self._generations.get(tag, 0) for tag in tags)
+
+    async def set(self, key: str, response: CapturedResponse, tags: Sequence[str], generations: Generations, ttl_s: float) -> bool:
+        if await self.generations(tags) != generations:
+            return False
+        self._remove(key)
+        size = len(response[2])
+        self._entries[key] = (time.time() + ttl_s, response, tuple(tags), size)
+        self._bytes += size
+        for tag in tags:
+            self._by_tag.setdefault(tag, set()).add(key)
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+        return True
+
+    async def invalidate(self, tags: Sequence[str]) -> None:
+        for tag in tags:
+            self._generations[tag] = self._generations.get(tag, 0) + 1
+            for key in list(self._by_tag.pop(tag, ())):
+                self._remove(key)
+
+    async def stats(self) -> dict[str, Any]:
+        return {"entries": len(self._entries), "bytes": self._bytes, "evictions": self.evictions}
+
+    async def close(self) -> None:
+        self._entries.clear()
+        self._by_tag.clear()
+        self._bytes = 0
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self._bytes -= entry[3]
+        for tag in entry[2]:
+            keys = self._by_tag.get(tag)
+            if keys is not None:
+                keys.discard(key)
+
+
+class SQLiteBackend:
+    """Cache LRU + TTL in un file SQLite condiviso dai worker dell'host."""
+
+    name = "sqlite"
+
+    SCHEMA = (
+        "CREATE TABLE IF NOT EXISTS entries ("
+        " key TEXT PRIMARY KEY, status INTEGER NOT NULL, headers TEXT NOT NULL, body BLOB NOT NULL,"
+        " size INTEGER NOT NULL, expires_at REAL NOT NULL, accessed_at REAL NOT NULL)",
+        "CREATE INDEX IF NOT EXISTS entries_accessed ON entries(accessed_at)",
+        "CREATE TABLE IF NOT EXISTS entry_tags (tag TEXT NOT NULL, key TEXT NOT NULL, PRIMARY KEY (tag, key)) WITHOUT ROWID",
+        "CREATE INDEX IF NOT EXISTS entry_tags_key ON entry_tags(key)",
+        "CREATE TABLE IF NOT EXISTS tag_generations (tag TEXT PRIMARY KEY, generation INTEGER NOT NULL) WITHOUT ROWID",
+    )
+    # Il momento dell'ultimo uso si aggiorna al più una volta al secondo per voce (LRU approssimato)
+    ACCESS_RESOLUTION_S = 1.0
+
+    def __init__(self, path: str, max_entries: int, max_bytes: int) -> None:
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.evictions = 0
+        self._conn: Optional[sqlite3.Connection] = None
+        # Un solo thread: la connessione non è mai usata in parallelo
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="response-cache")
+
+    async def _run(self, fn, *args) -> Any:
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            for statement in self.SCHEMA:
+                conn.execute(statement)
+            self._conn = conn
+        return self._conn
+
+    def _generations(self, conn: sqlite3.Connection, tags: Sequence[str]) -> Generations:
+        rows = dict(conn.execute(
+            f"SELECT tag, generation FROM tag_generations WHERE tag IN ({','.join('?' * len(tags))})", tuple(tags)
+        ).fetchall()) if tags else {}
+        return tuple(rows.get(tag, 0) for tag in tags)
+
+    def _delete(self, conn: sqlite3.Connection, keys: list[str]) -> None:
+        for key in keys:
+            conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            conn.execute("DELETE FROM entry_tags WHERE key = ?", (key,))
+
+    def _get(self, key: str) -> Optional[CapturedResponse]:
+        conn = self._connection()
+        row = conn.execute(
+            "SELECT status, headers, body, expires_at, accessed_at FROM entries WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        now = time.time()
+        if row[3] <= now:
+            return None  # rimossa dalla prossima eviction
+        if now - row[4] >= self.ACCESS_RESOLUTION_S:
+            conn.execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (now, key))
+        return row[0], _decode_headers(row[1]), bytes(row[2])
+
+    def _set(self, key: str, response: CapturedResponse, tags: Sequence[str], generations: Generations, ttl_s: float) -> bool:
+        conn = self._connection()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if self._generations(conn, tags) != generations:
+                conn.execute("ROLLBACK")
+                return False
+            status, headers, body = response
+            self._delete(conn, [key])
+            conn.execute(
+                "INSERT INTO entries (key, status, headers, body, size, expires_at, accessed_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, status, _encode_headers(headers), body, len(body), now + ttl_s, now),
+            )
+            conn.executemany("INSERT INTO entry_tags (tag, key) VALUES (?, ?)", [(tag, key) for tag in tags])
+            self._evict(conn, now)
+            conn.execute("COMMIT")
+            return True
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _evict(self, conn: sqlite3.Connection, now: float) -> None:
+        """Scadute, poi le meno usate finché numero di voci e byte rientrano nei limiti."""
+        expired = [k for (k,) in conn.execute("SELECT key FROM entries WHERE expires_at <= ?", (now,))]
+        self._delete(conn, expired)
+        count, total = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        victims: list[str] = []
+        if count > self.max_entries or total > self.max_bytes:
+            for key, size in conn.execute("SELECT key, size FROM entries ORDER BY accessed_at"):
+                if count <= self.max_entries and total <= self.max_bytes:
+                    break
+                victims.append(key)
+                count -= 1
+                total -= size
+        self._delete(conn, victims)
+        self.evictions += len(victims)
+
+    def _invalidate(self, tags: Sequence[str]) -> None:
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(
+                "INSERT INTO tag_generations (tag, generation) VALUES (?, 1)"
+                " ON CONFLICT(tag) DO UPDATE SET generation = generation + 1",
+                [(tag,) for tag in tags],
+            )
+            keys = [k for (k,) in conn.execute(
+                f"SELECT DISTINCT key FROM entry_tags WHERE tag IN ({','.join('?' * len(tags))})", tuple(tags)
+            )]
+            self._delete(conn, keys)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _stats(self) -> dict[str, Any]:
+        count, total = self._connection().execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        return {"entries": count, "bytes": total, "evictions": self.evictions, "path": self.path}
+
+    def _close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    async def get(self, key: str) -> Optional[CapturedResponse]:
+        return await self._run(self._get, key)
+
+    async def generations(self, tags: Sequence[str]) -> Generations:
+        return await self._run(lambda: self._generations(self._connection(), tags))
+
+    async def set(self, key: str, response: CapturedResponse, tags: Sequence[str], generations: Generations, ttl_s: float) -> bool:
+        return await self._run(self._set, key, response, tags, generations, ttl_s)
+
+    async def invalidate(self, tags: Sequence[str]) -> None:
+        await self._run(self._invalidate, tags)
+
+    async def stats(self) -> dict[str, Any]:
+        return await self._run(self._stats)
+
+    async def close(self) -> None:
+        await self._run(self._close)
+        self._executor.shutdown(wait=False)
+
+
+class ResponseCache:
+    """Cache delle risposte con metriche di processo (hit ratio, byte)."""
+
+    def __init__(self, backend, ttl_s: float, max_entry_bytes: int) -> None:
+        self.backend = backend
+        self.ttl_s = ttl_s
+        self.max_entry_bytes = max_entry_bytes
+        # Metriche cumulative del processo
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.stale_skipped = 0
+        self.invalidations = 0
+        self.bytes_served = 0
+        self.bytes_stored = 0
+
+    async def metrics(self) -> dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "backend": self.backend.name,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+            "bytes_served": self.bytes_served,
+            "bytes_stored": self.bytes_stored,
+            "stores": self.stores,
+            "stale_skipped": self.stale_skipped,
+            "invalidations": self.invalidations,
+            **await self.backend.stats(),
+        }
+
+
+def build_cache(kind: str, path: str, ttl_s: float, max_entries: int, max_bytes: int, max_entry_bytes: int) -> Optional[ResponseCache]:
+    """Cache del tipo indicato ('memory', 'sqlite'); None se disattivata ('off')."""
+    if kind == "memory":
+        backend = MemoryBackend(max_entries, max_bytes)
+    elif kind == "sqlite":
+        backend = SQLiteBackend(path, max_entries, max_bytes)
+    elif kind == "off":
+        return None
+    else:
+        raise ValueError(f"RESPONSE_CACHE non valido: {kind!r} (off, memory, sqlite)")
+    return ResponseCache(backend, ttl_s, max_entry_bytes)
+
+
+class ResponseCacheMiddleware:
+    """Middleware ASGI: GET dalla cache, invalidazione dopo le scritture riuscite."""
+
+    def __init__(self, app, cache: ResponseCache, prefix: str) -> None:
+        self.app = app
+        self.cache = cache
+        self.prefix = prefix.rstrip("/") + "/"
+
+    def _resource(self, path: str) -> str:
+        return path[len(self.prefix):].split("/", 1)[0] if path.startswith(self.prefix) else ""
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        resource = self._resource(scope.get("path", ""))
+        if scope["method"] == "GET" and resource in READ_TAGS and not wants_profile(scope):
+            await self._cached_get(scope, receive, send, READ_TAGS[resource])
+        elif scope["method"] in ("POST", "PUT", "PATCH", "DELETE") and resource in WRITE_TAGS:
+            await self._write(scope, receive, send, WRITE_TAGS[resource])
+        else:
+            await self.app(scope, receive, send)
+
+    async def _cached_get(self, scope, receive, send, tags: tuple[str, ...]) -> None:
+        cache = self.cache
+        path, query, accept = request_key(scope)
+        key = f"{path}?{query}|{accept.decode('latin-1')}"
+        no_cache = b"no-cache" in dict(scope.get("headers", [])).get(b"cache-control", b"")
+
+        cached = None if no_cache else await cache.backend.get(key)
+        if cached is not None:
+            status, headers, body = cached
+            cache.hits += 1
+            cache.bytes_served += len(body)
+            await send({"type": "http.response.start", "status": status, "headers": [*headers, (b"x-cache", b"HIT")]})
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        cache.misses += 1
+        # Generazioni lette prima dell'esecuzione: un'invalidazione nel frattempo scarta il risultato
+        generations = await cache.backend.generations(tags)
+        status = 0
+        headers: list[tuple[bytes, bytes]] = []
+        chunks: list[bytes] = []
+        size = 0
+
+        async def capture(message: dict[str, Any]) -> None:
+            nonlocal status, headers, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = list(message.get("headers", []))
+                message = {**message, "headers": [*headers, (b"x-cache", b"MISS")]}
+            elif message["type"] == "http.response.body" and size <= cache.max_entry_bytes:
+                chunk = message.get("body", b"")
+                chunks.append(chunk)
+                size += len(chunk)
+            await send(message)
+
+        await self.app(scope, receive, capture)
+        if status == 200 and size <= cache.max_entry_bytes:
+            body = b"".join(chunks)
+            if await cache.backend.set(key, (status, shared_headers(headers), body), tags, generations, cache.ttl_s):
+                cache.stores += 1
+                cache.bytes_stored += len(body)
+            else:
+                cache.stale_skipped += 1
+
+    async def _write(self, scope, receive, send, tags: tuple[str, ...]) -> None:
+        status = 0
+
+        async def track(message: dict[str, Any]) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, track)
+        finally:
+            # Anche se il client si è disconnesso: la scrittura può essere avvenuta
+            if 200 <= status < 300 or status == 0:
+                await self.cache.backend.invalidate(tags)
+                self.cache.invalidations += 1
+
+
+# Cache condivisa dal processo (None se RESPONSE_CACHE=off), montata come middleware in app.main
+response_cache = build_cache(
+    settings.RESPONSE_CACHE,
+    settings.RESPONSE_CACHE_PATH,
+    settings.RESPONSE_CACHE_TTL_S,
+    settings.RESPONSE_CACHE_MAX_ENTRIES,
+    settings.RESPONSE_CACHE_MAX_BYTES,
+    settings.RESPONSE_CACHE_MAX_ENTRY_BYTES,
+)
+
+
+async def invalidate(*tags: str) -> None:
+    """Invalida le collezioni indicate dopo una scrittura fatta fuori da una richiesta API."""
+    if response_cache is None or not tags:
+        return
+    await response_cache.backend.invalidate(tags)
+    response_cache.invalidations += 1
@@ -9,6 +9,7 @@ sovrascritti tramite variabili d'ambiente.
 """
 
 import os
+import tempfile
 from dataclasses import dataclass
 
 @dataclass(frozen=True)
@@ -17,14 +18,140 @@ class Settings:
     MONGO_URL: str = os.getenv("MONGO_URL", "mongodb://localhost:27017")
     DB_NAME: str = os.getenv("DB_NAME", "its_gestione")
 
+    # Pool di connessioni Motor/PyMongo (timeout in millisecondi, 0 = default del driver)
+    MONGO_MAX_POOL_SIZE: int = int(os.getenv("MONGO_MAX_POOL_SIZE", "100"))
+    MONGO_MIN_POOL_SIZE: int = int(os.getenv("MONGO_MIN_POOL_SIZE", "10"))
+    MONGO_MAX_IDLE_TIME_MS: int = int(os.getenv("MONGO_MAX_IDLE_TIME_MS", "300000"))
+    MONGO_CONNECT_TIMEOUT_MS: int = int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", "5000"))
+    MONGO_SERVER_SELECTION_TIMEOUT_MS: int = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000"))
+    MONGO_SOCKET_TIMEOUT_MS: int = int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", "0"))
+    MONGO_WAIT_QUEUE_TIMEOUT_MS: int = int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "0"))
+    # Compressori di rete in ordine di preferenza (es. "zstd,snappy,zlib"); vuoto = nessuno
+    MONGO_COMPRESSORS: str = os.getenv("MONGO_COMPRESSORS", "")
+
+    # Admission control: slot concorrenti per letture/scritture, coda d'attesa e scadenza
+    ADMISSION_ENABLED: bool = os.getenv("ADMISSION_ENABLED", "true").lower() in ("1", "true", "yes", "y")
+    ADMISSION_READ_LIMIT: int = int(os.getenv("ADMISSION_READ_LIMIT", "64"))
+    ADMISSION_WRITE_LIMIT: int = int(os.getenv("ADMISSION_WRITE_LIMIT", "16"))
+    ADMISSION_MAX_QUEUE: int = int(os.getenv("ADMISSION_MAX_QUEUE", "200"))
+    ADMISSION_QUEUE_TIMEOUT_MS: int = int(os.getenv("ADMISSION_QUEUE_TIMEOUT_MS", "2000"))
+    ADMISSION_RETRY_AFTER_S: int = int(os.getenv("ADMISSION_RETRY_AFTER_S", "1"))
+
+    # Budget di tempo delle query per richiesta (ms, 0 = nessuno): letture, scritture e regole
+    # per rotta "glob=ms" separate da virgola (es. "/leaderboard*=2000"); alla disconnessione
+    # del client le letture in corso vengono cancellate
+    QUERY_BUDGET_MS: int = int(os.getenv("QUERY_BUDGET_MS", "5000"))
+    QUERY_BUDGET_WRITE_MS: int = int(os.getenv("QUERY_BUDGET_WRITE_MS", "10000"))
+    QUERY_BUDGETS: str = os.getenv("QUERY_BUDGETS", "")
+    CANCEL_ON_DISCONNECT: bool = os.getenv("CANCEL_ON_DISCONNECT", "true").lower() in ("1", "true", "yes", "y")
+
+    # Registro delle query lente (collezione capped): soglia (ms), dimensione massima (MB),
+    # explain("executionStats") alla prima occorrenza di ogni forma e suo tempo massimo (secondi)
+    SLOW_QUERY_LOG: bool = os.getenv("SLOW_QUERY_LOG", "true").lower() in ("1", "true", "yes", "y")
+    SLOW_QUERY_MS: int = int(os.getenv("SLOW_QUERY_MS", "100"))
+    SLOW_QUERY_CAP_MB: int = int(os.getenv("SLOW_QUERY_CAP_MB", "16"))
+    SLOW_QUERY_EXPLAIN: bool = os.getenv("SLOW_QUERY_EXPLAIN", "true").lower() in ("1", "true", "yes", "y")
+    SLOW_QUERY_EXPLAIN_TIMEOUT_S: float = float(os.getenv("SLOW_QUERY_EXPLAIN_TIMEOUT_S", "10"))
+
+    # Coalescing delle GET identiche concorrenti (single-flight)
+    COALESCE_ENABLED: bool = os.getenv("COALESCE_ENABLED", "true").lower() in ("1", "true", "yes", "y")
+
+    # Cache delle risposte GET: "off", "memory" (nel processo) o "sqlite" (file condiviso dai
+    # worker dell'host); scadenza, limiti LRU (voci, byte totali, byte per risposta) e percorso del file
+    RESPONSE_CACHE: str = os.getenv("RESPONSE_CACHE", "off").lower()
+    RESPONSE_CACHE_TTL_S: float = float(os.getenv("RESPONSE_CACHE_TTL_S", "30"))
+    RESPONSE_CACHE_MAX_ENTRIES: int = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1000"))
+    RESPONSE_CACHE_MAX_BYTES: int = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+    RESPONSE_CACHE_MAX_ENTRY_BYTES: int = int(os.getenv("RESPONSE_CACHE_MAX_ENTRY_BYTES", str(1024 * 1024)))
+    RESPONSE_CACHE_PATH: str = os.getenv(
+        "RESPONSE_CACHE_PATH", os.path.join(tempfile.gettempdir(), "its_response_cache.sqlite3")
+    )
+
+    # Idempotency-Key sulle POST di creazione: durata di conservazione delle risposte (secondi),
+    # durata del segnaposto 'processing' (poi un retry può subentrare) e dimensione massima del corpo
+    IDEMPOTENCY_TTL_S: int = int(os.getenv("IDEMPOTENCY_TTL_S", "86400"))
+    IDEMPOTENCY_LEASE_S: int = int(os.getenv("IDEMPOTENCY_LEASE_S", "60"))
+    IDEMPOTENCY_MAX_BODY_BYTES: int = int(os.getenv("IDEMPOTENCY_MAX_BODY_BYTES", str(1024 * 1024)))
+
+    # Liste GET lette come batch BSON grezzi e rese senza rivalidazione Pydantic (facoltativo)
+    RAW_BSON_READS: bool = os.getenv("RAW_BSON_READS", "false").lower() in ("1", "true", "yes", "y")
+
+    # Migrazione online exams.data (stringa ISO → BSON date) all'avvio: dimensione batch e pausa tra batch
+    EXAM_DATES_MIGRATION: bool = os.getenv("EXAM_DATES_MIGRATION", "true").lower() in ("1", "true", "yes", "y")
+    MIGRATION_BATCH_SIZE: int = int(os.getenv("MIGRATION_BATCH_SIZE", "500"))
+    MIGRATION_PAUSE_MS: int = int(os.getenv("MIGRATION_PAUSE_MS", "50"))
+
+    # Iscrizioni: mantiene anche gli array students.modules_ids / modules.studenti_ids
+    # (vista di compatibilità durante la migrazione alla collezione 'enrollments')
+    ENROLLMENT_ARRAYS: bool = os.getenv("ENROLLMENT_ARRAYS", "true").lower() in ("1", "true", "yes", "y")
+
+    # Archiviazione esami per anno accademico: mese di inizio dell'anno e intervallo di
+    # rilettura del registro degli anni archiviati (secondi)
+    ACADEMIC_YEAR_START_MONTH: int = int(os.getenv("ACADEMIC_YEAR_START_MONTH", "9"))
+    ARCHIVE_REFRESH_S: float = float(os.getenv("ARCHIVE_REFRESH_S", "30"))
+
+    # Report per modulo in cache nel processo: scadenza (recepisce le scritture fatte da altri worker)
+    MODULE_REPORT_TTL_S: float = float(os.getenv("MODULE_REPORT_TTL_S", "60"))
+
+    # Classifica studenti: esami minimi per essere classificati e intervallo del ricalcolo
+    # completo (recepisce le scritture fatte da altri worker)
+    LEADERBOARD_MIN_EXAMS: int = int(os.getenv("LEADERBOARD_MIN_EXAMS", "3"))
+    LEADERBOARD_REBUILD_S: float = float(os.getenv("LEADERBOARD_REBUILD_S", "300"))
+
+    # Audit log (esami, studenti, moduli): header con l'autore della richiesta, voci per batch,
+    # attesa massima prima della scrittura e voci in memoria oltre le quali scrive la richiesta stessa
+    AUDIT_ENABLED: bool = os.getenv("AUDIT_ENABLED", "true").lower() in ("1", "true", "yes", "y")
+    AUDIT_ACTOR_HEADER: str = os.getenv("AUDIT_ACTOR_HEADER", "X-User")
+    AUDIT_BATCH_SIZE: int = int(os.getenv("AUDIT_BATCH_SIZE", "500"))
+    AUDIT_FLUSH_MS: int = int(os.getenv("AUDIT_FLUSH_MS", "200"))
+    AUDIT_MAX_BUFFER: int = int(os.getenv("AUDIT_MAX_BUFFER", "10000"))
+
+    # Job in background: worker per processo, intervallo di polling della coda, durata del lease
+    # (rinnovato ogni quarto), attesa base tra i tentativi e conservazione dei job conclusi
+    JOBS_ENABLED: bool = os.getenv("JOBS_ENABLED", "true").lower() in ("1", "true", "yes", "y")
+    JOBS_CONCURRENCY: int = int(os.getenv("JOBS_CONCURRENCY", "2"))
+    JOBS_POLL_S: float = float(os.getenv("JOBS_POLL_S", "2"))
+    JOBS_LEASE_S: float = float(os.getenv("JOBS_LEASE_S", "60"))
+    JOBS_RETRY_BACKOFF_S: float = float(os.getenv("JOBS_RETRY_BACKOFF_S", "10"))
+    JOBS_RETENTION_DAYS: int = int(os.getenv("JOBS_RETENTION_DAYS", "7"))
+
+    # Profilazione delle richieste (disattivata = middleware non montato): header e token che la
+    # richiedono, frazione di richieste campionate, intervallo di campionamento (ms), cartella
+    # dei profili (collapsed stacks per flame graph) e file conservati per rotta
+    PROFILE_ENABLED: bool = os.getenv("PROFILE_ENABLED", "false").lower() in ("1", "true", "yes", "y")
+    PROFILE_HEADER: str = os.getenv("PROFILE_HEADER", "X-Profile")
+    PROFILE_TOKEN: str = os.getenv("PROFILE_TOKEN", "")
+    PROFILE_SAMPLE_RATE: float = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+    PROFILE_INTERVAL_MS: float = float(os.getenv("PROFILE_INTERVAL_MS", "1"))
+    PROFILE_DIR: str = os.getenv("PROFILE_DIR", os.path.join(tempfile.gettempdir(), "its_profiles"))
+    PROFILE_MAX_FILES: int = int(os.getenv("PROFILE_MAX_FILES", "50"))
+
+    # Readiness: intervallo del controllo in background sul DB (secondi)
+    READY_CHECK_INTERVAL_S: float = float(os.getenv("READY_CHECK_INTERVAL_S", "5"))
+
     # Server
     API_PREFIX: str = os.getenv("API_PREFIX", "/api")
     HOST: str = os.getenv("HOST", "0.0.0.0")
     PORT: int = int(os.getenv("PORT", "8000"))
 
+    # Bundle Angular di produzione servito dal backend (cartella con index.html; vuoto = non servito)
+    FRONTEND_DIST: str = os.getenv("FRONTEND_DIST", "")
+
     # Ambiente / debug
     ENV: str = os.getenv("ENV", "development")
     DEBUG: bool = os.getenv("DEBUG", "true").lower() in ("1", "true", "yes", "y")
 
+    # Esportazioni (CSV/XLSX): documenti letti per ogni batch del cursore
+    EXPORT_BATCH_SIZE: int = int(os.getenv("EXPORT_BATCH_SIZE", "500"))
+
+    # Libretti PDF: cartella degli zip generati e processi worker (0 = metà dei core)
+    TRANSCRIPTS_DIR: str = os.getenv("TRANSCRIPTS_DIR", os.path.join(tempfile.gettempdir(), "its_transcripts"))
+    TRANSCRIPT_WORKERS: int = int(os.getenv("TRANSCRIPT_WORKERS", "0"))
+
+    # Feed modifiche (SSE): "local" (pub/sub in processo) o "changestream" (Mongo replica set)
+    EVENTS_SOURCE: str = os.getenv("EVENTS_SOURCE", "local")
+    EVENTS_QUEUE_SIZE: int = int(os.getenv("EVENTS_QUEUE_SIZE", "256"))
+    EVENTS_HEARTBEAT_S: float = float(os.getenv("EVENTS_HEARTBEAT_S", "15"))
+
 # Istanza condivisa da importare
 settings = Settings()
\ No newline at end of file
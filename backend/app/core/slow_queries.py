@@ -0,0 +1,313 @@
+# -*- coding: utf-8 -*-
+"""
+Registro delle operazioni MongoDB lente con cattura automatica del piano di esecuzione.
+
+Come funziona:
+- un CommandListener di PyMongo (agganciato al client in app.core.db) misura ogni comando
+  di lettura o modifica; oltre SLOW_QUERY_MS registra collezione, forma normalizzata della
+  query, durata, rotta HTTP che l'ha generata ed eventuale errore (es. budget scaduto)
+- forma: la query con i valori sostituiti da '?' (campi e operatori restano, l'ordine delle
+  chiavi no, tranne nei sort); liste di valori ($in) ridotte a un elemento. Le voci non
+  contengono dati degli studenti
+- la prima volta che il processo vede una forma di lettura esegue explain("executionStats")
+  in background e ne allega il riepilogo alla voce: struttura del piano vincente (stage, nomi e
+  chiavi degli indici, senza filtri né indexBounds che contengono i valori) e chiavi/documenti esaminati
+- le voci vanno in una collezione capped ('slow_queries', SLOW_QUERY_CAP_MB): le più vecchie
+  vengono scartate da MongoDB, nessuna pulizia da fare
+
+Note pratiche:
+- Il listener gira nei thread del driver: si limita a misurare e, solo per i comandi lenti,
+  a passare la voce al task asyncio che scrive ed esegue gli explain (coda limitata, oltre si scarta).
+- La rotta arriva da SlowQueryMiddleware tramite contextvar (Motor copia il contesto nei thread).
+- I getMore non hanno la query: un cursore lento è visibile solo dal primo batch.
+- Gli explain di aggregazioni con $out/$merge e dei comandi di modifica non vengono eseguiti.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import threading
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Any, Optional
+
+import pymongo
+from pymongo import monitoring
+
+from app.core import settings
+from app.core.db import get_collection, get_db
+
+logger = logging.getLogger(__name__)
+
+COLL = "slow_queries"
+
+# Comandi misurati e campi che ne definiscono la forma
+SHAPE_FIELDS: dict[str, tuple[str, ...]] = {
+    "find": ("filter", "sort", "projection"),
+    "aggregate": ("pipeline",),
+    "count": ("query",),
+    "distinct": ("key", "query"),
+    "findAndModify": ("query", "sort"),
+    "update": ("updates",),
+    "delete": ("deletes",),
+}
+EXPLAINABLE = frozenset({"find", "aggregate", "count", "distinct"})
+# Chiavi il cui ordine è significativo (non vengono ordinate nella forma)
+_ORDERED = frozenset({"sort", "$sort"})
+# Campi di sessione/trasporto da togliere dal comando prima dell'explain
+_TRANSPORT = frozenset({"lsid", "$db", "$clusterTime", "$readPreference", "txnNumber", "maxTimeMS", "cursor", "batchSize", "singleBatch"})
+
+# Scope ASGI della richiesta corrente (per la rotta)
+_scope: ContextVar[Optional[dict[str, Any]]] = ContextVar("slow_query_scope", default=None)
+
+
+def shape(value: Any) -> Any:
+    """Forma normalizzata: valori → '?', chiavi ordinate (tranne nei sort), liste di valori → ['?']."""
+    if isinstance(value, dict):
+        return {k: (v if k in _ORDERED else shape(v)) for k, v in sorted(value.items())}
+    if isinstance(value, (list, tuple)):
+        shaped = [shape(v) for v in value]
+        if all(not isinstance(v, (dict, list)) for v in shaped):
+            return ["?"] if shaped else []
+        return shaped
+    return "?"
+
+
+def command_shape(name: str, command: dict[str, Any]) -> dict[str, Any]:
+    """Forma del comando: solo i campi che identificano la query (niente valori)."""
+    result: dict[str, Any] = {}
+    for field in SHAPE_FIELDS[name]:
+        if field not in command:
+            continue
+        value = command[field]
+        if field in ("updates", "deletes"):
+            # Stesso statement ripetuto in bulk: conta la forma della prima 'q'
+            value = {"q": value[0].get("q", {})} if value else {}
+        # sort, proiezione e campo del distinct non contengono valori: restano come sono
+        result[field] = value if field in ("sort", "projection", "key") else shape(value)
+    return result
+
+
+def shape_hash(name: str, collection: str, shaped: dict[str, Any]) -> str:
+    raw = json.dumps([name, collection, shaped], default=str, separators=(",", ":"))
+    return hashlib.sha1(raw.encode()).hexdigest()[:16]
+
+
+def current_route() -> Optional[str]:
+    """'METODO /percorso/{param}' della richiesta in corso (None fuori dalle richieste)."""
+    scope = _scope.get()
+    if scope is None:
+        return None
+    route = scope.get("route")
+    return f"{scope.get('method')} {getattr(route, 'path', None) or scope.get('path')}"
+
+
+# Campi di uno stage del piano che non contengono valori della query
+_PLAN_FIELDS = ("stage", "indexName", "keyPattern", "direction", "isMultiKey", "memLimit", "limitAmount")
+
+
+def plan_outline(plan: Any) -> Optional[dict[str, Any]]:
+    """Struttura del piano (stage, indici, ordinamento) senza filter/indexBounds/parsedQuery."""
+    if not isinstance(plan, dict):
+        return None
+    plan = plan.get("queryPlan", plan)  # piani SBE: il piano classico è annidato
+    outline = {k: plan[k] for k in _PLAN_FIELDS if k in plan}
+    if "sortPattern" in plan:
+        outline["sortPattern"] = plan["sortPattern"]
+    if "inputStage" in plan:
+        outline["inputStage"] = plan_outline(plan["inputStage"])
+    if "inputStages" in plan:
+        outline["inputStages"] = [plan_outline(p) for p in plan["inputStages"]]
+    return outline
+
+
+def summarize_explain(doc: Any) -> Optional[dict[str, Any]]:
+    """Riepilogo dell'explain: piano vincente e statistiche (anche dentro gli stage di aggregate)."""
+    if isinstance(doc, dict):
+        planner, stats = doc.get("queryPlanner"), doc.get("executionStats")
+        if isinstance(planner, dict) and isinstance(stats, dict):
+            return {
+                "winning_plan": plan_outline(planner.get("winningPlan")),
+                "n_returned": stats.get("nReturned"),
+                "keys_examined": stats.get("totalKeysExamined"),
+                "docs_examined": stats.get("totalDocsExamined"),
+                "execution_ms": stats.get("executionTimeMillis"),
+            }
+        children = doc.values()
+    elif isinstance(doc, list):
+        children = doc
+    else:
+        return None
+    for child in children:
+        found = summarize_explain(child)
+        if found is not None:
+            return found
+    return None
+
+
+class SlowQueryRecorder(monitoring.CommandListener):
+    """Listener dei comandi + task asyncio che scrive le voci ed esegue gli explain."""
+
+    def __init__(self) -> None:
+        self._started: dict[int, tuple[dict[str, Any], Optional[str]]] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._task: Optional[asyncio.Task] = None
+        self._explained: set[str] = set()
+        self._lock = threading.Lock()
+        # Impostato da ensure_collection(): prima non si scrive (MongoDB creerebbe una collezione non capped)
+        self._collection_ready = asyncio.Event()
+        # Metriche cumulative
+        self.slow = 0
+        self.dropped = 0
+        self.explained = 0
+        self.explain_failures = 0
+
+    # --- Listener (thread del driver) ---
+
+    def started(self, event: monitoring.CommandStartedEvent) -> None:
+        # Il comando completo (con i valori) resta solo in memoria fino alla risposta: nelle voci
+        # va la forma, all'explain il comando stesso (il cui risultato viene ridotto a plan_outline)
+        if event.command_name in SHAPE_FIELDS:
+            self._started[event.request_id] = (event.command, current_route())
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent) -> None:
+        self._finish(event, None)
+
+    def failed(self, event: monitoring.CommandFailedEvent) -> None:
+        failure = event.failure or {}
+        # Solo il codice: errmsg può riportare valori (es. "dup key: { email: ... }")
+        self._finish(event, {"code": failure.get("code"), "code_name": failure.get("codeName")})
+
+    def _finish(self, event: Any, error: Optional[dict[str, Any]]) -> None:
+        started = self._started.pop(event.request_id, None)
+        if started is None or event.duration_micros < settings.SLOW_QUERY_MS * 1000:
+            return
+        command, route = started
+        name = event.command_name
+        collection = command.get(name)
+        if not isinstance(collection, str) or collection == COLL:
+            return
+        shaped = command_shape(name, command)
+        entry = {
+            "ts": datetime.now(timezone.utc),
+            "db": event.database_name,
+            "collection": collection,
+            "command": name,
+            "shape": shaped,
+            "shape_hash": shape_hash(name, collection, shaped),
+            "duration_ms": round(event.duration_micros / 1000, 1),
+            "route": route,
+            "error": error,
+        }
+        with self._lock:
+            self.slow += 1
+        logger.info("Query lenta %.0f ms: %s.%s %s (%s)", entry["duration_ms"], collection, name, shaped, route or "-")
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+        explain_cmd = None
+        if name in EXPLAINABLE and settings.SLOW_QUERY_EXPLAIN and error is None:
+            explain_cmd = {k: v for k, v in command.items() if k not in _TRANSPORT}
+        try:
+            loop.call_soon_threadsafe(self._enqueue, entry, explain_cmd)
+        except RuntimeError:
+            pass  # loop in chiusura
+
+    # --- Lato asyncio ---
+
+    def _enqueue(self, entry: dict[str, Any], explain_cmd: Optional[dict[str, Any]]) -> None:
+        try:
+            self._queue.put_nowait((entry, explain_cmd))
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+    async def ensure_collection(self) -> None:
+        """Crea la collezione capped se non esiste."""
+        db = get_db()
+        if COLL not in await db.list_collection_names(filter={"name": COLL}):
+            await db.create_collection(COLL, capped=True, size=settings.SLOW_QUERY_CAP_MB * 1024 * 1024)
+        self._collection_ready.set()
+
+    def start(self) -> None:
+        """Avvia il task di scrittura (le voci prima dell'avvio vengono solo loggate)."""
+        if self._task is None:
+            self._loop = asyncio.get_running_loop()
+            self._queue = asyncio.Queue(maxsize=1000)
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._loop = None
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self) -> None:
+        coll = get_collection(COLL)
+        # Fino ad allora le voci restano in coda (oltre il limite vengono scartate)
+        await self._collection_ready.wait()
+        try:
+            # Forme già spiegate (anche da altri processi o prima di un riavvio)
+            self._explained.update(await coll.distinct("shape_hash", {"explain": {"$ne": None}}))
+        except Exception as e:
+            logger.warning("Lettura del registro query lente non riuscita: %s", e)
+        while True:
+            entry, explain_cmd = await self._queue.get()
+            if explain_cmd is not None and entry["shape_hash"] not in self._explained:
+                # Una sola volta per forma, anche se l'explain non riesce
+                self._explained.add(entry["shape_hash"])
+                entry["explain"] = await self._explain(entry["db"], explain_cmd)
+            try:
+                await coll.insert_one(entry)
+            except Exception as e:
+                logger.warning("Scrittura del registro query lente non riuscita: %s", e)
+
+    async def _explain(self, db_name: str, command: dict[str, Any]) -> Optional[dict[str, Any]]:
+        """explain("executionStats") del comando, con un proprio limite di tempo."""
+        if any("$out" in stage or "$merge" in stage for stage in command.get("pipeline", [])):
+            return None
+        try:
+            with pymongo.timeout(settings.SLOW_QUERY_EXPLAIN_TIMEOUT_S):
+                result = await get_db().client[db_name].command(
+                    {"explain": command, "verbosity": "executionStats"}
+                )
+        except Exception as e:
+            self.explain_failures += 1
+            logger.warning("Explain della query lenta non riuscito: %s", e)
+            return None
+        self.explained += 1
+        return summarize_explain(result)
+
+    def metrics(self) -> dict[str, Any]:
+        return {
+            "threshold_ms": settings.SLOW_QUERY_MS,
+            "slow": self.slow,
+            "pending": self._queue.qsize() if self._queue is not None else 0,
+            "dropped": self.dropped,
+            "shapes_explained": self.explained,
+            "explain_failures": self.explain_failures,
+        }
+
+
+class SlowQueryMiddleware:
+    """Middleware ASGI: rende disponibile al listener la rotta della richiesta in corso."""
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        # Il router aggiunge 'route' a questo stesso dict: il listener legge il template del percorso
+        token = _scope.set(scope)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _scope.reset(token)
+
+
+# Registro condiviso (listener del client Motor, task avviato nel lifespan)
+slow_queries = SlowQueryRecorder()
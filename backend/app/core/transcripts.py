@@ -0,0 +1,255 @@
+# -*- coding: utf-8 -*-
+"""
+Generazione massiva dei libretti (transcript) PDF di tutti gli studenti.
+
+Come funziona:
+- studenti ed esami vengono letti dal DB a blocchi (un $in sugli esami per ogni
+  blocco di studenti): in memoria c'è al massimo un blocco alla volta
+- il rendering PDF (CPU) gira in un ProcessPoolExecutor (default metà dei core: gli altri
+  restano ai worker dell'API); i processi sono avviati con 'spawn', non con fork: il processo
+  che li crea ha thread attivi (Motor, audit log, job) e un fork ne copierebbe i lock occupati
+- i PDF completati vengono scritti subito nello zip finale (in un thread, fuori dall'event loop)
+- se la generazione fallisce o viene annullata lo zip parziale viene eliminato
+- l'avanzamento (completati, errori, documenti/secondo) è esposto da TranscriptStats
+
+Usato sia dallo script CLI (app/scripts/transcripts.py) sia dall'API (/api/transcripts).
+"""
+
+import asyncio
+import multiprocessing
+import os
+import re
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from typing import Any, AsyncIterator, Callable, Optional
+
+from app.core.db import get_collection
+from app.core.exam_archive import partitions
+from app.core.pdf import Line, build_pdf
+
+# Studenti letti per ogni blocco (e quindi per ogni query sugli esami)
+STUDENT_BATCH_SIZE = 200
+
+# Callback di avanzamento (chiamata nel thread dell'event loop)
+ProgressCallback = Callable[["TranscriptStats"], None]
+
+
+@dataclass
+class TranscriptStats:
+    """Avanzamento e throughput di una generazione massiva."""
+    total: int = 0
+    done: int = 0
+    failed: int = 0
+    started_at: float = field(default_factory=time.perf_counter)
+    finished_at: Optional[float] = None
+
+    @property
+    def elapsed(self) -> float:
+        """Secondi trascorsi dall'avvio (o durata totale se terminata)."""
+        end = self.finished_at if self.finished_at is not None else time.perf_counter()
+        return end - self.started_at
+
+    @property
+    def docs_per_sec(self) -> float:
+        """Throughput in documenti al secondo."""
+        elapsed = self.elapsed
+        return self.done / elapsed if elapsed > 0 else 0.0
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "total": self.total,
+            "done": self.done,
+            "failed": self.failed,
+            "elapsed_s": round(self.elapsed, 2),
+            "docs_per_sec": round(self.docs_per_sec, 1),
+        }
+
+
+# ---------------------------------------------------------------------------
+# Rendering (eseguito nei processi worker: solo dati serializzabili)
+# ---------------------------------------------------------------------------
+
+def _format_date(value: Any) -> str:
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()[:10]
+    return str(value or "")[:10]
+
+
+def transcript_filename(data: dict[str, Any]) -> str:
+    """Nome file nello zip: cognome_nome_id.pdf (solo caratteri sicuri)."""
+    base = f"{data.get('cognome', '')}_{data.get('nome', '')}".lower()
+    base = re.sub(r"[^a-z0-9]+", "_", base).strip("_") or "studente"
+    return f"{base}_{data['id']}.pdf"
+
+
+def render_transcript_pdf(data: dict[str, Any]) -> tuple[str, bytes]:
+    """
+    Impagina il libretto di uno studente e restituisce (nome file, byte PDF).
+    Funzione di modulo (picklable) pensata per ProcessPoolExecutor.
+    """
+    esami = data.get("esami", [])
+    voti = [e["voto"] for e in esami if isinstance(e.get("voto"), (int, float))]
+    media = f"{sum(voti) / len(voti):.2f}" if voti else "-"
+
+    lines: list[Line] = [
+        ("LIBRETTO DELLO STUDENTE", True),
+        ("", False),
+        (f"Studente:  {data.get('cognome', '')} {data.get('nome', '')}", False),
+        (f"Email:     {data.get('email', '')}", False),
+        (f"Matricola: {data.get('matricola') or '-'}", False),
+        ("", False),
+        (f"{'Data':<11}{'Codice':<9}{'Modulo':<36}{'Ore':>5}{'Voto':>6}", True),
+        ("-" * 67, False),
+    ]
+    for e in esami:
+        snap = e.get("modulo_snapshot") or {}
+        lines.append((
+            f"{_format_date(e.get('data')):<11}"
+            f"{str(snap.get('codice', ''))[:8]:<9}"
+            f"{str(snap.get('nome', ''))[:35]:<36}"
+            f"{snap.get('ore_totali', ''):>5}"
+            f"{e.get('voto', ''):>6}",
+            False,
+        ))
+    if not esami:
+        lines.append(("Nessun esame registrato.", False))
+    lines += [
+        ("-" * 67, False),
+        (f"Esami sostenuti: {len(voti)}    Media: {media}", True),
+        ("", False),
+        (f"Documento generato il {date.today().strftime('%d/%m/%Y')}", False),
+    ]
+    return transcript_filename(data), build_pdf(lines)
+
+
+# ---------------------------------------------------------------------------
+# Lettura dati (streaming a blocchi)
+# ---------------------------------------------------------------------------
+
+async def _with_exams(batch: list[dict[str, Any]]) -> list[dict[str, Any]]:
+    """Aggiunge a ogni studente del blocco i suoi esami (una sola query $in)."""
+    by_id = {str(s["_id"]): s for s in batch}
+    out = {
+        sid: {
+            "id": sid,
+            "nome": s.get("nome", ""),
+            "cognome": s.get("cognome", ""),
+            "email": s.get("email", ""),
+            "matricola": s.get("matricola"),
+            "esami": [],
+        }
+        for sid, s in by_id.items()
+    }
+    # Archivi dal più vecchio, poi la collezione calda: ordine cronologico complessivo
+    for part in reversed(await partitions(everything=True)):
+        cursor = get_collection(part.collection).find(
+            # Riferimenti in entrambe le forme (ObjectId e stringhe non ancora migrate)
+            {"student_id": {"$in": [s["_id"] for s in batch] + list(by_id)}, **part.date_filter},
+            projection={"_id": 0, "student_id": 1, "data": 1, "voto": 1, "modulo_snapshot": 1},
+        ).sort("data", 1)
+        async for e in cursor:
+            out[str(e["student_id"])]["esami"].append(e)
+    return list(out.values())
+
+
+async def iter_transcript_data(batch_size: int = STUDENT_BATCH_SIZE) -> AsyncIterator[dict[str, Any]]:
+    """Restituisce uno alla volta i dati del libretto di ogni studente."""
+    cursor = get_collection("students").find(
+        {}, projection={"nome": 1, "cognome": 1, "email": 1, "matricola": 1}
+    ).sort("_id", 1).batch_size(batch_size)
+
+    batch: list[dict[str, Any]] = []
+    async for s in cursor:
+        batch.append(s)
+        if len(batch) >= batch_size:
+            for item in await _with_exams(batch):
+                yield item
+            batch = []
+    if batch:
+        for item in await _with_exams(batch):
+            yield item
+
+
+# ---------------------------------------------------------------------------
+# Orchestrazione
+# ---------------------------------------------------------------------------
+
+def _write_entries(zf: zipfile.ZipFile, entries: list[tuple[str, bytes]]) -> None:
+    for name, pdf in entries:
+        # I contenuti PDF sono già compressi: nello zip basta archiviarli
+        zf.writestr(name, pdf, compress_type=zipfile.ZIP_STORED)
+
+
+def _remove(path: str) -> None:
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def default_workers() -> int:
+    """Numero di processi worker: metà dei core disponibili (almeno uno)."""
+    return max((os.cpu_count() or 1) // 2, 1)
+
+
+async def generate_transcripts_zip(
+    path: str,
+    workers: int | None = None,
+    on_progress: Optional[ProgressCallback] = None,
+    stats: Optional[TranscriptStats] = None,
+) -> TranscriptStats:
+    """
+    Genera i libretti di tutti gli studenti nello zip indicato.
+    - al massimo 'workers * 2' PDF in lavorazione contemporaneamente (memoria limitata)
+    - un errore di rendering su uno studente non blocca gli altri (conteggiato in 'failed')
+    """
+    workers = workers or default_workers()
+    stats = stats or TranscriptStats()
+    stats.total = await get_collection("students").count_documents({})
+    loop = asyncio.get_running_loop()
+    pending: set[asyncio.Future] = set()
+    writing: Optional[asyncio.Future] = None
+
+    async def store(done: set[asyncio.Future], zf: zipfile.ZipFile) -> None:
+        nonlocal writing
+        rendered = []
+        for fut in done:
+            try:
+                rendered.append(fut.result())
+            except Exception:
+                stats.failed += 1
+        if rendered:
+            # Scrittura su disco in un thread: un solo thread alla volta usa lo zip
+            writing = loop.run_in_executor(None, _write_entries, zf, rendered)
+            await writing
+            stats.done += len(rendered)
+        if on_progress:
+            on_progress(stats)
+
+    zf = await asyncio.to_thread(zipfile.ZipFile, path, "w")
+    try:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+            async for data in iter_transcript_data():
+                pending.add(loop.run_in_executor(pool, render_transcript_pdf, data))
+                if len(pending) >= workers * 2:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    await store(done, zf)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                await store(done, zf)
+        await asyncio.to_thread(zf.close)
+    except BaseException:
+        # Errore o annullamento: nessuno zip parziale su disco (dopo l'eventuale scrittura in corso)
+        if writing is not None and not writing.done():
+            await asyncio.wait({writing})
+        zf.close()
+        _remove(path)
+        raise
+
+    stats.finished_at = time.perf_counter()
+    if on_progress:
+        on_progress(stats)
+    return stats
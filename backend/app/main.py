@@ -1,18 +1,154 @@
 # -*- coding: utf-8 -*-
 """
 Punto di ingresso dell'app FastAPI.
-Configura CORS per il frontend e monta le rotte dell'API.
+Configura CORS per il frontend e monta le rotte dell'API (e, se FRONTEND_DIST è impostato,
+il bundle Angular di produzione).
+
+Ciclo di vita (lifespan):
+- all'avvio prepara il pool MongoDB (ping + connessioni minime), crea indici e collezioni
+  (ripetuto dal controllo di readiness finché non riesce, anche se il DB arriva dopo) e avvia
+  i task in background (controllo readiness, migrazione date esami, eventuale change stream,
+  worker della coda job)
+- allo shutdown ferma i task (i job in corso tornano in coda) e chiude il client MongoDB
 """
 
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 
 # Import corretti rispetto al package 'app'
 from app.core import settings
-from app.core.db import close_client
+from app.core.admission import AdmissionMiddleware, admission
+from app.core.audit import audit_log, ensure_indexes as ensure_audit_indexes
+from app.core.coalescing import CoalescingMiddleware, single_flight
+from app.core.db import close_client, warm_up
+from app.core.enrollments import ensure_indexes as ensure_enrollment_indexes
+from app.core.events import watch_change_stream
+from app.core.frontend import SPAStaticFiles
+from app.core.exam_dates import ensure_indexes as ensure_exam_indexes, run_in_background as migrate_exam_dates_in_background
+from app.core.health import readiness
+from app.core.idempotency import IdempotencyMiddleware, ensure_indexes as ensure_idempotency_indexes
+from app.core.jobs import ensure_indexes as ensure_job_indexes, job_queue
+from app.core.profiling import ProfilingMiddleware, request_profiler
+from app.core.query_budget import QueryBudgetMiddleware, query_budgets
+from app.core.response_cache import ResponseCacheMiddleware, response_cache
+from app.core.slow_queries import SlowQueryMiddleware, slow_queries
 from app.api.routes import router as api_router  # usa app.api.routes (non app.routers)
 
-app = FastAPI(title="Gestione Corsi ITS API", version="1.0.0")
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Avvio: warm-up del pool e task in background. Shutdown: stop task e chiusura client."""
+    setup = {
+        "idempotency_indexes": ensure_idempotency_indexes,
+        "exam_indexes": ensure_exam_indexes,
+        "enrollment_indexes": ensure_enrollment_indexes,
+        "job_indexes": ensure_job_indexes,
+        "audit_indexes": ensure_audit_indexes,
+    }
+    if settings.SLOW_QUERY_LOG:
+        setup["slow_queries_collection"] = slow_queries.ensure_collection
+    readiness.set_setup(setup)
+    try:
+        latency = await warm_up()
+        readiness.record(latency_ms=latency)
+        logger.info("MongoDB pronto (ping %.1f ms)", latency)
+    except Exception as e:
+        # L'app parte comunque: /ready segnala il problema finché il DB non torna raggiungibile
+        readiness.record(error=e)
+        logger.warning("Warm-up MongoDB non riuscito: %s", e)
+    # Separato dal warm-up: i passi non riusciti vengono ripetuti da readiness.run()
+    if readiness.ready:
+        await readiness.run_setup()
+
+    tasks = [asyncio.create_task(readiness.run(settings.READY_CHECK_INTERVAL_S))]
+    if settings.EXAM_DATES_MIGRATION:
+        tasks.append(asyncio.create_task(
+            migrate_exam_dates_in_background(settings.MIGRATION_BATCH_SIZE, settings.MIGRATION_PAUSE_MS / 1000)
+        ))
+    if settings.EVENTS_SOURCE == "changestream":
+        tasks.append(asyncio.create_task(watch_change_stream()))
+    audit_log.start()
+    if settings.SLOW_QUERY_LOG:
+        slow_queries.start()
+    if settings.JOBS_ENABLED:
+        job_queue.start(settings.JOBS_CONCURRENCY)
+
+    yield
+
+    if settings.JOBS_ENABLED:
+        await job_queue.stop()
+    await audit_log.stop()  # scrive le voci ancora nel buffer
+    await slow_queries.stop()
+
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    if response_cache is not None:
+        await response_cache.backend.close()
+    close_client()
+
+
+app = FastAPI(title="Gestione Corsi ITS API", version="1.0.0", lifespan=lifespan)
+
+API_PREFIX = getattr(settings, "API_PREFIX", "/api")
+
+# Profilazione su richiesta (header con token o campionamento): la più interna, misura solo
+# il lavoro dell'app. Disattivata non viene montata (nessun costo)
+if settings.PROFILE_ENABLED:
+    app.add_middleware(ProfilingMiddleware, profiler=request_profiler, prefix=API_PREFIX)
+
+# Rotta della richiesta per il registro delle query lente (dentro il budget: vale anche
+# per i task con cui questo esegue le letture)
+if settings.SLOW_QUERY_LOG:
+    app.add_middleware(SlowQueryMiddleware)
+
+# Budget di tempo delle query e cancellazione alla disconnessione
+# (il budget parte dopo l'attesa in coda dell'admission control)
+app.add_middleware(
+    QueryBudgetMiddleware,
+    budgets=query_budgets,
+    prefix=API_PREFIX,
+    cancel_on_disconnect=settings.CANCEL_ON_DISCONNECT,
+)
+
+# Admission control sulle rotte API (aggiunto prima di CORS, così anche i 503 hanno gli header CORS)
+if settings.ADMISSION_ENABLED:
+    app.add_middleware(
+        AdmissionMiddleware,
+        controller=admission,
+        include_prefix=API_PREFIX,
+        exclude_prefixes=[f"{API_PREFIX}/events"],
+    )
+
+# Coalescing delle GET identiche: fuori dall'admission control (i follower non occupano slot)
+# ed escludendo le risposte in streaming (export, feed SSE, download libretti)
+if settings.COALESCE_ENABLED:
+    app.add_middleware(
+        CoalescingMiddleware,
+        group=single_flight,
+        include_prefix=API_PREFIX,
+        exclude_prefixes=[f"{API_PREFIX}/events", f"{API_PREFIX}/exports", f"{API_PREFIX}/transcripts"],
+        cancel_on_disconnect=settings.CANCEL_ON_DISCONNECT,
+    )
+
+# Cache delle risposte: fuori dal coalescing (un hit non crea nemmeno un gruppo single-flight)
+# e dentro l'idempotency (un replay non invalida di nuovo)
+if response_cache is not None:
+    app.add_middleware(ResponseCacheMiddleware, cache=response_cache, prefix=API_PREFIX)
+
+# Idempotency-Key sulle POST di creazione: i retry ricevono la risposta originale
+# (fuori dall'admission control: un replay non occupa slot di scrittura)
+app.add_middleware(
+    IdempotencyMiddleware,
+    paths=[f"{API_PREFIX}/exams", f"{API_PREFIX}/students", f"{API_PREFIX}/modules"],
+)
 
 # Abilita chiamate dal frontend Angular (sviluppo)
 app.add_middleware(
@@ -23,19 +159,54 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-API_PREFIX = getattr(settings, "API_PREFIX", "/api")
-
 # Monta tutte le rotte sotto /api
 app.include_router(api_router, prefix=API_PREFIX)
 
 
 @app.get("/health")
 def health():
-    """Verifica rapida della salute del servizio."""
+    """Verifica rapida della salute del servizio (liveness: il processo risponde)."""
     return {"status": "ok"}
 
 
-@app.on_event("shutdown")
-def on_shutdown():
-    """Chiude il client MongoDB alla terminazione dell'app."""
-    close_client()
\ No newline at end of file
+@app.get("/ready")
+def ready():
+    """
+    Readiness: raggiungibilità del DB e latenza del ping, dall'ultimo controllo in background.
+    Restituisce 503 se il DB non è raggiungibile.
+    """
+    snapshot = readiness.snapshot()
+    return JSONResponse(snapshot, status_code=200 if readiness.serving else 503)
+
+
+@app.get("/metrics")
+async def metrics():
+    """
+    Metriche interne del processo:
+    - admission: slot attivi, coda, richieste scartate
+    - coalescing: richieste leader/follower delle GET unite, esecuzioni abbandonate
+    - query_budget: budget applicati, timeout (503) e letture cancellate alla disconnessione
+    - response_cache: hit/miss, hit ratio, byte serviti e salvati, voci e byte in cache (se attiva)
+    - audit: voci registrate/scritte/in attesa, batch e dimensione media (group commit)
+    - slow_queries: operazioni oltre soglia, voci scartate, forme spiegate (se attivo)
+    - profiling: richieste profilate (header/campionamento) e profili scritti (se attivo)
+    """
+    result = {
+        "admission": admission.metrics(),
+        "coalescing": single_flight.metrics(),
+        "query_budget": query_budgets.metrics(),
+        "audit": audit_log.metrics(),
+    }
+    if response_cache is not None:
+        result["response_cache"] = await response_cache.metrics()
+    if settings.SLOW_QUERY_LOG:
+        result["slow_queries"] = slow_queries.metrics()
+    if settings.PROFILE_ENABLED:
+        result["profiling"] = request_profiler.metrics()
+    return result
+
+
+# Bundle Angular di produzione (python run.py --prod): montato per ultimo, così API e sonde
+# hanno la precedenza e tutto il resto è servito dalla single-page app
+if settings.FRONTEND_DIST:
+    app.mount("/", SPAStaticFiles(directory=settings.FRONTEND_DIST, api_prefix=API_PREFIX), name="frontend")
@@ -0,0 +1,23 @@
+# -*- coding: utf-8 -*-
+"""
+Modello delle voci dell'audit log (/api/audit): chi ha cambiato cosa, con valori vecchi e nuovi.
+"""
+
+from datetime import datetime
+from typing import Any, Dict, Literal, Optional
+
+from pydantic import BaseModel, Field
+
+
+class AuditEntry(BaseModel):
+    """Una modifica registrata (riferimenti e date come stringhe)."""
+    id: str
+    ts: datetime
+    collection: Literal["modules", "students", "exams"]
+    entity_id: str
+    action: Literal["create", "update", "delete", "enroll", "unenroll"]
+    actor: Optional[str] = None
+    ip: Optional[str] = None
+    changes: Dict[str, Dict[str, Any]] = Field(
+        default_factory=dict, description="Campi cambiati: {campo: {old, new}}"
+    )
@@ -7,7 +7,8 @@ Salviamo anche uno snapshot del modulo al momento della prova
 Note pratiche:
 - Lo snapshot viene rigenerato dal router sulla base del modulo attuale:
   nel payload lato client può essere omesso (il backend lo calcola).
-- La data è un 'date' (YYYY-MM-DD), coerente con gli input HTML e l'ordinamento.
+- La data è un 'date' (YYYY-MM-DD) nell'API; nel DB è una BSON date (mezzanotte),
+  così filtri per intervallo, ordinamento e operatori di data usano l'indice.
 - Il voto è compreso tra 0 e 30; se preferisci il minimo 18, impostalo a 18.
 
 Aggiornato per Pydantic v2: usa 'model_config' invece della vecchia 'Config'.
@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+"""
+Modelli dei job in background (/api/jobs): richiesta di accodamento, stato e tipi disponibili.
+"""
+
+from datetime import datetime
+from typing import Any, Dict, List, Literal, Optional
+
+from pydantic import BaseModel, Field
+
+
+class JobCreate(BaseModel):
+    """Payload di accodamento di un job."""
+    kind: str = Field(..., description="Tipo di job (vedi GET /api/jobs/kinds)")
+    params: Dict[str, Any] = Field(default_factory=dict, description="Parametri dell'handler")
+    max_attempts: Optional[int] = Field(None, ge=1, le=10, description="Tentativi (default del tipo)")
+
+
+class Job(BaseModel):
+    """Stato di un job."""
+    id: str
+    kind: str
+    params: Dict[str, Any] = Field(default_factory=dict)
+    status: Literal["queued", "running", "succeeded", "failed", "cancelled"]
+    progress: Dict[str, Any] = Field(default_factory=dict)
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    attempts: int = 0
+    max_attempts: int
+    cancel_requested: bool = False
+    worker: Optional[str] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    run_after: Optional[datetime] = Field(None, description="Prossimo tentativo non prima di (se in coda)")
+    duration_s: Optional[float] = None
+
+
+class JobKindInfo(BaseModel):
+    """Tipo di job registrato."""
+    name: str
+    description: str
+    max_attempts: int
+    params: Dict[str, Any] = Field(default_factory=dict, description="Parametri con valore di default (None se obbligatori)")
+    required: List[str] = Field(default_factory=list, description="Parametri obbligatori")
+    params_schema: Dict[str, Any] = Field(default_factory=dict, description="JSON Schema dei parametri")
@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+"""
+Modelli di risposta della classifica studenti per media voti (generale o per modulo).
+Posizione 1 = media più alta; a parità di media precede chi ha sostenuto più esami.
+"""
+
+from typing import List, Literal, Optional
+
+from pydantic import BaseModel, Field
+
+
+class LeaderboardEntry(BaseModel):
+    """Riga della classifica."""
+    rank: int = Field(..., description="Posizione (1 = media più alta)")
+    student_id: str
+    nome: str = ""
+    cognome: str = ""
+    media: float
+    esami: int = Field(..., description="Esami sostenuti nella categoria")
+
+
+class Leaderboard(BaseModel):
+    """Primi o ultimi N studenti di una categoria."""
+    order: Literal["top", "bottom"]
+    module_id: Optional[str] = None
+    min_exams: int = Field(..., description="Esami minimi per essere in classifica")
+    classificati: int = Field(..., description="Studenti in classifica nella categoria")
+    items: List[LeaderboardEntry] = Field(default_factory=list)
+
+
+class StudentRank(BaseModel):
+    """Posizione di uno studente (rank None: esami sotto la soglia o nessun esame)."""
+    student_id: str
+    module_id: Optional[str] = None
+    rank: Optional[int] = None
+    classificati: int
+    media: Optional[float] = None
+    esami: int = 0
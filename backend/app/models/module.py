@@ -39,4 +39,43 @@ class ModuleDB(Module):
     """
     Documento come restituito dal database, con 'id' in formato stringa.
     """
-    id: str = Field(..., description="ID del documento (stringa ObjectId)")
\ No newline at end of file
+    id: str = Field(..., description="ID del documento (stringa ObjectId)")
+
+
+class GradeBucket(BaseModel):
+    """Frequenza di un singolo voto nell'istogramma del modulo."""
+    voto: int
+    count: int
+
+
+class MonthlyStat(BaseModel):
+    """Tentativi e media voti di un mese (YYYY-MM)."""
+    mese: str
+    tentativi: int
+    media: float
+
+
+class ModuleReport(BaseModel):
+    """
+    Report statistico dei voti di un modulo.
+    - istogramma: frequenze dei voti 18–30 (insufficienti conteggiati a parte)
+    - media/mediana/p10/p90: calcolati su tutti i tentativi registrati
+    - pass_rate: quota di tentativi con voto sufficiente (0–1)
+    - tentativi/studenti/studenti_con_ripetizioni: conteggi sugli esami sostenuti
+    - andamento_mensile: tentativi e media per mese ($dateTrunc sulla data dell'esame)
+    """
+    module_id: str
+    codice: str
+    nome: str
+    istogramma: List[GradeBucket] = Field(default_factory=list)
+    insufficienti: int = 0
+    media: float | None = None
+    mediana: float | None = None
+    p10: float | None = None
+    p90: float | None = None
+    pass_rate: float | None = None
+    tentativi: int = 0
+    studenti: int = 0
+    studenti_con_ripetizioni: int = 0
+    max_tentativi: int = 0
+    andamento_mensile: List[MonthlyStat] = Field(default_factory=list)
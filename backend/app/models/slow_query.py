@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+"""
+Modelli del registro delle query lente (/api/admin/slow-queries).
+"""
+
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from pydantic import BaseModel, Field
+
+
+class ExplainSummary(BaseModel):
+    """Riepilogo di explain("executionStats") della forma."""
+    winning_plan: Optional[Dict[str, Any]] = None
+    n_returned: Optional[int] = None
+    keys_examined: Optional[int] = None
+    docs_examined: Optional[int] = None
+    execution_ms: Optional[int] = None
+
+
+class SlowQuery(BaseModel):
+    """Un'operazione oltre la soglia SLOW_QUERY_MS."""
+    id: str
+    ts: datetime
+    collection: str
+    command: str
+    shape: Dict[str, Any] = Field(default_factory=dict, description="Query con i valori sostituiti da '?'")
+    shape_hash: str
+    duration_ms: float
+    route: Optional[str] = Field(None, description="Rotta HTTP che ha eseguito la query (es. 'GET /api/exams')")
+    error: Optional[Dict[str, Any]] = None
+    explain: Optional[ExplainSummary] = None
+
+
+class SlowQueryShape(BaseModel):
+    """Occorrenze di una stessa forma di query."""
+    shape_hash: str
+    collection: str
+    command: str
+    shape: Dict[str, Any] = Field(default_factory=dict)
+    count: int
+    avg_ms: float
+    max_ms: float
+    last_ts: datetime
+    routes: List[str] = Field(default_factory=list)
+    explain: Optional[ExplainSummary] = None
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""
+Archivia gli esami degli anni accademici chiusi in collezioni per anno (exams_archive_<anno>).
+Si può eseguire con l'API attiva: l'anno in archiviazione diventa di sola lettura e le
+letture passano all'archivio solo dopo la copia completa (vedi app.core.exam_archive).
+
+Uso:
+    poetry run python -m app.scripts.archive_exams --status
+    poetry run python -m app.scripts.archive_exams                 # tutti gli anni chiusi
+    poetry run python -m app.scripts.archive_exams --year 2023     # solo il 2023/24
+    poetry run python -m app.scripts.archive_exams --batch-size 1000 --pause-ms 100
+"""
+
+import argparse
+import asyncio
+import sys
+from typing import Any, Optional
+
+from app.core import settings
+from app.core.db import close_client, get_collection
+from app.core.exam_archive import REGISTRY_COLL, archive_year, closed_years, year_label
+
+
+def print_progress(state: dict[str, Any]) -> None:
+    """Stampa l'avanzamento sulla stessa riga del terminale."""
+    sys.stdout.write(f"\r  [{state['state']}] copiati: {state['copied']} | rimossi dalla collezione calda: {state['removed']}")
+    sys.stdout.flush()
+
+
+async def show_status() -> int:
+    """Anni archiviati (registro) e anni chiusi ancora da archiviare."""
+    async for state in get_collection(REGISTRY_COLL).find({}).sort("_id", 1):
+        print(f"  {year_label(state['_id'])}  {state['state']:<9} {state['collection']}  {state.get('archived', state['copied'])} esami")
+    pending = await closed_years()
+    print(f"Da archiviare: {', '.join(year_label(y) for y in pending) if pending else 'nessuno'}")
+    return 0
+
+
+async def run(year: Optional[int], batch_size: int, pause_ms: int, status: bool) -> int:
+    try:
+        if status:
+            return await show_status()
+        years = [year] if year is not None else await closed_years()
+        if not years:
+            print("Nessun anno accademico da archiviare.")
+            return 0
+        for y in years:
+            print(f"\nArchiviazione {year_label(y)} (batch {batch_size}, pausa {pause_ms} ms)...")
+            state = await archive_year(y, batch_size=batch_size, pause_s=pause_ms / 1000, on_progress=print_progress)
+            print(f"\n  completata: {state.get('archived', 0)} esami in '{state['collection']}'")
+        return 0
+    except Exception as e:
+        print(f"\nErrore durante l'archiviazione (rilanciare per riprendere): {e}")
+        return 1
+    finally:
+        close_client()
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Archivia gli esami degli anni accademici chiusi.")
+    parser.add_argument("--year", type=int, help="Anno di inizio dell'anno accademico (es. 2023 per il 2023/24)")
+    parser.add_argument("--batch-size", type=int, default=settings.MIGRATION_BATCH_SIZE, help="Documenti per batch")
+    parser.add_argument("--pause-ms", type=int, default=settings.MIGRATION_PAUSE_MS, help="Pausa tra i batch (ms)")
+    parser.add_argument("--status", action="store_true", help="Mostra anni archiviati e da archiviare")
+    args = parser.parse_args(argv)
+    return asyncio.run(run(args.year, args.batch_size, args.pause_ms, args.status))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
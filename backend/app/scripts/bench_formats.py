@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark JSON vs MessagePack sulle liste di esami.
+Misura dimensione del payload e tempi di codifica/decodifica (mediana su più ripetizioni)
+usando la stessa serializzazione delle risposte API.
+
+Uso:
+    poetry run python -m app.scripts.bench_formats
+    poetry run python -m app.scripts.bench_formats --sizes 1000 10000 50000 --repeat 7
+    poetry run python -m app.scripts.bench_formats --from-db   # esami reali dal DB
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import sys
+import time
+from datetime import date, timedelta
+from typing import Any, Callable
+
+from bson import ObjectId
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+def synthetic_exams(n: int, seed: int = 42) -> list[dict[str, Any]]:
+    """Esami fittizi con la stessa forma della risposta di GET /api/exams."""
+    rng = random.Random(seed)
+    modules = [
+        {"nome": f"Modulo {i}", "codice": f"MOD{i:03d}", "ore_totali": rng.choice([20, 40, 60]), "descrizione": "Lorem ipsum dolor sit amet"}
+        for i in range(30)
+    ]
+    students = [str(ObjectId()) for _ in range(max(1, n // 10))]
+    start = date(2023, 9, 1)
+    items = []
+    for _ in range(n):
+        mi = rng.randrange(len(modules))
+        items.append({
+            "id": str(ObjectId()),
+            "student_id": rng.choice(students),
+            "module_id": f"{mi:024x}",
+            "modulo_snapshot": modules[mi],
+            "data": (start + timedelta(days=rng.randrange(600))).isoformat(),
+            "voto": rng.randint(12, 30),
+            "note": "" if rng.random() < 0.7 else "Prova orale integrativa",
+        })
+    return items
+
+
+async def exams_from_db() -> list[dict[str, Any]]:
+    from app.core.db import close_client, get_collection
+    items = []
+    async for d in get_collection("exams").find({}):
+        d["id"] = str(d.pop("_id"))
+        items.append(d)
+    close_client()
+    return items
+
+
+def json_encode(content: Any) -> bytes:
+    # Stessi parametri di starlette.responses.JSONResponse.render
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+
+def measure(fn: Callable[[], Any], repeat: int) -> float:
+    """Tempo mediano in millisecondi."""
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(times)
+
+
+def bench(items: list[dict[str, Any]], repeat: int) -> None:
+    encoded_json = json_encode(items)
+    encoded_mp = msgpack.packb(items, use_bin_type=True)
+    rows = [
+        ("json", len(encoded_json), measure(lambda: json_encode(items), repeat), measure(lambda: json.loads(encoded_json), repeat)),
+        ("msgpack", len(encoded_mp), measure(lambda: msgpack.packb(items, use_bin_type=True), repeat), measure(lambda: msgpack.unpackb(encoded_mp, raw=False), repeat)),
+    ]
+    print(f"\n{len(items)} esami")
+    print(f"  {'formato':<8} {'byte':>12} {'encode ms':>10} {'decode ms':>10}")
+    for name, size, enc, dec in rows:
+        print(f"  {name:<8} {size:>12,} {enc:>10.2f} {dec:>10.2f}")
+    print(
+        f"  msgpack/json: dimensione {rows[1][1] / rows[0][1]:.0%}, "
+        f"encode {rows[1][2] / rows[0][2]:.0%}, decode {rows[1][3] / rows[0][3]:.0%}"
+    )
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark JSON vs MessagePack sulle liste di esami.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000, 50000], help="Numero di esami per prova")
+    parser.add_argument("--repeat", type=int, default=5, help="Ripetizioni per misura (si usa la mediana)")
+    parser.add_argument("--from-db", action="store_true", help="Usa gli esami presenti nel DB invece di dati sintetici")
+    args = parser.parse_args(argv)
+
+    if msgpack is None:
+        print("Il pacchetto 'msgpack' non è installato (poetry install).")
+        return 1
+
+    if args.from_db:
+        bench(asyncio.run(exams_from_db()), args.repeat)
+    else:
+        for n in args.sizes:
+            bench(synthetic_exams(n), args.repeat)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark del percorso di lettura delle liste: standard vs raw BSON.
+
+Percorsi confrontati (dai byte BSON ricevuti dal server al corpo JSON della risposta):
+- standard: dict decodificati dal driver → to_str_id → validazione Pydantic → JSON
+- raw:      batch BSON grezzi → bson.decode_all + conversione _id → JSON (app.core.rawbson)
+- lazy:     RawBSONDocument con accesso campo per campo → JSON
+
+Uso:
+    poetry run python -m app.scripts.bench_raw_reads
+    poetry run python -m app.scripts.bench_raw_reads --sizes 10000 100000 --repeat 3
+    poetry run python -m app.scripts.bench_raw_reads --from-db   # include la lettura dal DB
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+from typing import Any
+
+import bson
+from bson import ObjectId
+from bson.codec_options import CodecOptions
+from bson.raw_bson import RawBSONDocument
+from pydantic import TypeAdapter
+
+from app.api.projection import response_converters, response_defaults
+from app.core.rawbson import decode_batch, find_raw
+from app.models.exam import ExamDB
+from app.scripts.bench_formats import json_encode, measure, synthetic_exams
+
+BATCH_DOCS = 1000
+RAW_OPTIONS = CodecOptions(document_class=RawBSONDocument)
+EXAM_LIST = TypeAdapter(list[ExamDB])
+
+
+def encode_batches(items: list[dict[str, Any]]) -> list[bytes]:
+    """Simula i batch BSON di un cursore (stesso contenuto della collezione 'exams')."""
+    docs = [{"_id": ObjectId(d["id"]), **{k: v for k, v in d.items() if k != "id"}} for d in items]
+    return [b"".join(bson.encode(d) for d in docs[i:i + BATCH_DOCS]) for i in range(0, len(docs), BATCH_DOCS)]
+
+
+def standard_path(batches: list[bytes]) -> bytes:
+    items = []
+    for batch in batches:
+        for d in bson.decode_all(batch):
+            d["id"] = str(d.pop("_id"))
+            items.append(d)
+    # Come FastAPI con response_model: validazione, dump in modalità JSON, json.dumps
+    return json_encode(EXAM_LIST.dump_python(EXAM_LIST.validate_python(items), mode="json"))
+
+
+def raw_path(batches: list[bytes]) -> bytes:
+    defaults, converters = response_defaults(ExamDB), response_converters(ExamDB)
+    items = []
+    for batch in batches:
+        items.extend(decode_batch(batch, defaults, converters))
+    return json_encode(items)
+
+
+def lazy_path(batches: list[bytes]) -> bytes:
+    names = [n for n in ExamDB.model_fields if n != "id"]
+    items = []
+    for batch in batches:
+        for raw in bson.decode_all(batch, RAW_OPTIONS):
+            item = {"id": str(raw["_id"])}
+            for name in names:
+                value = raw.get(name)
+                item[name] = dict(value) if isinstance(value, RawBSONDocument) else value
+            items.append(item)
+    return json_encode(items)
+
+
+def bench(n: int, repeat: int) -> None:
+    batches = encode_batches(synthetic_exams(n))
+    results = [(fn.__name__, measure(lambda fn=fn: fn(batches), repeat)) for fn in (standard_path, raw_path, lazy_path)]
+    base = results[0][1]
+    print(f"\n{n} esami ({len(batches)} batch)")
+    for name, ms in results:
+        print(f"  {name:<14} {ms:>9.1f} ms  {base / ms:>5.1f}x")
+
+
+async def bench_db(repeat: int) -> None:
+    """Misura end-to-end (lettura dal DB inclusa) sulla collezione 'exams'."""
+    from app.api.projection import mongo_projection
+    from app.core.db import close_client, get_collection
+
+    coll = get_collection("exams")
+    projection = mongo_projection(tuple(ExamDB.model_fields))
+
+    async def standard() -> bytes:
+        items = []
+        async for d in coll.find({}).sort("data", -1):
+            d["id"] = str(d.pop("_id"))
+            items.append(d)
+        return json_encode(EXAM_LIST.dump_python(EXAM_LIST.validate_python(items), mode="json"))
+
+    async def raw() -> bytes:
+        items = await find_raw(coll, {}, projection, ("data", -1), response_defaults(ExamDB), response_converters(ExamDB))
+        return json_encode(items)
+
+    count = await coll.count_documents({})
+    print(f"\nDB: {count} esami")
+    for name, fn in (("standard", standard), ("raw", raw)):
+        times = []
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            await fn()
+            times.append((time.perf_counter() - t0) * 1000)
+        print(f"  {name:<14} {sorted(times)[len(times) // 2]:>9.1f} ms")
+    close_client()
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark lettura liste: standard vs raw BSON.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 50000, 100000], help="Numero di esami per prova")
+    parser.add_argument("--repeat", type=int, default=3, help="Ripetizioni per misura (si usa la mediana)")
+    parser.add_argument("--from-db", action="store_true", help="Misura anche la lettura reale dalla collezione 'exams'")
+    args = parser.parse_args(argv)
+
+    for n in args.sizes:
+        bench(n, args.repeat)
+    if args.from_db:
+        asyncio.run(bench_db(args.repeat))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""
+Esegue le migrazioni di schema versionate (app/scripts/migrations).
+
+- le versioni applicate sono registrate in 'schema_migrations' (data, durata, statistiche)
+- si applicano in ordine solo le versioni mancanti; un lock evita esecuzioni concorrenti
+- le migrazioni lavorano a batch (bulk_write) e si possono eseguire con l'API attiva
+
+Uso:
+    poetry run python -m app.scripts.migrate                 # applica le versioni mancanti
+    poetry run python -m app.scripts.migrate --status        # elenco applicate/da applicare
+    poetry run python -m app.scripts.migrate --to 1 --batch-size 1000 --pause-ms 100
+    poetry run python -m app.scripts.migrate --dry-run       # conta senza scrivere
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Optional
+
+from pymongo.errors import DuplicateKeyError
+
+from app.core import settings
+from app.core.db import close_client, get_db
+from app.scripts.migrations import MIGRATIONS_COLL, BatchStats, MigrationContext, load_migrations
+
+LOCK_ID = "lock"
+
+
+def print_progress(stats: BatchStats) -> None:
+    """Stampa l'avanzamento sulla stessa riga del terminale."""
+    sys.stdout.write(
+        f"\r    {stats.collection}: {stats.scanned} letti"
+        f" | {stats.modified} aggiornati | {stats.skipped} invariati"
+        f" | {stats.docs_per_sec:.0f} doc/s"
+    )
+    sys.stdout.flush()
+
+
+async def applied_versions(db) -> dict[int, dict]:
+    return {d["_id"]: d async for d in db[MIGRATIONS_COLL].find({"_id": {"$type": "number"}})}
+
+
+async def show_status() -> int:
+    db = get_db()
+    applied = await applied_versions(db)
+    for m in load_migrations():
+        info = applied.get(m.VERSION)
+        when = f"applicata {info['applied_at']:%Y-%m-%d %H:%M}" if info else "da applicare"
+        print(f"  v{m.VERSION:03d}  {m.DESCRIPTION:<55} {when}")
+    return 0
+
+
+async def run(target: Optional[int], batch_size: int, pause_ms: int, dry_run: bool) -> int:
+    db = get_db()
+    registry = db[MIGRATIONS_COLL]
+    applied = await applied_versions(db)
+    pending = [
+        m for m in load_migrations()
+        if m.VERSION not in applied and (target is None or m.VERSION <= target)
+    ]
+    if not pending:
+        print("Nessuna migrazione da applicare.")
+        return 0
+
+    try:
+        await registry.insert_one({"_id": LOCK_ID, "since": datetime.now(timezone.utc)})
+    except DuplicateKeyError:
+        print(f"Migrazioni già in corso (lock in '{MIGRATIONS_COLL}'); se è un residuo, rimuovere il documento '{LOCK_ID}'.")
+        return 1
+
+    try:
+        for m in pending:
+            print(f"\nv{m.VERSION:03d} {m.DESCRIPTION}{' (dry run)' if dry_run else ''}")
+            ctx = MigrationContext(
+                db, batch_size=batch_size, pause_s=pause_ms / 1000, dry_run=dry_run, on_progress=print_progress
+            )
+            t0 = time.perf_counter()
+            await m.up(ctx)
+            duration = time.perf_counter() - t0
+            print(f"\n  completata in {duration:.1f}s")
+            if not dry_run:
+                await registry.insert_one({
+                    "_id": m.VERSION,
+                    "description": m.DESCRIPTION,
+                    "applied_at": datetime.now(timezone.utc),
+                    "duration_s": round(duration, 3),
+                    "stats": [s.as_dict() for s in ctx.results],
+                })
+    except Exception as e:
+        print(f"\nErrore durante la migrazione (rilanciare per riprendere): {e}")
+        return 1
+    finally:
+        await registry.delete_one({"_id": LOCK_ID})
+    return 0
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Migrazioni di schema versionate.")
+    parser.add_argument("--status", action="store_true", help="Mostra le versioni applicate e da applicare")
+    parser.add_argument("--to", type=int, default=None, help="Applica fino a questa versione (inclusa)")
+    parser.add_argument("--batch-size", type=int, default=settings.MIGRATION_BATCH_SIZE, help="Documenti per batch")
+    parser.add_argument("--pause-ms", type=int, default=settings.MIGRATION_PAUSE_MS, help="Pausa tra i batch (ms)")
+    parser.add_argument("--dry-run", action="store_true", help="Conta i documenti da aggiornare senza scrivere")
+    args = parser.parse_args(argv)
+
+    async def _main() -> int:
+        try:
+            if args.status:
+                return await show_status()
+            return await run(args.to, args.batch_size, args.pause_ms, args.dry_run)
+        finally:
+            close_client()
+
+    return asyncio.run(_main())
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+"""
+Migra exams.data da stringa ISO (YYYY-MM-DD) a BSON date, a batch e in modo ripartibile.
+Si può eseguire con l'API attiva (è la stessa migrazione avviata dal lifespan
+quando EXAM_DATES_MIGRATION è attivo, un solo esecutore alla volta); al termine verifica
+gli indici sulla data.
+
+Uso:
+    poetry run python -m app.scripts.migrate_exam_dates
+    poetry run python -m app.scripts.migrate_exam_dates --batch-size 1000 --pause-ms 100
+    poetry run python -m app.scripts.migrate_exam_dates --restart   # ignora lo stato salvato
+"""
+
+import argparse
+import asyncio
+import sys
+from typing import Any
+
+from app.core import settings
+from app.core.db import close_client
+from app.core.exam_dates import MigrationLocked, migrate_exam_dates
+
+
+def print_progress(state: dict[str, Any]) -> None:
+    """Stampa l'avanzamento sulla stessa riga del terminale."""
+    sys.stdout.write(f"\r  convertiti: {state['converted']} | non convertibili: {state['skipped']}")
+    sys.stdout.flush()
+
+
+async def run(batch_size: int, pause_ms: int, restart: bool) -> int:
+    print(f"Migrazione date esami (batch {batch_size}, pausa {pause_ms} ms)...")
+    try:
+        state = await migrate_exam_dates(
+            batch_size=batch_size, pause_s=pause_ms / 1000, on_progress=print_progress, restart=restart
+        )
+    except MigrationLocked as e:
+        print(f"\n{e}: riprovare più tardi")
+        return 1
+    except Exception as e:
+        print(f"\nErrore durante la migrazione (rilanciare per riprendere): {e}")
+        return 1
+    finally:
+        close_client()
+    print(f"\nCompletata: {state['converted']} convertiti, {state['skipped']} non convertibili. Indici verificati.")
+    return 0
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Migra exams.data a BSON date.")
+    parser.add_argument("--batch-size", type=int, default=settings.MIGRATION_BATCH_SIZE, help="Documenti per batch")
+    parser.add_argument("--pause-ms", type=int, default=settings.MIGRATION_PAUSE_MS, help="Pausa tra i batch (ms)")
+    parser.add_argument("--restart", action="store_true", help="Ignora lo stato salvato e ricontrolla tutti gli esami")
+    args = parser.parse_args(argv)
+    return asyncio.run(run(args.batch_size, args.pause_ms, args.restart))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+"""
+Migrazioni di schema versionate (eseguite da app.scripts.migrate).
+
+Ogni migrazione è un modulo 'vNNN_descrizione.py' in questo package con:
+- VERSION: int            numero progressivo (ordine di esecuzione)
+- DESCRIPTION: str        descrizione breve
+- async def up(ctx)       applica la migrazione usando il MigrationContext
+
+Regole:
+- le migrazioni devono essere idempotenti: rieseguite (es. dopo un'interruzione)
+  trovano solo i documenti ancora da convertire
+- si lavora a batch con bulk_write (MigrationContext.batched_update, o scan per
+  scrivere su altre collezioni), con pausa configurabile tra i batch per non
+  competere con l'API in esercizio
+- le versioni applicate sono registrate nella collezione 'schema_migrations'
+"""
+
+import asyncio
+import importlib
+import pkgutil
+import re
+import time
+from dataclasses import asdict, dataclass, field
+from types import ModuleType
+from typing import Any, AsyncIterator, Callable, Optional
+
+from pymongo import ASCENDING, UpdateOne
+
+MIGRATIONS_COLL = "schema_migrations"
+_MODULE_NAME = re.compile(r"^v\d{3}_\w+$")
+
+
+@dataclass
+class BatchStats:
+    """Avanzamento di un batched_update su una collezione."""
+    collection: str
+    scanned: int = 0
+    modified: int = 0
+    skipped: int = 0
+    batches: int = 0
+    started_at: float = field(default_factory=time.perf_counter)
+
+    @property
+    def docs_per_sec(self) -> float:
+        elapsed = time.perf_counter() - self.started_at
+        return self.scanned / elapsed if elapsed > 0 else 0.0
+
+    def as_dict(self) -> dict[str, Any]:
+        data = asdict(self)
+        data.pop("started_at")
+        return data
+
+
+class MigrationContext:
+    """Accesso al DB e utilità a batch per le migrazioni."""
+
+    def __init__(
+        self,
+        db,
+        batch_size: int = 500,
+        pause_s: float = 0.0,
+        dry_run: bool = False,
+        on_progress: Optional[Callable[[BatchStats], None]] = None,
+    ) -> None:
+        self.db = db
+        self.batch_size = batch_size
+        self.pause_s = pause_s
+        self.dry_run = dry_run
+        self.on_progress = on_progress
+        self.results: list[BatchStats] = []
+
+    def start(self, collection: str) -> BatchStats:
+        """Nuove statistiche per una collezione (registrate nei risultati della migrazione)."""
+        stats = BatchStats(collection)
+        self.results.append(stats)
+        return stats
+
+    async def scan(
+        self,
+        stats: BatchStats,
+        query: dict[str, Any],
+        projection: Optional[dict[str, Any]] = None,
+    ) -> AsyncIterator[list[dict[str, Any]]]:
+        """
+        Scorre i documenti di stats.collection che soddisfano 'query' in ordine di _id,
+        a batch. Il chiamante aggiorna modified/skipped; conteggi, avanzamento e pausa
+        tra i batch sono gestiti qui. Ogni documento è visitato una sola volta.
+        """
+        coll = self.db[stats.collection]
+        last_id = None
+        while True:
+            page = dict(query)
+            if last_id is not None:
+                page = {"$and": [query, {"_id": {"$gt": last_id}}]}
+            docs = await coll.find(page, projection).sort("_id", ASCENDING).limit(self.batch_size).to_list(self.batch_size)
+            if not docs:
+                break
+
+            yield docs
+
+            stats.scanned += len(docs)
+            stats.batches += 1
+            last_id = docs[-1]["_id"]
+            if self.on_progress:
+                self.on_progress(stats)
+            if self.pause_s:
+                await asyncio.sleep(self.pause_s)
+
+    async def batched_update(
+        self,
+        collection: str,
+        query: dict[str, Any],
+        transform: Callable[[dict[str, Any]], Optional[UpdateOne]],
+        projection: Optional[dict[str, Any]] = None,
+    ) -> BatchStats:
+        """
+        Applica con bulk_write, batch per batch (vedi scan), le UpdateOne restituite
+        da transform(doc) (None = niente da fare).
+        """
+        coll = self.db[collection]
+        stats = self.start(collection)
+        async for docs in self.scan(stats, query, projection):
+            ops = []
+            for doc in docs:
+                op = transform(doc)
+                if op is None:
+                    stats.skipped += 1
+                else:
+                    ops.append(op)
+            if ops and not self.dry_run:
+                result = await coll.bulk_write(ops, ordered=False)
+                stats.modified += result.modified_count
+            elif ops:
+                stats.modified += len(ops)
+        return stats
+
+
+def load_migrations() -> list[ModuleType]:
+    """Moduli di migrazione del package, ordinati per VERSION (versioni duplicate → errore)."""
+    modules = [
+        importlib.import_module(f"{__name__}.{info.name}")
+        for info in pkgutil.iter_modules(__path__)
+        if _MODULE_NAME.match(info.name)
+    ]
+    modules.sort(key=lambda m: m.VERSION)
+    versions = [m.VERSION for m in modules]
+    if len(versions) != len(set(versions)):
+        raise RuntimeError(f"Versioni di migrazione duplicate: {versions}")
+    return modules
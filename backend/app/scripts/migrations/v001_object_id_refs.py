@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+"""
+v001 — Riferimenti da stringa a ObjectId.
+
+- exams.student_id, exams.module_id
+- students.modules_ids, modules.studenti_ids (array: duplicati rimossi, ordine mantenuto)
+
+Ogni update ha come condizione i valori letti: un documento modificato dall'API nel
+frattempo non viene sovrascritto (e le scritture dell'API salvano già ObjectId).
+Le stringhe non valide come ObjectId restano invariate (conteggiate tra gli 'skipped').
+L'API mantiene il contratto a stringhe (vedi app.core.refs).
+"""
+
+from typing import Any, Optional
+
+from pymongo import UpdateOne
+
+from app.core.refs import REF_ARRAY_FIELDS, REF_FIELDS, to_ref, to_refs
+
+VERSION = 1
+DESCRIPTION = "Riferimenti studenti/moduli/esami come ObjectId"
+
+
+def _transform(collection: str):
+    singles = REF_FIELDS[collection]
+    arrays = REF_ARRAY_FIELDS[collection]
+
+    def transform(doc: dict[str, Any]) -> Optional[UpdateOne]:
+        changes: dict[str, Any] = {}
+        for name in singles:
+            if name in doc and to_ref(doc[name]) != doc[name]:
+                changes[name] = to_ref(doc[name])
+        for name in arrays:
+            values = doc.get(name)
+            if isinstance(values, list) and any(isinstance(v, str) for v in values):
+                converted = to_refs(values)
+                if converted != values:
+                    changes[name] = converted
+        if not changes:
+            return None
+        condition = {"_id": doc["_id"], **{name: doc[name] for name in changes}}
+        return UpdateOne(condition, {"$set": changes})
+
+    return transform
+
+
+async def up(ctx) -> None:
+    for collection in ("exams", "students", "modules"):
+        fields = REF_FIELDS[collection] + REF_ARRAY_FIELDS[collection]
+        # Solo i documenti con almeno un riferimento ancora in forma di stringa
+        query = {"$or": [{name: {"$type": "string"}} for name in fields]}
+        await ctx.batched_update(collection, query, _transform(collection), {name: 1 for name in fields})
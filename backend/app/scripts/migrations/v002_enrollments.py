@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+"""
+v002 — Iscrizioni nella collezione dedicata 'enrollments'.
+
+Ricostruisce un documento {student_id, module_id} per ogni coppia presente in
+students.modules_ids o in modules.studenti_ids (l'unione dei due lati: se gli array
+erano disallineati, l'iscrizione vale comunque). Upsert idempotenti sull'indice unico:
+rieseguita, la migrazione non crea duplicati ('modified' conta le iscrizioni nuove).
+
+Gli array restano come vista di compatibilità finché ENROLLMENT_ARRAYS è attivo;
+i riferimenti non validi come ObjectId sono ignorati (conteggiati tra gli 'skipped').
+"""
+
+from bson import ObjectId
+
+from app.core.enrollments import COLL, ENROLLMENT_INDEXES, ROSTER_VIEWS, enrollment_upsert
+from app.core.refs import to_ref
+
+VERSION = 2
+DESCRIPTION = "Iscrizioni studente-modulo nella collezione 'enrollments'"
+
+
+async def up(ctx) -> None:
+    enrollments = ctx.db[COLL]
+    if not ctx.dry_run:
+        # L'indice unico rende idempotenti gli upsert anche prima del primo avvio dell'API
+        for name, keys in ENROLLMENT_INDEXES.items():
+            await enrollments.create_index(keys, unique=True, name=name)
+
+    for collection, (field, own, _) in ROSTER_VIEWS.items():
+        stats = ctx.start(collection)
+        query = {f"{field}.0": {"$exists": True}}
+        async for docs in ctx.scan(stats, query, {field: 1}):
+            ops = []
+            for doc in docs:
+                for ref in doc[field]:
+                    other = to_ref(ref)
+                    if not isinstance(other, ObjectId):
+                        stats.skipped += 1
+                        continue
+                    pair = (doc["_id"], other) if own == "student_id" else (other, doc["_id"])
+                    ops.append(enrollment_upsert(*pair))
+            if ops and not ctx.dry_run:
+                result = await enrollments.bulk_write(ops, ordered=False)
+                stats.modified += result.upserted_count
+            elif ops:
+                stats.modified += len(ops)
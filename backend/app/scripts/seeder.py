@@ -6,14 +6,14 @@ Cosa fa:
 - reset delle collezioni principali
 - crea un set di moduli realistici
 - genera studenti con dati coerenti (nome, cognome, email ITS, matricola)
-- iscrive ogni studente a 3–6 moduli (sincronizzando entrambi i lati)
+- iscrive ogni studente a 3–6 moduli (collezione 'enrollments' + array di compatibilità)
 - crea esami realistici (data scolastica, voto plausibile, note coerenti)
 
 Note:
 - Mantiene i nomi dei campi in italiano, compatibili con API e frontend:
   Modulo: nome, codice, ore_totali, descrizione, studenti_ids
   Studente: nome, cognome, email, matricola (extra), modules_ids
-  Esame: student_id, module_id, modulo_snapshot{nome,codice,ore_totali,descrizione}, data (YYYY-MM-DD), voto, note
+  Esame: student_id, module_id, modulo_snapshot{nome,codice,ore_totali,descrizione}, data (BSON date), voto, note
 """
 
 import asyncio
@@ -26,7 +26,9 @@ from typing import Any, Dict, List
 from bson import ObjectId
 from faker import Faker
 
+from app.core import enrollments, settings
 from app.core.db import get_collection
+from app.core.exam_archive import drop_archives
 
 # Faker configurato per nomi italiani; seed fisso per risultati ripetibili
 fake = Faker("it_IT")
@@ -55,16 +57,16 @@ def normalize_email(text: str) -> str:
     return s.strip(".")
 
 
-def school_exam_date() -> str:
+def school_exam_date() -> datetime:
     """
     Restituisce una data d'esame plausibile nel periodo scolastico 2024–2025.
-    Periodi: Ott-Dic e Gen-Giu. Output in formato YYYY-MM-DD.
+    Periodi: Ott-Dic e Gen-Giu. Output come datetime a mezzanotte (BSON date).
     """
     possible_months = [10, 11, 12, 1, 2, 3, 4, 5, 6]
     year = 2024 if random.random() < 0.5 else 2025
     month = random.choice(possible_months)
     day = random.randint(5, 25)
-    return datetime(year, month, day).strftime("%Y-%m-%d")
+    return datetime(year, month, day)
 
 
 def exam_note(voto: int, modulo_nome: str) -> str:
@@ -128,10 +130,12 @@ async def reset_collections() -> None:
     students = get_collection("students")
     exams = get_collection("exams")
 
-    print("Svuoto collezioni: modules, students, exams...")
+    print("Svuoto collezioni: modules, students, exams, enrollments...")
     await modules.delete_many({})
     await students.delete_many({})
     await exams.delete_many({})
+    await get_collection(enrollments.COLL).delete_many({})
+    await drop_archives()
 
 
 # ---------------------------------------------------------------------------
@@ -214,7 +218,8 @@ async def create_students(n: int = 35) -> List[Dict[str, Any]]:
 async def enroll_students(students: List[Dict[str, Any]], modules: List[Dict[str, Any]]) -> None:
     """
     Assegna a ogni studente 3–6 moduli scelti a caso.
-    Aggiorna sia lo studente (modules_ids) che ogni modulo (studenti_ids) con ID in formato stringa.
+    Salva le iscrizioni in 'enrollments'; con ENROLLMENT_ARRAYS aggiorna anche lo studente
+    (modules_ids) e ogni modulo (studenti_ids) con gli ObjectId.
     """
     print("\nIscrizione degli studenti ai moduli...\n")
     students_coll = get_collection("students")
@@ -222,22 +227,23 @@ async def enroll_students(students: List[Dict[str, Any]], modules: List[Dict[str
 
     for stud in students:
         chosen_modules = random.sample(modules, k=random.randint(3, 6))
-        module_ids_str = [str(m["_id"]) for m in chosen_modules]
-        student_id_str = str(stud["_id"])
-
-        # Aggiorna lo studente con l'elenco dei moduli iscritti (stringhe)
-        await students_coll.update_one(
-            {"_id": stud["_id"]},
-            {"$set": {"modules_ids": module_ids_str}},
-        )
-
-        # Aggiorna ogni modulo: aggiunge lo studente iscritto (stringa)
-        for m in chosen_modules:
-            await modules_coll.update_one(
-                {"_id": m["_id"]},
-                {"$addToSet": {"studenti_ids": student_id_str}},
+        module_ids = [m["_id"] for m in chosen_modules]
+        await enrollments.enroll_many((stud["_id"], mid) for mid in module_ids)
+
+        if settings.ENROLLMENT_ARRAYS:
+            # Aggiorna lo studente con l'elenco dei moduli iscritti (ObjectId)
+            await students_coll.update_one(
+                {"_id": stud["_id"]},
+                {"$set": {"modules_ids": module_ids}},
             )
 
+            # Aggiorna ogni modulo: aggiunge lo studente iscritto (ObjectId)
+            for m in chosen_modules:
+                await modules_coll.update_one(
+                    {"_id": m["_id"]},
+                    {"$addToSet": {"studenti_ids": stud["_id"]}},
+                )
+
         print(f"  - {stud['nome']} {stud['cognome']} → {len(chosen_modules)} moduli")
 
 
@@ -256,14 +262,9 @@ async def create_exams(students: List[Dict[str, Any]]) -> None:
     total_exams = 0
 
     for stud in students:
-        # recupera modules_ids aggiornati (se lo studente non li ha, ricarico dal DB)
-        module_ids = stud.get("modules_ids")
-        if not module_ids:
-            fetched = await get_collection("students").find_one({"_id": stud["_id"]})
-            module_ids = fetched.get("modules_ids", [])
-
-        for mid_str in module_ids:
-            mod = await modules_coll.find_one({"_id": ObjectId(mid_str)})
+        # moduli dello studente dalle iscrizioni
+        for mid in await enrollments.roster("students", stud["_id"]):
+            mod = await modules_coll.find_one({"_id": ObjectId(mid)})
             if not mod:
                 continue
 
@@ -280,8 +281,8 @@ async def create_exams(students: List[Dict[str, Any]]) -> None:
                 }
 
                 doc = {
-                    "student_id": str(stud["_id"]),
-                    "module_id": str(mod["_id"]),
+                    "student_id": stud["_id"],
+                    "module_id": mod["_id"],
                     "modulo_snapshot": modulo_snapshot,
                     "data": data,
                     "voto": voto,
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+"""
+Genera i libretti PDF di tutti gli studenti in un unico archivio zip.
+Il rendering usa un pool di processi (default: tutti i core).
+
+Uso:
+    poetry run python -m app.scripts.transcripts
+    poetry run python -m app.scripts.transcripts --output libretti.zip --workers 4
+"""
+
+import argparse
+import asyncio
+import sys
+from datetime import date
+
+from app.core import settings
+from app.core.transcripts import TranscriptStats, default_workers, generate_transcripts_zip
+
+
+def print_progress(stats: TranscriptStats) -> None:
+    """Stampa l'avanzamento sulla stessa riga del terminale."""
+    sys.stdout.write(
+        f"\r  {stats.done}/{stats.total} libretti"
+        f" | errori: {stats.failed}"
+        f" | {stats.docs_per_sec:.1f} doc/s"
+    )
+    sys.stdout.flush()
+
+
+async def run(output: str, workers: int) -> int:
+    print(f"Generazione libretti in '{output}' con {workers} processi...")
+    try:
+        stats = await generate_transcripts_zip(output, workers=workers, on_progress=print_progress)
+    except Exception as e:
+        print(f"\nErrore durante la generazione dei libretti: {e}")
+        return 1
+    print(
+        f"\nCompletato: {stats.done} libretti in {stats.elapsed:.1f}s "
+        f"({stats.docs_per_sec:.1f} doc/s), errori: {stats.failed}"
+    )
+    return 0 if stats.failed == 0 else 1
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Genera i libretti PDF di tutti gli studenti (zip).")
+    parser.add_argument(
+        "--output", "-o",
+        default=f"libretti_{date.today().strftime('%Y%m%d')}.zip",
+        help="Percorso dello zip da creare",
+    )
+    parser.add_argument(
+        "--workers", "-w",
+        type=int,
+        default=settings.TRANSCRIPT_WORKERS or default_workers(),
+        help="Numero di processi per il rendering (default: TRANSCRIPT_WORKERS o metà dei core)",
+    )
+    args = parser.parse_args()
+    return asyncio.run(run(args.output, args.workers))
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
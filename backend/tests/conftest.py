@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+"""
+Fixture comuni dei test: MongoDB in memoria (mongomock-motor) e impostazioni modificabili.
+
+- 'db': sostituisce il client Motor condiviso (app.core.db) con uno in memoria, quindi
+  tutti i moduli che usano get_collection/get_db leggono e scrivono lì
+- 'configure': cambia le impostazioni (dataclass frozen) per il singolo test
+- i test asincroni usano il plugin di anyio (@pytest.mark.anyio) con il solo backend asyncio
+"""
+
+from types import SimpleNamespace
+from typing import Any
+
+import pytest
+from mongomock_motor import AsyncMongoMockClient, AsyncMongoMockCollection
+from pymongo import DeleteOne, InsertOne, ReplaceOne, UpdateMany, UpdateOne
+
+from app.core import db as db_module
+from app.core import settings
+
+
+@pytest.fixture
+def anyio_backend() -> str:
+    return "asyncio"
+
+
+async def _bulk_write(self, requests, ordered: bool = True, **kwargs: Any) -> SimpleNamespace:
+    """
+    bulk_write operazione per operazione: quello di mongomock non accetta le operazioni
+    delle versioni recenti di pymongo (argomento 'sort').
+    """
+    result = SimpleNamespace(inserted_count=0, matched_count=0, modified_count=0, deleted_count=0, upserted_count=0)
+    for op in requests:
+        if isinstance(op, InsertOne):
+            await self.insert_one(op._doc)
+            result.inserted_count += 1
+        elif isinstance(op, DeleteOne):
+            result.deleted_count += (await self.delete_one(op._filter)).deleted_count
+        else:
+            if isinstance(op, UpdateOne):
+                res = await self.update_one(op._filter, op._doc, upsert=op._upsert)
+            elif isinstance(op, UpdateMany):
+                res = await self.update_many(op._filter, op._doc, upsert=op._upsert)
+            elif isinstance(op, ReplaceOne):
+                res = await self.replace_one(op._filter, op._doc, upsert=op._upsert)
+            else:
+                raise NotImplementedError(type(op).__name__)
+            result.matched_count += res.matched_count
+            result.modified_count += res.modified_count
+            result.upserted_count += res.upserted_id is not None
+    return result
+
+
+@pytest.fixture
+def db(monkeypatch):
+    """Database in memoria al posto di MongoDB, vuoto a ogni test."""
+    client = AsyncMongoMockClient()
+    monkeypatch.setattr(db_module, "_client", client)
+    monkeypatch.setattr(AsyncMongoMockCollection, "bulk_write", _bulk_write, raising=False)
+    return client[settings.DB_NAME]
+
+
+@pytest.fixture
+def configure():
+    """Modifica le impostazioni per il test: configure(AUDIT_MAX_BUFFER=2, ...), ripristinate alla fine."""
+    saved: dict[str, Any] = {}
+
+    def apply(**values: Any) -> None:
+        for name, value in values.items():
+            saved.setdefault(name, getattr(settings, name))
+            object.__setattr__(settings, name, value)
+
+    yield apply
+    for name, value in saved.items():
+        object.__setattr__(settings, name, value)
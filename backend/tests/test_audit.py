@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+"""Audit log: group commit, backpressure a buffer pieno e voci delle scritture API."""
+
+from datetime import datetime
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from app.api.routes import router as api_router
+from app.core import audit, exam_archive
+from app.core.audit import COLL, AuditLog, AuditUnavailable, audit_log, set_actor
+
+pytestmark = pytest.mark.anyio
+
+
+class UnavailableCollection:
+    """Collezione che rifiuta ogni scrittura (DB irraggiungibile)."""
+
+    async def insert_many(self, *args, **kwargs):
+        raise ConnectionError("DB irraggiungibile")
+
+
+@pytest.fixture
+def unavailable(monkeypatch):
+    """Scritture dell'audit log non riuscite finché non si chiama la funzione restituita."""
+    original = audit.get_collection
+    monkeypatch.setattr(audit, "get_collection", lambda name: UnavailableCollection())
+    return lambda: monkeypatch.setattr(audit, "get_collection", original)
+
+
+async def test_record_writes_entry_with_actor(db):
+    log = AuditLog()
+    set_actor("mario", "10.0.0.1")
+
+    await log.record("students", "update", "s1", before={"nome": "Ada", "eta": 20}, after={"nome": "Ada", "eta": 21})
+    # Update senza campi cambiati: nessuna voce
+    await log.record("students", "update", "s1", before={"nome": "Ada"}, after={"nome": "Ada"})
+
+    entries = await db[COLL].find({}).to_list(None)
+    assert len(entries) == 1
+    assert entries[0]["actor"] == "mario" and entries[0]["ip"] == "10.0.0.1"
+    assert entries[0]["changes"] == {"eta": {"old": 20, "new": 21}}
+    assert log.metrics()["written"] == 1
+
+
+async def test_full_buffer_rejects_new_writes_but_keeps_entries(db, configure, unavailable):
+    configure(AUDIT_MAX_BUFFER=2)
+    log = AuditLog()
+
+    # record() non solleva: la modifica è già salvata, la voce resta nel buffer
+    for i in range(3):
+        await log.record("exams", "delete", f"e{i}", before={"voto": 18})
+    assert log.metrics()["pending"] == 3 and log.metrics()["failures"] >= 1
+
+    with pytest.raises(AuditUnavailable):
+        await log.ensure_capacity()
+    assert log.metrics()["rejected"] == 1
+
+    # DB di nuovo raggiungibile: il buffer viene scritto per intero
+    unavailable()
+    await log.ensure_capacity()
+    assert await db[COLL].count_documents({}) == 3
+
+
+@pytest.fixture
+async def api(db, monkeypatch):
+    """API con i router reali; audit log del processo senza task (scrittura sincrona)."""
+    monkeypatch.setattr(audit_log, "_buffer", [])
+    monkeypatch.setattr(exam_archive, "_registry", {})
+    monkeypatch.setattr(exam_archive, "_loaded_at", None)
+    student = (await db.students.insert_one({"nome": "Ada", "cognome": "Lovelace"})).inserted_id
+    module = (await db.modules.insert_one({"nome": "Algebra", "codice": "ALG", "ore_totali": 40})).inserted_id
+
+    app = FastAPI()
+    app.include_router(api_router, prefix="/api")
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test", headers={"X-User": "mario"}) as client:
+        yield client, {"student_id": str(student), "module_id": str(module), "data": "2024-03-15", "voto": 24}
+
+
+async def test_exam_writes_are_audited(api, db):
+    client, payload = api
+    created = await client.post("/api/exams", json=payload)
+    assert created.status_code == 200
+    exam_id = created.json()["id"]
+
+    updated = await client.put(f"/api/exams/{exam_id}", json={**payload, "voto": 28})
+    assert updated.status_code == 200 and updated.json()["voto"] == 28
+
+    entries = await db[COLL].find({"entity_id": exam_id}).sort("ts", 1).to_list(None)
+    assert [e["action"] for e in entries] == ["create", "update"]
+    assert all(e["actor"] == "mario" for e in entries)
+    assert entries[1]["changes"] == {"voto": {"old": 24, "new": 28}}
+    assert entries[0]["changes"]["data"]["new"] == datetime(2024, 3, 15)
+
+
+async def test_writes_refused_while_audit_unavailable(api, db, configure, unavailable):
+    client, payload = api
+    configure(AUDIT_MAX_BUFFER=1)
+    await audit_log.record("exams", "delete", "e0", before={"voto": 18})
+
+    response = await client.post("/api/exams", json=payload)
+
+    assert response.status_code == 503 and "retry-after" in response.headers
+    assert await db.exams.count_documents({}) == 0
+    # Le letture non sono bloccate
+    assert (await client.get("/api/exams")).status_code == 200
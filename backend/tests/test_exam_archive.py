@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+"""Archiviazione degli esami per anno accademico e instradamento delle letture."""
+
+from datetime import date, datetime
+
+import pytest
+
+from app.core import exam_archive
+from app.core.exam_archive import (
+    ARCHIVED, DONE, HOT, REGISTRY_COLL, academic_year, archive_collection, archive_year,
+    closed_years, find_exam, is_closed, partitions,
+)
+from app.core.exam_dates import migrate_exam_dates
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture(autouse=True)
+def fresh_registry(monkeypatch):
+    """Registro in memoria vuoto: ogni test lo rilegge dal proprio database."""
+    monkeypatch.setattr(exam_archive, "_registry", {})
+    monkeypatch.setattr(exam_archive, "_loaded_at", None)
+
+
+def test_academic_year_starts_in_september():
+    assert academic_year(date(2020, 9, 1)) == 2020
+    assert academic_year(date(2021, 8, 31)) == 2020
+
+
+async def seed(db):
+    """Due esami nel 2020/21, uno nel 2021/22 e uno nell'anno in corso."""
+    await db[HOT].insert_many([
+        {"data": datetime(2020, 10, 1), "voto": 20},
+        {"data": datetime(2021, 6, 30), "voto": 25},
+        {"data": datetime(2021, 10, 1), "voto": 27},
+        {"data": datetime.combine(date.today(), datetime.min.time()), "voto": 30},
+    ])
+
+
+async def test_refuses_string_dates(db):
+    await db[HOT].insert_many([{"data": "2020-10-01"}, {"data": datetime(2020, 11, 1)}])
+
+    with pytest.raises(ValueError, match="migrazione"):
+        await archive_year(2020, grace_s=0)
+
+    await migrate_exam_dates()
+    state = await archive_year(2020, grace_s=0)
+    assert state["state"] == DONE and state["archived"] == 2
+
+
+async def test_refuses_open_or_out_of_order_years(db):
+    await seed(db)
+    with pytest.raises(ValueError, match="non è ancora chiuso"):
+        await archive_year(academic_year(date.today()), grace_s=0)
+    with pytest.raises(ValueError, match="precedenti"):
+        await archive_year(2021, grace_s=0)
+    assert await db[REGISTRY_COLL].count_documents({}) == 0
+
+
+async def test_moves_year_and_routes_reads(db):
+    await seed(db)
+    assert await closed_years() == [2020, 2021]
+
+    state = await archive_year(2020, batch_size=1, grace_s=0)
+
+    assert state["state"] == DONE and state["copied"] == 2 and state["removed"] == 2
+    assert await db[HOT].count_documents({}) == 2
+    assert await db[archive_collection(2020)].count_documents({}) == 2
+    assert await closed_years() == [2021]
+
+    # Un esame archiviato resta leggibile per _id ed è in sola lettura
+    archived = await db[archive_collection(2020)].find_one({})
+    doc, collection = await find_exam(archived["_id"])
+    assert doc["voto"] == archived["voto"] and collection == archive_collection(2020)
+    assert await is_closed(datetime(2021, 1, 15))
+    assert not await is_closed(datetime(2021, 10, 1))
+
+
+async def test_partitions_include_archives_on_request(db):
+    await seed(db)
+    await archive_year(2020, grace_s=0)
+
+    # Senza date: solo la collezione calda, salvo le letture che chiedono tutto (es. GET /api/exams)
+    assert [p.collection for p in await partitions()] == [HOT]
+    assert [p.collection for p in await partitions(everything=True)] == [HOT, archive_collection(2020)]
+    # Con un intervallo: solo gli anni interessati
+    assert [p.collection for p in await partitions(date(2020, 9, 1), date(2020, 12, 31))] == [archive_collection(2020)]
+    assert [p.collection for p in await partitions(date(2021, 9, 1), None)] == [HOT]
+
+
+async def test_resumes_after_copy(db):
+    await seed(db)
+    # Copia conclusa ma eliminazione interrotta: si riprende dalla collezione calda
+    docs = await db[HOT].find({"data": {"$lt": datetime(2021, 9, 1)}}).to_list(None)
+    await db[archive_collection(2020)].insert_many(docs)
+    await db[REGISTRY_COLL].insert_one({
+        "_id": 2020, "collection": archive_collection(2020), "state": ARCHIVED,
+        "copied": 2, "removed": 0, "archived": 2,
+    })
+
+    state = await archive_year(2020, grace_s=0)
+
+    assert state["state"] == DONE and state["removed"] == 2
+    assert await db[HOT].count_documents({"data": {"$lt": datetime(2021, 9, 1)}}) == 0
+    assert await db[archive_collection(2020)].count_documents({}) == 2
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""Migrazione delle date degli esami da stringa ISO a BSON date."""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.core.exam_dates import (
+    STATE_COLL, STATE_ID, MigrationLocked, dates_migrated, migrate_exam_dates, to_bson_date, to_iso_date,
+)
+
+pytestmark = pytest.mark.anyio
+
+
+def test_to_bson_date_and_back():
+    value = to_bson_date("2024-03-15")
+    assert value == datetime(2024, 3, 15)
+    assert to_iso_date(value) == "2024-03-15"
+    # Valori non convertibili restano invariati
+    assert to_bson_date("non una data") == "non una data"
+
+
+async def test_converts_strings_and_skips_invalid(db):
+    await db.exams.insert_many([
+        {"data": "2024-01-10", "voto": 28},
+        {"data": datetime(2024, 2, 1), "voto": 30},
+        {"data": "31/02/2024", "voto": 18},
+        {"data": "2024-03-05", "voto": 25},
+    ])
+    assert not await dates_migrated()
+
+    state = await migrate_exam_dates(batch_size=2)
+
+    assert state["completed"] and state["converted"] == 2 and state["skipped"] == 1
+    assert sorted([d["data"] async for d in db.exams.find({"data": {"$type": "date"}})]) == [
+        datetime(2024, 1, 10), datetime(2024, 2, 1), datetime(2024, 3, 5),
+    ]
+    assert await db.exams.count_documents({"data": "31/02/2024"}) == 1
+    # Stato salvato, lease rilasciato
+    saved = await db[STATE_COLL].find_one({"_id": STATE_ID})
+    assert saved["completed"] and "lease_owner" not in saved
+    assert await dates_migrated()
+
+
+async def test_completed_migration_is_not_rerun(db):
+    await db.exams.insert_one({"data": "2024-01-10"})
+    await migrate_exam_dates()
+    await db.exams.insert_one({"data": "2024-05-01"})
+
+    assert (await migrate_exam_dates())["converted"] == 1
+    assert await db.exams.count_documents({"data": "2024-05-01"}) == 1
+
+    state = await migrate_exam_dates(restart=True)
+    assert state["converted"] == 1 and state["completed"]
+    assert await db.exams.count_documents({"data": {"$type": "string"}}) == 0
+
+
+async def test_resumes_from_saved_checkpoint(db):
+    first = (await db.exams.insert_one({"data": "2024-01-10"})).inserted_id
+    await db.exams.insert_one({"data": "2024-01-11"})
+    # Interrotta dopo il primo documento, lease scaduto
+    await db[STATE_COLL].insert_one({
+        "_id": STATE_ID, "converted": 1, "skipped": 0, "last_id": first,
+        "lease_owner": "morto", "lease_until": datetime.utcnow() - timedelta(seconds=1),
+    })
+
+    state = await migrate_exam_dates()
+
+    assert state["converted"] == 2
+    # Il documento prima del checkpoint non viene riletto
+    assert (await db.exams.find_one({"_id": first}))["data"] == "2024-01-10"
+
+
+async def test_lease_held_by_another_process(db):
+    await db.exams.insert_one({"data": "2024-01-10"})
+    await db[STATE_COLL].insert_one({
+        "_id": STATE_ID, "lease_owner": "altro", "lease_until": datetime.utcnow() + timedelta(minutes=1),
+    })
+
+    with pytest.raises(MigrationLocked):
+        await migrate_exam_dates()
+    assert await db.exams.count_documents({"data": "2024-01-10"}) == 1
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+"""Middleware Idempotency-Key: replay, conflitti, subentro su segnaposto scaduto."""
+
+import json
+from datetime import datetime, timedelta, timezone
+
+import httpx
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+
+from app.core.idempotency import COLL, IdempotencyMiddleware, fingerprint
+
+pytestmark = pytest.mark.anyio
+
+HEADERS = {"Content-Type": "application/json", "Accept": "application/json"}
+BODY = json.dumps({"nome": "Ada"}).encode()
+
+
+@pytest.fixture
+def calls():
+    return []
+
+
+@pytest.fixture
+async def client(db, calls):
+    app = FastAPI()
+
+    @app.post("/items")
+    async def create(payload: dict):
+        calls.append(payload)
+        if payload.get("fail"):
+            return JSONResponse({"detail": "non disponibile"}, status_code=503)
+        return JSONResponse({"n": len(calls)}, status_code=201)
+
+    transport = httpx.ASGITransport(app=IdempotencyMiddleware(app, ["/items"]))
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        yield client
+
+
+def post(client, key, body=BODY, headers=HEADERS):
+    return client.post("/items", content=body, headers={**headers, "Idempotency-Key": key})
+
+
+async def test_retry_is_replayed(client, calls, db):
+    first = await post(client, "k1")
+    retry = await post(client, "k1")
+
+    assert first.status_code == retry.status_code == 201
+    assert retry.json() == first.json() == {"n": 1}
+    assert retry.headers["idempotency-replayed"] == "true"
+    assert retry.headers["content-type"] == "application/json"
+    assert len(calls) == 1
+    assert (await db[COLL].find_one({}))["status"] == "completed"
+
+
+async def test_without_key_is_not_tracked(client, calls, db):
+    await client.post("/items", content=BODY, headers=HEADERS)
+    await client.post("/items", content=BODY, headers=HEADERS)
+    assert len(calls) == 2
+    assert await db[COLL].count_documents({}) == 0
+
+
+async def test_same_key_different_payload_or_format(client, calls):
+    await post(client, "k1")
+
+    assert (await post(client, "k1", body=json.dumps({"nome": "Bob"}).encode())).status_code == 422
+    assert (await post(client, "k1", headers={**HEADERS, "Accept": "application/msgpack"})).status_code == 422
+    assert len(calls) == 1
+
+
+async def test_original_still_running(client, calls, db):
+    now = datetime.now(timezone.utc)
+    await db[COLL].insert_one({
+        "_id": "POST /items k1", "status": "processing", "owner": "altro",
+        "fingerprint": fingerprint({b"content-type": b"application/json", b"accept": b"application/json"}, BODY),
+        "created_at": now, "lease_until": now + timedelta(seconds=60),
+    })
+
+    response = await post(client, "k1")
+
+    assert response.status_code == 409 and response.headers["retry-after"] == "1"
+    assert calls == []
+
+
+async def test_expired_placeholder_is_taken_over(client, calls, db):
+    past = datetime.now(timezone.utc) - timedelta(seconds=120)
+    await db[COLL].insert_one({
+        "_id": "POST /items k1", "status": "processing", "owner": "morto",
+        "fingerprint": fingerprint({b"content-type": b"application/json", b"accept": b"application/json"}, BODY),
+        "created_at": past, "lease_until": past + timedelta(seconds=60),
+    })
+
+    response = await post(client, "k1")
+
+    assert response.status_code == 201 and len(calls) == 1
+    doc = await db[COLL].find_one({"_id": "POST /items k1"})
+    assert doc["status"] == "completed" and doc["owner"] != "morto"
+
+
+async def test_server_errors_are_not_stored(client, calls, db):
+    body = json.dumps({"fail": True}).encode()
+    assert (await post(client, "k1", body=body)).status_code == 503
+    assert await db[COLL].count_documents({}) == 0
+    assert (await post(client, "k1", body=body)).status_code == 503
+    assert len(calls) == 2
+
+
+async def test_body_too_large(client, calls, configure):
+    configure(IDEMPOTENCY_MAX_BODY_BYTES=8)
+    assert (await post(client, "k1")).status_code == 413
+    assert calls == []
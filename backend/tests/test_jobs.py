@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+"""Coda dei job: validazione dei parametri, tipi esclusivi, esecuzione, retry e recupero dei lease."""
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.core import jobs, maintenance  # noqa: F401 (registra i job di manutenzione)
+from app.core.audit import COLL as AUDIT_COLL
+from app.core.jobs import (
+    CANCELLED, COLL, FAILED, QUEUED, RUNNING, SUCCEEDED, JobConflict, JobQueue, job, recover_expired,
+)
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def queue(db, monkeypatch):
+    """Coda con i tipi registrati più quelli di prova (solo per il test)."""
+    monkeypatch.setattr(jobs, "_kinds", dict(jobs._kinds))
+
+    @job("test.sum", "Somma di prova")
+    async def add(ctx, a: int, b: int = 1):
+        ctx.update(step="sum")
+        return {"sum": a + b}
+
+    @job("test.fail", "Fallisce sempre", max_attempts=2)
+    async def fail(ctx):
+        raise RuntimeError("errore di prova")
+
+    @job("test.exclusive", "Uno alla volta", exclusive=True)
+    async def exclusive(ctx):
+        return None
+
+    await jobs.ensure_indexes()
+    return JobQueue()
+
+
+async def run_next(queue: JobQueue) -> dict:
+    """Prende ed esegue il prossimo job in coda; restituisce il documento finale."""
+    doc = await queue._claim()
+    assert doc is not None, "nessun job in coda"
+    await queue._execute(doc)
+    return await jobs.get_collection(COLL).find_one({"_id": doc["_id"]})
+
+
+async def test_params_are_validated(queue):
+    with pytest.raises(ValueError, match="sconosciuto"):
+        await queue.submit("test.nope")
+    with pytest.raises(ValueError, match="a: "):
+        await queue.submit("test.sum", {"b": 2})
+    with pytest.raises(ValueError, match="c: "):
+        await queue.submit("test.sum", {"a": 1, "c": 3})
+
+    doc = await queue.submit("test.sum", {"a": "2"})
+    assert doc["params"] == {"a": 2, "b": 1} and doc["status"] == QUEUED
+
+
+async def test_successful_run(queue):
+    submitted = await queue.submit("test.sum", {"a": 2, "b": 3})
+
+    done = await run_next(queue)
+
+    assert done["_id"] == submitted["_id"]
+    assert done["status"] == SUCCEEDED and done["result"] == {"sum": 5}
+    assert done["progress"] == {"step": "sum"} and done["attempts"] == 1
+    assert "lease_until" not in done and done["finished_at"]
+    assert await queue._claim() is None
+
+
+async def test_failed_job_is_retried_then_failed(queue, configure):
+    configure(JOBS_RETRY_BACKOFF_S=0)
+    await queue.submit("test.fail")
+
+    first = await run_next(queue)
+    assert first["status"] == QUEUED and first["error"] == "errore di prova" and first["attempts"] == 1
+
+    second = await run_next(queue)
+    assert second["status"] == FAILED and second["attempts"] == 2 and second["finished_at"]
+
+
+async def test_exclusive_kind_allows_one_active_job(queue):
+    first = await queue.submit("test.exclusive")
+    with pytest.raises(JobConflict):
+        await queue.submit("test.exclusive")
+
+    cancelled = await queue.cancel(first["_id"])
+    assert cancelled["status"] == CANCELLED and "active" not in cancelled
+
+    await queue.submit("test.exclusive")
+    assert (await run_next(queue))["status"] == SUCCEEDED
+    await queue.submit("test.exclusive")
+
+
+async def test_expired_lease_is_recovered(queue, db):
+    expired = datetime.now(timezone.utc) - timedelta(seconds=1)
+    base = {"kind": "test.exclusive", "params": {}, "status": RUNNING, "max_attempts": 2, "lease_until": expired}
+    retry = (await db[COLL].insert_one({**base, "attempts": 1})).inserted_id
+    last = (await db[COLL].insert_one({**base, "attempts": 2, "active": "test.exclusive"})).inserted_id
+    alive = (await db[COLL].insert_one({**base, "attempts": 1, "lease_until": expired + timedelta(minutes=5)})).inserted_id
+
+    assert await recover_expired() == 2
+
+    assert (await db[COLL].find_one({"_id": retry}))["status"] == QUEUED
+    failed = await db[COLL].find_one({"_id": last})
+    assert failed["status"] == FAILED and "active" not in failed
+    assert (await db[COLL].find_one({"_id": alive}))["status"] == RUNNING
+
+
+async def test_cleanup_orphans_job(queue, db):
+    student = (await db.students.insert_one({"nome": "Ada"})).inserted_id
+    module = (await db.modules.insert_one({"nome": "Algebra"})).inserted_id
+    ghost = (await db.students.insert_one({"nome": "Rimosso"})).inserted_id
+    await db.students.delete_one({"_id": ghost})
+    await db.exams.insert_many([
+        {"student_id": student, "module_id": module, "voto": 28},
+        {"student_id": ghost, "module_id": module, "voto": 18},
+    ])
+    await db.enrollments.insert_many([
+        {"student_id": student, "module_id": module},
+        {"student_id": ghost, "module_id": module},
+    ])
+
+    await queue.submit("cleanup.orphans", {"dry_run": True})
+    dry = await run_next(queue)
+    assert dry["result"]["exams"] == 1 and await db.exams.count_documents({}) == 2
+
+    await queue.submit("cleanup.orphans")
+    done = await run_next(queue)
+
+    assert done["status"] == SUCCEEDED
+    assert done["result"]["exams"] == 1 and done["result"]["enrollments"] == 1
+    assert [d["student_id"] async for d in db.exams.find({})] == [student]
+    assert await db.enrollments.count_documents({"student_id": ghost}) == 0
+    assert await db[AUDIT_COLL].count_documents({"actor": "job:cleanup.orphans", "action": "delete"}) == 1
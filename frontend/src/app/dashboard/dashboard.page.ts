@@ -104,11 +104,11 @@ export class DashboardPage implements OnInit {
   constructor(private api: ApiService) {}
 
   ngOnInit(): void {
-    // Carico in parallelo moduli, studenti, esami
+    // Carico in parallelo moduli, studenti, esami (solo i campi usati per i conteggi)
     forkJoin({
-      modules: this.api.listModules(),
-      students: this.api.listStudents(),
-      exams: this.api.listExams()
+      modules: this.api.listModules(['id']),
+      students: this.api.listStudents(['id']),
+      exams: this.api.listExams(['voto'])
     }).subscribe(({ modules, students, exams }) => {
       this.counts.modules = modules?.length || 0;
       this.counts.students = students?.length || 0;
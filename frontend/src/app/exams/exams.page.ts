@@ -1,4 +1,4 @@
-import { Component, OnInit } from '@angular/core';
+import { Component, OnDestroy, OnInit } from '@angular/core';
 import { CommonModule } from '@angular/common';
 import { Router, RouterLink } from '@angular/router';
 import { FormsModule } from '@angular/forms';
@@ -10,7 +10,9 @@ import { MatSnackBar, MatSnackBarModule } from '@angular/material/snack-bar';
 import { MatDialog, MatDialogModule } from '@angular/material/dialog';
 import { MatFormFieldModule } from '@angular/material/form-field';
 import { MatInputModule } from '@angular/material/input';
-import { ApiService } from '../shared/api.service';
+import { Subscription } from 'rxjs';
+import { ApiService, ExamDto } from '../shared/api.service';
+import { ChangeEvent, EventsService } from '../shared/events.service';
 import { ConfirmDialogComponent } from '../shared/confirm-dialog.component';
 
 @Component({
@@ -157,7 +159,7 @@ import { ConfirmDialogComponent } from '../shared/confirm-dialog.component';
     .badge-default { background:#e0e0e0; color:#333; }
   `]
 })
-export class ExamsPage implements OnInit {
+export class ExamsPage implements OnInit, OnDestroy {
   exams: any[] = [];
   filteredExams: any[] = [];
   students: any[] = [];
@@ -171,17 +173,50 @@ export class ExamsPage implements OnInit {
 
   cols = ['data','studente','modulo','voto','note','azioni'];
 
+  private subs: Subscription[] = [];
+
+  // Stesso ordinamento del backend: data decrescente
+  private readonly byDateDesc = (a: ExamDto, b: ExamDto) => (b.data || '').localeCompare(a.data || '');
+
   constructor(
     private api: ApiService,
+    private events: EventsService,
     private snack: MatSnackBar,
     private dialog: MatDialog,
     private router: Router
   ) {}
 
   ngOnInit(): void {
-    this.api.listExams().subscribe({ next: res => { this.exams = res || []; this.applyFilters(); } });
+    this.loadExams();
     this.api.listStudents().subscribe({ next: s => this.students = s || [] });
     this.api.listModules().subscribe({ next: m => this.modules = m || [] });
+
+    // Aggiornamenti live: patch degli elenchi locali invece di ricaricarli
+    this.subs.push(
+      this.events.changes<ExamDto>('exams').subscribe(ev => this.onExamChange(ev)),
+      this.events.changes('students').subscribe(ev => {
+        if (ev.action === 'resync') { this.api.listStudents().subscribe({ next: s => this.students = s || [] }); return; }
+        this.students = this.events.applyChange(this.students, ev);
+      })
+    );
+  }
+
+  ngOnDestroy(): void {
+    this.subs.forEach(s => s.unsubscribe());
+  }
+
+  loadExams(): void {
+    this.api.listExams().subscribe({ next: res => { this.exams = res || []; this.applyFilters(); } });
+  }
+
+  private onExamChange(ev: ChangeEvent<ExamDto>): void {
+    if (ev.action === 'resync') { this.loadExams(); return; }
+    if (ev.action === 'updated' && !ev.data && ev.id) {
+      this.api.getExam(ev.id).subscribe({ next: e => this.onExamChange({ ...ev, data: e }) });
+      return;
+    }
+    this.exams = this.events.applyChange(this.exams, ev, this.byDateDesc);
+    this.applyFilters();
   }
 
   studentName(studentId: string): string {
@@ -232,7 +267,8 @@ export class ExamsPage implements OnInit {
       this.api.deleteExam(e.id).subscribe({
         next: () => {
           this.snack.open('Esame eliminato', 'OK', { duration: 2000 });
-          this.api.listExams().subscribe({ next: res => { this.exams = res || []; this.applyFilters(); } });
+          this.exams = this.exams.filter(x => x.id !== e.id);
+          this.applyFilters();
         },
         error: err => this.snack.open(err?.error?.detail || 'Errore eliminazione', 'Chiudi', { duration: 3000 })
       });
@@ -1,4 +1,4 @@
-import { Component, OnInit } from '@angular/core';
+import { Component, OnDestroy, OnInit } from '@angular/core';
 import { CommonModule } from '@angular/common';
 import { RouterLink } from '@angular/router';
 import { FormsModule } from '@angular/forms';
@@ -8,7 +8,9 @@ import { MatDividerModule } from '@angular/material/divider';
 import { MatSnackBar, MatSnackBarModule } from '@angular/material/snack-bar';
 import { MatDialog, MatDialogModule } from '@angular/material/dialog';
 import { MatMenuModule } from '@angular/material/menu';
-import { ApiService } from '../shared/api.service';
+import { Subscription } from 'rxjs';
+import { ApiService, ModuleDto } from '../shared/api.service';
+import { ChangeEvent, EventsService } from '../shared/events.service';
 import { ConfirmDialogComponent } from '../shared/confirm-dialog.component';
 
 @Component({
@@ -124,7 +126,7 @@ import { ConfirmDialogComponent } from '../shared/confirm-dialog.component';
     .alert { padding: 12px; background: #e3f2fd; border: 1px solid #bbdefb; border-radius: 6px; }
   `]
 })
-export class ModulesPage implements OnInit {
+export class ModulesPage implements OnInit, OnDestroy {
   modules: any[] = [];
   filtered: any[] = [];
   studentsMap: Record<string, any> = {};
@@ -132,14 +134,46 @@ export class ModulesPage implements OnInit {
   q = '';
   cols = ['codice', 'nome', 'ore', 'studenti', 'azioni'];
 
+  private subs: Subscription[] = [];
+
+  // Stesso ordinamento del backend: nome crescente
+  private readonly byName = (a: ModuleDto, b: ModuleDto) => (a.nome || '').localeCompare(b.nome || '');
+
   constructor(
     private api: ApiService,
+    private events: EventsService,
     private snack: MatSnackBar,
     private dialog: MatDialog
   ) {}
 
   ngOnInit(): void {
     this.load();
+
+    // Aggiornamenti live: patch degli elenchi locali invece di ricaricarli
+    this.subs.push(
+      this.events.changes<ModuleDto>('modules').subscribe(ev => this.onModuleChange(ev)),
+      this.events.changes('students').subscribe(ev => {
+        if (ev.action === 'deleted' && ev.id) { delete this.studentsMap[ev.id]; }
+        else if (ev.data) { this.studentsMap[ev.data.id] = ev.data; }
+      })
+    );
+  }
+
+  ngOnDestroy(): void {
+    this.subs.forEach(s => s.unsubscribe());
+  }
+
+  private onModuleChange(ev: ChangeEvent<ModuleDto>): void {
+    if (ev.action === 'resync') {
+      this.api.listModules().subscribe({ next: res => { this.modules = res || []; this.applySearch(); } });
+      return;
+    }
+    if (ev.action === 'updated' && !ev.data && ev.id) {
+      this.api.getModule(ev.id).subscribe({ next: m => this.onModuleChange({ ...ev, data: m }) });
+      return;
+    }
+    this.modules = this.events.applyChange(this.modules, ev, this.byName);
+    this.applySearch();
   }
 
   load(): void {
@@ -179,7 +213,11 @@ export class ModulesPage implements OnInit {
     ref.afterClosed().subscribe(ok => {
       if (!ok) return;
       this.api.deleteModule(m.id).subscribe({
-        next: () => { this.snack.open('Modulo eliminato', 'OK', { duration: 2000 }); this.load(); },
+        next: () => {
+          this.snack.open('Modulo eliminato', 'OK', { duration: 2000 });
+          this.modules = this.modules.filter(x => x.id !== m.id);
+          this.applySearch();
+        },
         error: err => this.snack.open(err?.error?.detail || 'Errore eliminazione', 'Chiudi', { duration: 3000 })
       });
     });
@@ -1,11 +1,12 @@
 import { HttpInterceptorFn } from '@angular/common/http';
+import { environment } from '../../environments/environment';
 
 /**
  * Interceptor che premette il base URL del backend alle chiamate che iniziano con /api/.
- * Nota: per ambienti diversi, preferisci leggere il base URL da environment.
+ * Il base URL viene da environment (vuoto in produzione: stessa origine del bundle).
  */
 export const apiInterceptor: HttpInterceptorFn = (req, next) => {
-  const apiBase = 'http://localhost:8000';
+  const apiBase = environment.apiBase;
   const isApi = req.url.startsWith('/api/');
   const cloned = isApi ? req.clone({ url: `${apiBase}${req.url}` }) : req;
   return next(cloned);
@@ -1,6 +1,6 @@
 import { Injectable } from '@angular/core';
-import { HttpClient } from '@angular/common/http';
-import { Observable, map } from 'rxjs';
+import { HttpClient, HttpHeaders } from '@angular/common/http';
+import { Observable, map, retry, throwError, timer } from 'rxjs';
 
 // Modelli opzionali per tipizzare meglio (nessun impatto UI)
 export interface ModuleSnapshot {
@@ -38,15 +38,30 @@ export interface ExamDto {
 export class ApiService {
   constructor(private http: HttpClient) {}
 
+  // POST di creazione idempotente: una chiave per operazione, riusata nei retry di rete.
+  // Il backend ripete la risposta originale se il primo tentativo era già andato a buon fine.
+  private createWithRetry<T>(url: string, body: any): Observable<T> {
+    const headers = new HttpHeaders({ 'Idempotency-Key': crypto.randomUUID() });
+    return this.http.post<T>(url, body, { headers }).pipe(
+      // Ritenta solo errori di rete (status 0) e 5xx; i 4xx sono risposte definitive
+      retry({ count: 2, delay: (err) => (err?.status === 0 || err?.status >= 500) ? timer(500) : throwError(() => err) })
+    );
+  }
+
+  // Proiezione opzionale: il backend restituisce solo i campi indicati (più 'id')
+  private fieldsParams(fields?: string[]): { params?: { fields: string } } {
+    return fields?.length ? { params: { fields: fields.join(',') } } : {};
+  }
+
   // Moduli
-  listModules(): Observable<ModuleDto[]> {
-    return this.http.get<ModuleDto[]>('/api/modules');
+  listModules(fields?: string[]): Observable<ModuleDto[]> {
+    return this.http.get<ModuleDto[]>('/api/modules', this.fieldsParams(fields));
   }
   getModule(id: string): Observable<ModuleDto> {
     return this.http.get<ModuleDto>(`/api/modules/${id}`);
   }
   createModule(data: Partial<ModuleDto>): Observable<ModuleDto> {
-    return this.http.post<ModuleDto>('/api/modules', data);
+    return this.createWithRetry<ModuleDto>('/api/modules', data);
   }
   updateModule(id: string, data: Partial<ModuleDto>): Observable<ModuleDto> {
     return this.http.put<ModuleDto>(`/api/modules/${id}`, data);
@@ -56,14 +71,14 @@ export class ApiService {
   }
 
   // Studenti
-  listStudents(): Observable<StudentDto[]> {
-    return this.http.get<StudentDto[]>('/api/students');
+  listStudents(fields?: string[]): Observable<StudentDto[]> {
+    return this.http.get<StudentDto[]>('/api/students', this.fieldsParams(fields));
   }
   getStudent(id: string): Observable<StudentDto> {
     return this.http.get<StudentDto>(`/api/students/${id}`);
   }
   createStudent(data: Partial<StudentDto>): Observable<StudentDto> {
-    return this.http.post<StudentDto>('/api/students', data);
+    return this.createWithRetry<StudentDto>('/api/students', data);
   }
   updateStudent(id: string, data: Partial<StudentDto>): Observable<StudentDto> {
     return this.http.put<StudentDto>(`/api/students/${id}`, data);
@@ -91,8 +106,8 @@ export class ApiService {
   }
 
   // Esami
-  listExams(): Observable<ExamDto[]> {
-    return this.http.get<ExamDto[]>('/api/exams');
+  listExams(fields?: string[]): Observable<ExamDto[]> {
+    return this.http.get<ExamDto[]>('/api/exams', this.fieldsParams(fields));
   }
   getExam(id: string): Observable<ExamDto> {
     return this.http.get<ExamDto>(`/api/exams/${id}`);
@@ -114,7 +129,7 @@ export class ApiService {
   }
 
   createExam(data: any): Observable<ExamDto> {
-    return this.http.post<ExamDto>('/api/exams', this.normalizeExamPayload(data));
+    return this.createWithRetry<ExamDto>('/api/exams', this.normalizeExamPayload(data));
   }
   updateExam(id: string, data: any): Observable<ExamDto> {
     return this.http.put<ExamDto>(`/api/exams/${id}`, this.normalizeExamPayload(data));
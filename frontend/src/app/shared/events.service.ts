@@ -0,0 +1,79 @@
+import { Injectable, NgZone, OnDestroy } from '@angular/core';
+import { Observable, Subject, filter, share } from 'rxjs';
+import { environment } from '../../environments/environment';
+
+// Evento del feed modifiche (vedi backend app/core/events.py)
+export interface ChangeEvent<T = any> {
+  collection: 'modules' | 'students' | 'exams';
+  action: 'created' | 'updated' | 'deleted' | 'resync';
+  id: string | null;
+  data: T | null;
+  seq: number;
+  ts: number;
+}
+
+/**
+ * Client del feed SSE /api/events.
+ * Una sola connessione EventSource condivisa da tutte le pagine, aperta al primo
+ * abbonamento e chiusa quando non ci sono più abbonati.
+ * Nota: EventSource non passa dall'HttpClient, quindi il base URL (da environment,
+ * come in api.interceptor.ts) è aggiunto qui.
+ */
+@Injectable({ providedIn: 'root' })
+export class EventsService implements OnDestroy {
+  private readonly url = `${environment.apiBase}/api/events`;
+  private readonly resync$ = new Subject<void>();
+
+  private readonly events$: Observable<ChangeEvent> = new Observable<ChangeEvent>(subscriber => {
+    const source = new EventSource(this.url);
+    let connectedOnce = false;
+    source.onopen = () => {
+      // Dopo una riconnessione gli eventi persi non vengono ripetuti: forza una ricarica
+      if (connectedOnce) this.zone.run(() => this.resync$.next());
+      connectedOnce = true;
+    };
+    source.addEventListener('change', (msg: MessageEvent) => {
+      this.zone.run(() => subscriber.next(JSON.parse(msg.data)));
+    });
+    return () => source.close();
+  }).pipe(share());
+
+  constructor(private zone: NgZone) {}
+
+  /** Eventi di una collezione (più un 'resync' sintetico dopo ogni riconnessione). */
+  changes<T = any>(collection: ChangeEvent['collection']): Observable<ChangeEvent<T>> {
+    return new Observable<ChangeEvent<T>>(subscriber => {
+      const subs = [
+        this.events$.pipe(filter(e => e.collection === collection)).subscribe(subscriber),
+        this.resync$.subscribe(() => subscriber.next({
+          collection, action: 'resync', id: null, data: null, seq: 0, ts: Date.now() / 1000
+        })),
+      ];
+      return () => subs.forEach(s => s.unsubscribe());
+    });
+  }
+
+  /**
+   * Applica un evento a un elenco locale e restituisce il nuovo array.
+   * - created/updated con dati: inserisce o sostituisce l'elemento
+   * - deleted: rimuove l'elemento
+   * - updated senza dati / resync: l'elenco resta invariato (la pagina decide se ricaricare)
+   * 'compare' (facoltativo) mantiene l'ordinamento della lista.
+   */
+  applyChange<T extends { id: string }>(list: T[], ev: ChangeEvent<T>, compare?: (a: T, b: T) => number): T[] {
+    if (ev.action === 'deleted') {
+      return list.filter(x => x.id !== ev.id);
+    }
+    if ((ev.action === 'created' || ev.action === 'updated') && ev.data) {
+      const item = ev.data;
+      const exists = list.some(x => x.id === item.id);
+      const next = exists ? list.map(x => (x.id === item.id ? item : x)) : [...list, item];
+      return compare ? next.sort(compare) : next;
+    }
+    return list;
+  }
+
+  ngOnDestroy(): void {
+    this.resync$.complete();
+  }
+}
@@ -1,4 +1,4 @@
-import { Component, OnInit } from '@angular/core';
+import { Component, OnDestroy, OnInit } from '@angular/core';
 import { CommonModule } from '@angular/common';
 import { RouterLink } from '@angular/router';
 import { FormsModule } from '@angular/forms';
@@ -7,7 +7,9 @@ import { MatButtonModule } from '@angular/material/button';
 import { MatDividerModule } from '@angular/material/divider';
 import { MatSnackBar, MatSnackBarModule } from '@angular/material/snack-bar';
 import { MatDialog, MatDialogModule } from '@angular/material/dialog';
-import { ApiService } from '../shared/api.service';
+import { Subscription } from 'rxjs';
+import { ApiService, StudentDto } from '../shared/api.service';
+import { ChangeEvent, EventsService } from '../shared/events.service';
 import { ConfirmDialogComponent } from '../shared/confirm-dialog.component';
 
 @Component({
@@ -92,20 +94,42 @@ import { ConfirmDialogComponent } from '../shared/confirm-dialog.component';
     .alert { padding: 12px; background: #e3f2fd; border: 1px solid #bbdefb; border-radius: 6px; }
   `]
 })
-export class StudentsPage implements OnInit {
+export class StudentsPage implements OnInit, OnDestroy {
   students: any[] = [];
   filtered: any[] = [];
   q = '';
   cols = ['nome','cognome','email','moduli','azioni'];
 
+  private sub?: Subscription;
+
+  // Stesso ordinamento del backend: cognome crescente
+  private readonly bySurname = (a: StudentDto, b: StudentDto) => (a.cognome || '').localeCompare(b.cognome || '');
+
   constructor(
     private api: ApiService,
+    private events: EventsService,
     private snack: MatSnackBar,
     private dialog: MatDialog
   ) {}
 
   ngOnInit(): void {
     this.load();
+    // Aggiornamenti live: patch dell'elenco locale invece di ricaricarlo
+    this.sub = this.events.changes<StudentDto>('students').subscribe(ev => this.onStudentChange(ev));
+  }
+
+  ngOnDestroy(): void {
+    this.sub?.unsubscribe();
+  }
+
+  private onStudentChange(ev: ChangeEvent<StudentDto>): void {
+    if (ev.action === 'resync') { this.load(); return; }
+    if (ev.action === 'updated' && !ev.data && ev.id) {
+      this.api.getStudent(ev.id).subscribe({ next: s => this.onStudentChange({ ...ev, data: s }) });
+      return;
+    }
+    this.students = this.events.applyChange(this.students, ev, this.bySurname);
+    this.applySearch();
   }
 
   load(): void {
@@ -138,7 +162,11 @@ export class StudentsPage implements OnInit {
     ref.afterClosed().subscribe(ok => {
       if (!ok) return;
       this.api.deleteStudent(s.id).subscribe({
-        next: () => { this.snack.open('Studente eliminato', 'OK', { duration: 2000 }); this.load(); },
+        next: () => {
+          this.snack.open('Studente eliminato', 'OK', { duration: 2000 });
+          this.students = this.students.filter(x => x.id !== s.id);
+          this.applySearch();
+        },
         error: err => this.snack.open(err?.error?.detail || 'Errore eliminazione', 'Chiudi', { duration: 3000 })
       });
     });
@@ -0,0 +1,8 @@
+/**
+ * Configurazione di produzione: il bundle è servito dal backend (python run.py --prod),
+ * quindi le chiamate /api restano sulla stessa origine.
+ */
+export const environment = {
+  production: true,
+  apiBase: '',
+};
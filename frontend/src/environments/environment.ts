@@ -0,0 +1,8 @@
+/**
+ * Configurazione di sviluppo: backend Uvicorn separato da `ng serve`.
+ * In build di produzione il file è sostituito da environment.production.ts (angular.json).
+ */
+export const environment = {
+  production: false,
+  apiBase: 'http://localhost:8000',
+};
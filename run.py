@@ -6,30 +6,72 @@ Orchestratore per il progetto Gestione Corsi ITS.
 
 Cosa fa:
 1) Verifica strumenti (Poetry, Node/npm)
-2) Prepara backend (poetry install, check DB)
-3) Crea collezioni e indici essenziali in MongoDB (idempotente)
-4) Chiede se resettare/generare dati Faker (seeder completo)
-5) Avvia backend (FastAPI/Uvicorn) e frontend (Angular) con terminazione pulita
+2) Prepara in parallelo backend (poetry install, check DB, collezioni e indici in MongoDB)
+   e frontend (npm install, ng analytics disable)
+3) Chiede se resettare/generare dati Faker (seeder completo)
+4) Avvia backend (FastAPI/Uvicorn) e frontend (Angular) con terminazione pulita
+
+Profilo produzione (--prod):
+- build di produzione del frontend (saltata se sorgenti e configurazione non sono cambiati),
+  servita dal backend come file statici (FRONTEND_DIST): un solo processo da esporre
+- Uvicorn senza reload, un worker per core (--workers / WEB_CONCURRENCY), uvloop + httptools,
+  keep-alive e backlog configurabili, niente access log (--access-log per attivarlo)
+- nessun seeder interattivo
+- SIGHUP a run.py → riavvio graduale dei worker (Uvicorn >= 0.54 sostituisce un worker alla
+  volta: avvia il nuovo, attende che abbia completato lo startup entro --worker-timeout e solo
+  allora ferma il vecchio; se il nuovo non è pronto il riavvio si interrompe)
+- con più worker il feed modifiche (SSE) usa il change stream (EVENTS_SOURCE=changestream) se
+  MongoDB è un replica set; altrimenti avviso: ogni worker vede solo le proprie scritture
+
+Installazioni saltate se non è cambiato nulla:
+- impronta SHA-256 di pyproject.toml/poetry.lock e package.json/package-lock.json
+  (più il percorso di poetry/npm), salvata in .run-cache/ dopo un'installazione riuscita
+- si reinstalla se l'impronta cambia o se manca l'ambiente installato (virtualenv, node_modules)
+- --reinstall forza comunque le installazioni
+Al termine della preparazione stampa i tempi di ogni fase.
+
+Log dei processi figli (LogMux):
+- un solo thread legge tutte le pipe in modo non bloccante (selectors; su Windows, dove le
+  pipe non sono selezionabili, un thread di sola lettura per pipe alimenta la stessa coda)
+- ogni riga è prefissata con orario e nome del processo; le righe sono scritte a blocchi
+  (al più ogni 50 ms o 64 KB) con una sola write
+- ultime --log-tail righe per processo in memoria: se un processo termina con errore
+  vengono salvate in .run-cache/crash-<nome>-<data>.log e mostrate
+- --log-rate N: al massimo N righe al secondo per processo sul terminale; le eccedenti sono
+  contate e scartate dal terminale (restano nel buffer), le pipe vengono comunque svuotate
+  così i processi figli non si bloccano mai in scrittura
 """
 
+import argparse
+import hashlib
+import json
 import os
+import queue
+import selectors
 import sys
 import time
 import signal
 import platform
 import subprocess
 import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from pathlib import Path
+from typing import Optional
 
 # --- Config path ---
 ROOT = Path(__file__).parent.resolve()
 BACKEND_DIR = ROOT / "backend"
 FRONTEND_DIR = ROOT / "frontend"
+STATE_DIR = ROOT / ".run-cache"  # impronte delle installazioni riuscite
+FRONTEND_DIST = FRONTEND_DIR / "dist" / "gestione-corsi-its-frontend" / "browser"  # build di produzione
 
 IS_WINDOWS = os.name == "nt" or platform.system().lower().startswith("win")
 
-# Coordinazione shutdown
+# Coordinazione shutdown e riavvio dei worker (profilo produzione)
 _shutdown = threading.Event()
+_reload = threading.Event()
 
 
 def _signal_handler(signum, frame):
@@ -37,6 +79,10 @@ def _signal_handler(signum, frame):
     _shutdown.set()
 
 
+def _reload_handler(signum, frame):
+    _reload.set()
+
+
 # Registra handler per SIGINT/SIGTERM
 try:
     signal.signal(signal.SIGINT, _signal_handler)
@@ -46,6 +92,8 @@ try:
     signal.signal(signal.SIGTERM, _signal_handler)
 except Exception:
     pass
+if hasattr(signal, "SIGHUP"):
+    signal.signal(signal.SIGHUP, _reload_handler)
 
 
 # --- DB helpers (fix import path) ---
@@ -67,7 +115,7 @@ def connect_db():
         db = client[settings.DB_NAME]
         return db
     except Exception as e:
-        print(f"Avviso: impossibile connettersi a MongoDB ora ({e}). Proseguo senza operazioni DB.")
+        log(f"Avviso: impossibile connettersi a MongoDB ora ({e}). Proseguo senza operazioni DB.")
         return None
 
 
@@ -89,22 +137,22 @@ def create_collections_if_missing(db):
     try:
         required_collections = ["modules", "students", "exams"]
         existing = db.list_collection_names()
-        print("\nVerifica/creazione collezioni...")
+        log("\nVerifica/creazione collezioni...")
         for name in required_collections:
             if name not in existing:
                 db.create_collection(name)
-                print(f"  ✓ Creata collezione: {name}")
+                log(f"  ✓ Creata collezione: {name}")
             else:
-                print(f"  • Collezione già presente: {name}")
+                log(f"  • Collezione già presente: {name}")
     except Exception as e:
-        print(f"Avviso: errore nella creazione collezioni: {e}")
+        log(f"Avviso: errore nella creazione collezioni: {e}")
 
 
 def create_indexes(db):
     if db is None:
         return
     try:
-        print("\nCreazione indici (se non esistono già)...")
+        log("\nCreazione indici (se non esistono già)...")
         # Moduli: codice univoco (campo 'codice')
         db.modules.create_index("codice", unique=True, name="unique_module_code")
 
@@ -120,9 +168,9 @@ def create_indexes(db):
             unique=True,
             name="unique_exam_session",
         )
-        print("  ✓ Indici creati / già presenti")
+        log("  ✓ Indici creati / già presenti")
     except Exception as e:
-        print(f"Avviso: errore nella creazione indici: {e}")
+        log(f"Avviso: errore nella creazione indici: {e}")
 
 
 def ask_yes_no(prompt: str, default: bool | None = None) -> bool:
@@ -145,8 +193,83 @@ def ask_yes_no(prompt: str, default: bool | None = None) -> bool:
 
 
 # --- Orchestrator helpers ---
+_log_lock = threading.Lock()
+
+
 def log(msg: str):
-    print(msg, flush=True)
+    # Preparazione backend e frontend in parallelo: una riga alla volta
+    with _log_lock:
+        print(msg, flush=True)
+
+
+# --- Tempi delle fasi ---
+_timings: list[tuple[str, float]] = []
+
+
+@contextmanager
+def phase(name: str):
+    """Misura la durata di una fase di preparazione (riepilogo con print_timings)."""
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - t0
+        with _log_lock:
+            _timings.append((name, elapsed))
+        log(f"  ⏱ {name}: {elapsed:.1f} s")
+
+
+def print_timings(total: float):
+    log("\nTempi di preparazione:")
+    for name, elapsed in _timings:
+        log(f"  {name:<32} {elapsed:6.1f} s")
+    log(f"  {'totale (in parallelo)':<32} {total:6.1f} s\n")
+
+
+# --- Impronte delle installazioni ---
+def fingerprint(files, extra=()) -> str:
+    """SHA-256 del contenuto dei file (mancante = marcatore) e dei valori aggiuntivi."""
+    h = hashlib.sha256()
+    for f in files:
+        h.update(f.relative_to(ROOT).as_posix().encode())
+        h.update(f.read_bytes() if f.exists() else b"<assente>")
+    for value in extra:
+        h.update(str(value).encode())
+    return h.hexdigest()
+
+
+def is_up_to_date(name: str, digest: str) -> bool:
+    """True se l'ultima installazione riuscita ha la stessa impronta e il suo ambiente esiste ancora."""
+    try:
+        state = json.loads((STATE_DIR / f"{name}.json").read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return False
+    return state.get("fingerprint") == digest and Path(state.get("target", "")).exists()
+
+
+def mark_installed(name: str, digest: str, target: Path):
+    try:
+        STATE_DIR.mkdir(exist_ok=True)
+        state = {"fingerprint": digest, "target": str(target), "installed_at": time.strftime("%Y-%m-%d %H:%M:%S")}
+        (STATE_DIR / f"{name}.json").write_text(json.dumps(state, indent=2), encoding="utf-8")
+    except OSError as e:
+        log(f"Avviso: impossibile salvare l'impronta di {name} ({e}).")
+
+
+def run_step(name: str, cmd, cwd: Path, quiet: bool = True) -> int:
+    """
+    Esegue un comando di preparazione catturandone l'output (le due preparazioni girano
+    in parallelo): stampato solo in caso di errore, o sempre se quiet=False.
+    """
+    log(f"[{name}] > {' '.join(Path(cmd[0]).name if i == 0 else str(c) for i, c in enumerate(cmd))}")
+    result = subprocess.run(cmd, cwd=str(cwd), stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    if result.returncode != 0 or not quiet:
+        lines = result.stdout.splitlines()
+        if result.returncode != 0:
+            lines = lines[-40:]
+            log(f"[{name}] ERRORE (codice {result.returncode}), ultime righe:")
+        log("\n".join(f"[{name}]   {line}" for line in lines))
+    return result.returncode
 
 
 def check_cmd_exists(exe: str) -> str:
@@ -177,27 +300,212 @@ def run_cmd(cmd, cwd=None, env=None) -> subprocess.Popen:
         stdin=subprocess.PIPE,
         stdout=subprocess.PIPE,
         stderr=subprocess.STDOUT,
-        text=True,
         creationflags=creationflags,
         preexec_fn=preexec_fn,
-        bufsize=1,  # line-buffered
+        bufsize=0,  # byte grezzi, letti dal LogMux
     )
 
 
-def _start_reader_thread(name: str, proc: subprocess.Popen) -> threading.Thread:
-    def _reader():
+class LogMux:
+    """Legge l'output di tutti i processi figli da un solo thread (vedi docstring del modulo)."""
+
+    READ_SIZE = 64 * 1024
+    FLUSH_BYTES = 64 * 1024
+    MAX_LINE = 64 * 1024  # oltre, una riga senza a capo viene emessa comunque
+
+    def __init__(self, tail_lines: int = 200, rate_limit: float = 0.0, flush_interval: float = 0.05):
+        self.tail_lines = tail_lines
+        self.rate_limit = rate_limit
+        self.flush_interval = flush_interval
+        self._tails: dict[str, deque] = {}
+        self._partial: dict[str, bytes] = {}
+        self._closed: dict[str, threading.Event] = {}
+        self._buckets: dict[str, tuple[float, float]] = {}
+        self._dropped: dict[str, int] = {}
+        self._dropped_reported_at = time.monotonic()
+        self._pending: list[str] = []
+        self._pending_size = 0
+        self._last_flush = time.monotonic()
+        # Richieste dal thread principale (nuove pipe) e, su Windows, dati dai thread di lettura
+        self._inbox: queue.SimpleQueue = queue.SimpleQueue()
+        self._selector = None if IS_WINDOWS else selectors.DefaultSelector()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="log-mux", daemon=True)
+        self._thread.start()
+
+    # -- API (thread principale) -------------------------------------------------
+
+    def add(self, name: str, proc: subprocess.Popen):
+        """Inizia a leggere stdout/stderr del processo."""
+        if proc.stdout is None:
+            return
+        self._tails[name] = deque(maxlen=self.tail_lines)
+        self._closed[name] = threading.Event()
+        self._inbox.put(("add", name, proc.stdout))
+
+    def tail(self, name: str) -> list[str]:
+        """Ultime righe del processo (anche quelle non mostrate per il limite di frequenza)."""
+        return list(self._tails.get(name, ()))
+
+    def dump(self, name: str, returncode: Optional[int], show: int = 20) -> Optional[Path]:
+        """Salva e mostra le ultime righe di un processo terminato con errore."""
+        closed = self._closed.get(name)
+        if closed is not None:
+            closed.wait(2.0)  # attende che l'output residuo nella pipe sia stato letto
+        lines = self.tail(name)
+        path = STATE_DIR / f"crash-{name}-{time.strftime('%Y%m%d-%H%M%S')}.log"
         try:
-            if proc.stdout is None:
+            STATE_DIR.mkdir(exist_ok=True)
+            path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+        except OSError:
+            path = None
+        self.flush()
+        log(f"\n✗ {name} terminato con codice {returncode}. Ultime {min(show, len(lines))} righe:")
+        log("\n".join(f"  | {line}" for line in lines[-show:]))
+        if path is not None:
+            log(f"  Ultime {len(lines)} righe salvate in {path}")
+        return path
+
+    def flush(self):
+        """Scrive subito le righe in attesa (dal thread del multiplexer alla prossima iterazione)."""
+        self._inbox.put(("flush", None, None))
+        time.sleep(self.flush_interval)
+
+    def stop(self, timeout: float = 2.0):
+        """Ferma il thread dopo aver letto l'output residuo (o allo scadere del timeout)."""
+        self._stop.set()
+        self._thread.join(timeout)
+
+    # -- thread del multiplexer --------------------------------------------------
+
+    def _run(self):
+        while True:
+            if self._stop.is_set() and all(e.is_set() for e in self._closed.values()):
+                break
+            if self._selector is not None:
+                self._drain_inbox(0)
+                if self._selector.get_map():
+                    for key, _ in self._selector.select(self.flush_interval):
+                        self._read(key.data, key.fileobj)
+                else:
+                    self._drain_inbox(self.flush_interval)
+            else:
+                self._drain_inbox(self.flush_interval)
+            self._report_dropped()
+            self._write(force=False)
+        self._write(force=True)
+
+    def _drain_inbox(self, wait_s: float):
+        try:
+            msg = self._inbox.get(timeout=wait_s) if wait_s else self._inbox.get_nowait()
+        except queue.Empty:
+            return
+        while True:
+            kind, name, payload = msg
+            if kind == "add":
+                self._open(name, payload)
+            elif kind == "data":
+                self._feed(name, payload)
+            elif kind == "flush":
+                self._write(force=True)
+            try:
+                msg = self._inbox.get_nowait()
+            except queue.Empty:
                 return
-            for line in iter(proc.stdout.readline, ""):
-                if not line:
-                    break
-                print(line.rstrip(), flush=True)
-        except Exception:
-            pass
-    t = threading.Thread(target=_reader, name=f"{name}-reader", daemon=True)
-    t.start()
-    return t
+
+    def _open(self, name: str, pipe):
+        if self._selector is not None:
+            os.set_blocking(pipe.fileno(), False)
+            self._selector.register(pipe, selectors.EVENT_READ, name)
+            return
+
+        def _feeder():
+            # Solo Windows: lettura bloccante, elaborazione nel thread del multiplexer
+            while True:
+                try:
+                    chunk = os.read(pipe.fileno(), self.READ_SIZE)
+                except OSError:
+                    chunk = b""
+                self._inbox.put(("data", name, chunk))
+                if not chunk:
+                    return
+        threading.Thread(target=_feeder, name=f"{name}-pipe", daemon=True).start()
+
+    def _read(self, name: str, pipe):
+        try:
+            chunk = os.read(pipe.fileno(), self.READ_SIZE)
+        except BlockingIOError:
+            return
+        except OSError:
+            chunk = b""
+        if not chunk:
+            self._selector.unregister(pipe)
+        self._feed(name, chunk)
+
+    def _feed(self, name: str, chunk: bytes):
+        """Divide i byte in righe (il resto senza a capo attende il blocco successivo); b'' = EOF."""
+        if not chunk:
+            rest = self._partial.pop(name, b"")
+            if rest:
+                self._line(name, rest, time.strftime("%H:%M:%S"))
+            self._closed[name].set()
+            return
+        *lines, rest = (self._partial.pop(name, b"") + chunk).split(b"\n")
+        if len(rest) > self.MAX_LINE:
+            lines.append(rest)
+            rest = b""
+        if rest:
+            self._partial[name] = rest
+        stamp = time.strftime("%H:%M:%S")  # uno per blocco letto: costo trascurabile per riga
+        for raw in lines:
+            self._line(name, raw, stamp)
+
+    def _line(self, name: str, raw: bytes, stamp: str):
+        text = raw.decode("utf-8", "replace").rstrip("\r")
+        self._tails[name].append(text)
+        if not self._allow(name):
+            self._dropped[name] = self._dropped.get(name, 0) + 1
+            return
+        line = f"{stamp} [{name}] {text}"
+        self._pending.append(line)
+        self._pending_size += len(line) + 1
+
+    def _allow(self, name: str) -> bool:
+        """Token bucket per processo: rate_limit righe/s, raffica fino a un secondo."""
+        if self.rate_limit <= 0:
+            return True
+        now = time.monotonic()
+        tokens, last = self._buckets.get(name, (self.rate_limit, now))
+        tokens = min(self.rate_limit, tokens + (now - last) * self.rate_limit)
+        allowed = tokens >= 1
+        self._buckets[name] = (tokens - 1 if allowed else tokens, now)
+        return allowed
+
+    def _report_dropped(self):
+        now = time.monotonic()
+        if not self._dropped or now - self._dropped_reported_at < 1.0:
+            return
+        stamp = time.strftime("%H:%M:%S")
+        for name, count in self._dropped.items():
+            line = f"{stamp} [{name}] … {count} righe non mostrate (limite {self.rate_limit:g}/s)"
+            self._pending.append(line)
+            self._pending_size += len(line) + 1
+        self._dropped.clear()
+        self._dropped_reported_at = now
+
+    def _write(self, force: bool):
+        if not self._pending:
+            return
+        now = time.monotonic()
+        if not force and self._pending_size < self.FLUSH_BYTES and now - self._last_flush < self.flush_interval:
+            return
+        text = "\n".join(self._pending) + "\n"
+        self._pending.clear()
+        self._pending_size = 0
+        self._last_flush = now
+        with _log_lock:
+            sys.stdout.write(text)
+            sys.stdout.flush()
 
 
 def _kill_tree_windows(pid: int):
@@ -273,36 +581,236 @@ def run_seeder_via_backend():
     return seed.returncode
 
 
-def main():
+def prepare_backend(poetry: str, force: bool):
+    """Dipendenze (se cambiate), check DB, collezioni e indici. Restituisce (codice, db)."""
+    digest = fingerprint([BACKEND_DIR / "pyproject.toml", BACKEND_DIR / "poetry.lock"], extra=[poetry])
+    with phase("backend: dipendenze"):
+        if not force and is_up_to_date("backend", digest):
+            log("[backend] Dipendenze invariate, salto poetry install")
+        else:
+            rc = run_step("backend", [poetry, "install", "--no-root"], BACKEND_DIR)
+            if rc != 0:
+                return rc, None
+            env_path = subprocess.run(
+                [poetry, "env", "info", "--path"], cwd=str(BACKEND_DIR), capture_output=True, text=True
+            ).stdout.strip()
+            mark_installed("backend", digest, Path(env_path) if env_path else BACKEND_DIR)
+
+    with phase("backend: check DB"):
+        rc = run_step("backend", [poetry, "run", "python", "-m", "app.scripts.check_db"], BACKEND_DIR, quiet=False)
+        if rc != 0:
+            return rc, None
+
+    # DB: collezioni/indici (idempotenti)
+    with phase("backend: collezioni e indici"):
+        db = connect_db()
+        create_collections_if_missing(db)
+        create_indexes(db)
+    return 0, db
+
+
+def prepare_frontend(npm: str, force: bool, build: bool = False) -> int:
+    """
+    npm install e ng analytics disable, solo se package.json o il lockfile sono cambiati;
+    con build=True anche la build di produzione, solo se sorgenti o configurazione sono cambiati.
+    """
+    digest = fingerprint([FRONTEND_DIR / "package.json", FRONTEND_DIR / "package-lock.json"], extra=[npm])
+    with phase("frontend: dipendenze"):
+        if not force and is_up_to_date("frontend", digest):
+            log("[frontend] Dipendenze invariate, salto npm install")
+        else:
+            rc = run_step("frontend", [npm, "install"], FRONTEND_DIR)
+            if rc != 0:
+                return rc
+            run_step("frontend", [npx_path(), "ng", "analytics", "disable"], FRONTEND_DIR)
+            mark_installed("frontend", digest, FRONTEND_DIR / "node_modules")
+    if not build:
+        return 0
+
+    sources = sorted(p for p in (FRONTEND_DIR / "src").rglob("*") if p.is_file())
+    config = [FRONTEND_DIR / n for n in ("angular.json", "package-lock.json", "tsconfig.json", "tsconfig.app.json")]
+    digest = fingerprint(sources + config)
+    with phase("frontend: build produzione"):
+        if not force and is_up_to_date("frontend-build", digest):
+            log("[frontend] Sorgenti invariati, salto la build di produzione")
+            return 0
+        rc = run_step("frontend", [npm, "run", "build:prod"], FRONTEND_DIR)
+        if rc != 0:
+            return rc
+        mark_installed("frontend-build", digest, FRONTEND_DIST / "index.html")
+    return 0
+
+
+def cpu_count() -> int:
+    """Core utilizzabili dal processo (rispetta l'affinità/cgroup dove disponibile)."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def is_replica_set(db) -> bool:
+    """True se MongoDB è un replica set (necessario per i change stream)."""
+    if db is None:
+        return False
+    try:
+        return bool(db.client.admin.command("hello").get("setName"))
+    except Exception:
+        return False
+
+
+def events_source(workers: int, db) -> Optional[str]:
+    """
+    Sorgente del feed modifiche per il profilo produzione (None = quella di EVENTS_SOURCE).
+    Con più worker il bus locale vede solo le scritture del proprio processo.
+    """
+    configured = os.getenv("EVENTS_SOURCE")
+    if workers <= 1:
+        return None
+    # Cache in processo: valgono per worker anche con il change stream
+    log(
+        f"{workers} worker: classifica e report dei moduli sono calcolati per worker e vedono le scritture\n"
+        "  degli altri alla ricostruzione (LEADERBOARD_REBUILD_S) o alla scadenza (MODULE_REPORT_TTL_S)."
+    )
+    if configured == "changestream":
+        return None
+    if configured is None and is_replica_set(db):
+        log("Feed modifiche dal change stream di MongoDB (EVENTS_SOURCE=changestream).")
+        return "changestream"
+    reason = "MongoDB non è un replica set" if configured is None else f"EVENTS_SOURCE={configured}"
+    log(
+        f"Avviso: feed modifiche senza change stream ({reason}): gli aggiornamenti live (SSE)\n"
+        "  vedono solo le scritture del worker a cui è connesso il client.\n"
+        "  Usa --workers 1 oppure MongoDB in replica set con EVENTS_SOURCE=changestream."
+    )
+    return None
+
+
+def serve_production(poetry: str, args, mux: LogMux, db=None) -> int:
+    """Uvicorn multi-worker senza reload che serve anche il bundle Angular."""
+    cmd = [
+        poetry, "run", "uvicorn", "app.main:app",
+        "--host", args.host,
+        "--port", str(args.port),
+        "--workers", str(args.workers),
+        # uvloop non esiste su Windows: lì decide Uvicorn
+        "--loop", "auto" if IS_WINDOWS else "uvloop",
+        "--http", "httptools",
+        "--timeout-keep-alive", str(args.keep_alive),
+        "--backlog", str(args.backlog),
+        "--timeout-graceful-shutdown", str(args.graceful_timeout),
+        # Attesa dello startup di un nuovo worker al riavvio graduale (e del ping di controllo)
+        "--timeout-worker-healthcheck", str(args.worker_timeout),
+        "--proxy-headers",
+    ]
+    if not args.access_log:
+        cmd.append("--no-access-log")
+    env = os.environ.copy()
+    env.update(ENV="production", DEBUG="false", FRONTEND_DIST=str(FRONTEND_DIST))
+    source = events_source(args.workers, db)
+    if source:
+        env["EVENTS_SOURCE"] = source
+
+    log(f"\nAvvio backend (produzione, {args.workers} worker)...\n")
+    log("> Avvio: " + " ".join(["uvicorn", *cmd[3:]]))
+    backend = run_cmd(cmd, cwd=str(BACKEND_DIR), env=env)
+    mux.add("backend", backend)
+
+    log(f"Applicazione: http://localhost:{args.port}")
+    if hasattr(signal, "SIGHUP"):
+        log(f"Riavvio graduale dei worker: kill -HUP {os.getpid()}")
+    log("Premi CTRL+C per interrompere.\n")
+
+    try:
+        while not _shutdown.is_set():
+            if backend.poll() is not None:
+                if backend.returncode != 0 and not _shutdown.is_set():
+                    mux.dump("backend", backend.returncode)
+                log("Backend terminato.")
+                break
+            if _reload.is_set():
+                _reload.clear()
+                # Solo al processo principale di Uvicorn (poetry run esegue exec): il supervisore
+                # (Uvicorn >= 0.54) avvia un nuovo worker e attende che sia pronto prima di
+                # fermare il vecchio; se non lo è entro --worker-timeout tiene i worker attuali
+                log("→ Riavvio graduale dei worker...")
+                try:
+                    os.kill(backend.pid, signal.SIGHUP)
+                except OSError as e:
+                    log(f"Avviso: riavvio non riuscito ({e}).")
+            _shutdown.wait(0.2)
+    except KeyboardInterrupt:
+        _shutdown.set()
+    finally:
+        terminate_proc(backend, "backend (Uvicorn)", timeout=args.graceful_timeout + 5)
+    return 0
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Setup e avvio di Gestione Corsi ITS")
+    parser.add_argument("--reinstall", action="store_true", help="forza poetry install e npm install")
+    parser.add_argument("--prod", action="store_true", help="profilo produzione (multi-worker, bundle Angular statico)")
+    prod = parser.add_argument_group("profilo produzione")
+    prod.add_argument("--host", default="0.0.0.0")
+    prod.add_argument("--port", type=int, default=8000)
+    prod.add_argument(
+        "--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY") or cpu_count()),
+        help="processi Uvicorn (default: WEB_CONCURRENCY o un worker per core)",
+    )
+    prod.add_argument("--keep-alive", type=int, default=5, help="secondi di keep-alive HTTP")
+    prod.add_argument("--backlog", type=int, default=2048, help="coda di connessioni in attesa del socket")
+    prod.add_argument("--graceful-timeout", type=int, default=30, help="secondi concessi alle richieste in corso allo stop")
+    prod.add_argument(
+        "--worker-timeout", type=int, default=30,
+        help="secondi concessi allo startup di un nuovo worker nel riavvio graduale",
+    )
+    prod.add_argument("--access-log", action="store_true", help="abilita l'access log di Uvicorn")
+    logs = parser.add_argument_group("log dei processi")
+    logs.add_argument("--log-tail", type=int, default=200, help="righe conservate per processo (crash dump)")
+    logs.add_argument("--log-rate", type=float, default=0, help="righe/s per processo sul terminale (0 = nessun limite)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
     log("=== Gestione Corsi ITS ===\n")
+    t_start = time.perf_counter()
 
-    # Verifica Poetry
+    # Verifica strumenti
     log("Verifica Poetry...")
     poetry = check_cmd_exists("poetry")
     if not poetry:
         log("ERRORE: Poetry non trovato nel PATH.")
         return 1
-    log("Poetry trovato.\n")
-
-    # Backend setup
-    log("Setup backend...\n")
-    log("> Eseguo: poetry install --no-root")
-    install = subprocess.run([poetry, "install", "--no-root"], cwd=str(BACKEND_DIR))
-    if install.returncode != 0:
-        return install.returncode
+    log("Poetry trovato.")
 
-    log("> Eseguo: poetry run python -m app.scripts.check_db")
-    check = subprocess.run([poetry, "run", "python", "-m", "app.scripts.check_db"], cwd=str(BACKEND_DIR))
-    if check.returncode != 0:
-        return check.returncode
-
-    # DB: collezioni/indici (idempotenti)
-    db = connect_db()
-    create_collections_if_missing(db)
-    create_indexes(db)
+    log("Verifica Node.js e npm...")
+    node = check_cmd_exists("node")
+    npm = check_cmd_exists("npm.cmd" if IS_WINDOWS else "npm")
+    if not node or not npm:
+        log("ERRORE: Node.js/npm non trovati nel PATH.")
+        return 1
+    log(f"Node: {node}\nnpm: {npm}")
+    if not FRONTEND_DIR.exists():
+        log(f"ERRORE: Cartella frontend non trovata: {FRONTEND_DIR}")
+        return 1
 
-    # Seeder/reset
-    if db_has_data(db):
+    # Backend e frontend si preparano in parallelo (frontend su un thread, backend qui)
+    log("\nSetup backend e frontend in parallelo...\n")
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix="frontend-setup") as pool:
+        frontend_setup = pool.submit(prepare_frontend, npm, args.reinstall, args.prod)
+        backend_rc, db = prepare_backend(poetry, args.reinstall)
+        frontend_rc = frontend_setup.result()
+    print_timings(time.perf_counter() - t_start)
+    if backend_rc != 0:
+        return backend_rc
+    if frontend_rc != 0:
+        return frontend_rc
+
+    # Seeder/reset (non in produzione: nessuna domanda interattiva)
+    if args.prod:
+        log("Profilo produzione: salto il seeder (python -m app.scripts.seeder per generarlo).")
+    elif db_has_data(db):
         log("\n⚠️  Il database contiene già dei dati.")
         if ask_yes_no("Vuoi AZZERARE tutto e rigenerare i dati Faker? [s/N]: ", default=False):
             log("\nSvuoto collezioni e rigenero dati Faker...")
@@ -325,41 +833,27 @@ def main():
         else:
             log("Salto la generazione dei dati di esempio.")
 
-    # Frontend setup
-    log("\nSetup frontend...\n")
-    log("Verifica Node.js e npm...")
-    node = check_cmd_exists("node")
-    npm = check_cmd_exists("npm.cmd" if IS_WINDOWS else "npm")
-    if not node or not npm:
-        log("ERRORE: Node.js/npm non trovati nel PATH.")
-        return 1
-
-    log(f"Node: {node}\nnpm: {npm}\n")
-    if not FRONTEND_DIR.exists():
-        log(f"ERRORE: Cartella frontend non trovata: {FRONTEND_DIR}")
-        return 1
-    log(f"Verifica cartella frontend: {FRONTEND_DIR}\nCartella frontend valida.\n")
-
-    log("> Eseguo: npm install")
-    install_fe = subprocess.run([npm, "install"], cwd=str(FRONTEND_DIR))
-    if install_fe.returncode != 0:
-        return install_fe.returncode
-
-    log("> Eseguo: npx ng analytics disable")
-    subprocess.run([npx_path(), "ng", "analytics", "disable"], cwd=str(FRONTEND_DIR))
+    if args.prod:
+        mux = LogMux(args.log_tail, args.log_rate)
+        try:
+            return serve_production(poetry, args, mux, db)
+        finally:
+            mux.stop()
 
     # Avvio backend e frontend
+    mux = LogMux(args.log_tail, args.log_rate)
     log("\nAvvio backend e frontend...\n")
     log("> Avvio: poetry run uvicorn app.main:app --host 0.0.0.0 --port 8000 --reload")
     backend_cmd = [poetry, "run", "uvicorn", "app.main:app", "--host", "0.0.0.0", "--port", "8000", "--reload"]
     backend = run_cmd(backend_cmd, cwd=str(BACKEND_DIR))
-    _start_reader_thread("backend", backend)
+    mux.add("backend", backend)
 
     # Avvio frontend standard; se fallisce, tenta porta alternativa (script start:alt)
     log("> Avvio: npm start")
     start_cmd = [npm, "start"]
     frontend = run_cmd(start_cmd, cwd=str(FRONTEND_DIR))
-    _start_reader_thread("frontend", frontend)
+    frontend_name = "frontend"
+    mux.add(frontend_name, frontend)
 
     log("Backend:  http://localhost:8000")
     log("Frontend: http://localhost:4200")
@@ -369,14 +863,22 @@ def main():
         while not _shutdown.is_set():
             # Uscita se uno dei due termina
             if backend.poll() is not None:
+                if backend.returncode != 0 and not _shutdown.is_set():
+                    mux.dump("backend", backend.returncode)
                 log("Backend terminato.")
                 break
 
             if frontend.poll() is not None:
+                if frontend.returncode != 0 and not _shutdown.is_set():
+                    mux.dump(frontend_name, frontend.returncode)
+                if frontend_name == "frontend-alt":
+                    log("Frontend alternativo terminato.")
+                    break
                 log("Frontend terminato. Provo avvio alternativo su porta 4300...")
                 alt_cmd = [npm, "run", "start:alt"]
                 frontend = run_cmd(alt_cmd, cwd=str(FRONTEND_DIR))
-                _start_reader_thread("frontend-alt", frontend)
+                frontend_name = "frontend-alt"
+                mux.add(frontend_name, frontend)
                 log("Frontend (alternativo): http://localhost:4300")
 
             # attende poco per reagire ai segnali
@@ -387,6 +889,7 @@ def main():
     finally:
         terminate_proc(frontend, "frontend (Angular)")
         terminate_proc(backend, "backend (Uvicorn)")
+        mux.stop()
 
     return 0
 